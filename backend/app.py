@@ -1,99 +1,125 @@
-import os
 import asyncio
-from telegram import Bot, InlineKeyboardButton, InlineKeyboardMarkup, Update
-from telegram.ext import ApplicationBuilder, CommandHandler, ContextTypes, MessageHandler, filters
-import asyncpg
-
-# Get environment variables
-BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
-DATABASE_URL = os.getenv("DATABASE_URL")
-
-if not BOT_TOKEN:
-    raise ValueError("TELEGRAM_BOT_TOKEN is not set!")
-
-# Initialize database connection
-async def init_db():
-    return await asyncpg.connect(DATABASE_URL)
-
-async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    chat_id = update.effective_chat.id
-    await context.bot.send_message(
-        chat_id=chat_id,
-        text="Welcome! Please register first."
+import logging
+import os
+from contextlib import asynccontextmanager
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+from fastapi.middleware.cors import CORSMiddleware
+from backend.config import settings
+
+logger = logging.getLogger(__name__)
+
+FRONTEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "frontend")
+
+
+def _warm_db_pool():
+    """Open a few pooled connections so the first requests don't pay for them"""
+    from backend.database import engine
+
+    connections = []
+    try:
+        for _ in range(settings.DB_POOL_WARM_CONNECTIONS):
+            connections.append(engine.connect())
+    except Exception as e:
+        logger.warning("Error warming database pool: %s", e)
+    finally:
+        for connection in connections:
+            connection.close()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    from backend.database import engine
+    from backend.game_scheduler import scheduler
+    from backend.jobs import runner as job_runner
+    from backend.routes.bot import pipeline
+    from backend.telegram_client import send_queue, telegram_client
+
+    background = []
+    # Warm the pool in the background; startup does not wait on the database
+    background.append(asyncio.create_task(asyncio.to_thread(_warm_db_pool)))
+    if settings.ARCHIVER_ENABLED:
+        from backend.archive import run_archiver
+        background.append(asyncio.create_task(run_archiver()))
+    from backend.stats import run_persister
+    background.append(asyncio.create_task(run_persister()))
+    from backend.lobby import run_refresher
+    background.append(asyncio.create_task(run_refresher()))
+    if settings.PAYMENTS_WORKER_ENABLED:
+        from backend.payments import run_payment_worker
+        background.append(asyncio.create_task(run_payment_worker()))
+
+    pipeline.start()
+    send_queue.start()
+    if settings.LOOP_MONITOR_ENABLED:
+        from backend.profiling import monitor
+        monitor.start()
+
+    yield
+
+    if settings.LOOP_MONITOR_ENABLED:
+        await monitor.stop()
+    await pipeline.stop()
+    await scheduler.shutdown()
+    await job_runner.shutdown()
+    await send_queue.stop()
+    await telegram_client.close()
+    for task in background:
+        task.cancel()
+    await asyncio.gather(*background, return_exceptions=True)
+    engine.dispose()
+
+
+def create_app() -> FastAPI:
+    app = FastAPI(title="Bingo Bot", lifespan=lifespan)
+
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=settings.ALLOWED_ORIGINS,
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+        expose_headers=["ETag", "X-Next-Cursor", "X-DB-Queries", "X-DB-Time-Ms"],
     )
 
-async def register(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    chat_id = update.effective_chat.id
-    first_name = update.effective_user.first_name
-    conn = await init_db()
+    from backend.metrics import MetricsMiddleware, registry
 
-    # Example: store user info
-    await conn.execute(
-        "INSERT INTO users(chat_id, first_name) VALUES($1, $2) ON CONFLICT DO NOTHING",
-        chat_id, first_name
-    )
+    app.add_middleware(MetricsMiddleware)
+
+    if settings.QUERY_ACCOUNTING_ENABLED:
+        from backend.query_stats import QueryAccountingMiddleware
+
+        app.add_middleware(QueryAccountingMiddleware)
+
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+    from backend.routes import admin, auth, bot, games, media, profile, stats, wallet, websocket
 
-    # Send play button (as inline keyboard)
-    keyboard = [[InlineKeyboardButton("Play", callback_data="play")]]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    await context.bot.send_message(chat_id=chat_id, text="Registration successful!", reply_markup=reply_markup)
-
-    await conn.close()
-
-async def button(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    query = update.callback_query
-    await query.answer()
-    if query.data == "play":
-        await query.edit_message_text(text="🎮 Game started!")
-
-# Build bot application
-async def main():
-    app = ApplicationBuilder().token(BOT_TOKEN).build()
-
-    app.add_handler(CommandHandler("start", start))
-    app.add_handler(CommandHandler("register", register))
-    app.add_handler(MessageHandler(filters.TEXT & (~filters.COMMAND), start))
-    app.add_handler(MessageHandler(filters.TEXT, start))
-    app.add_handler(MessageHandler(filters.COMMAND, start))
-    app.add_handler(MessageHandler(filters.Regex("^/.*"), start))
-    app.add_handler(MessageHandler(filters.ALL, start))
-    app.add_handler(MessageHandler(filters.ALL, start))
-    app.add_handler(MessageHandler(filters.ALL, start))
-    app.add_handler(MessageHandler(filters.ALL, start))
-    app.add_handler(MessageHandler(filters.ALL, start))
-    app.add_handler(MessageHandler(filters.ALL, start))
-    app.add_handler(MessageHandler(filters.ALL, start))
-    app.add_handler(MessageHandler(filters.ALL, start))
-    app.add_handler(MessageHandler(filters.ALL, start))
-    app.add_handler(MessageHandler(filters.ALL, start))
-    app.add_handler(MessageHandler(filters.ALL, start))
-    app.add_handler(MessageHandler(filters.ALL, start))
-    app.add_handler(MessageHandler(filters.ALL, start))
-    app.add_handler(MessageHandler(filters.ALL, start))
-    app.add_handler(MessageHandler(filters.ALL, start))
-    app.add_handler(MessageHandler(filters.ALL, start))
-    app.add_handler(MessageHandler(filters.ALL, start))
-    app.add_handler(MessageHandler(filters.ALL, start))
-    app.add_handler(MessageHandler(filters.ALL, start))
-    app.add_handler(MessageHandler(filters.ALL, start))
-    app.add_handler(MessageHandler(filters.ALL, start))
-    app.add_handler(MessageHandler(filters.ALL, start))
-    app.add_handler(MessageHandler(filters.ALL, start))
-
-    app.add_handler(MessageHandler(filters.TEXT & (~filters.COMMAND), start))
-    app.add_handler(MessageHandler(filters.TEXT & (~filters.COMMAND), start))
-    app.add_handler(MessageHandler(filters.TEXT & (~filters.COMMAND), start))
-
-    app.add_handler(MessageHandler(filters.TEXT & (~filters.COMMAND), start))
-    app.add_handler(MessageHandler(filters.TEXT & (~filters.COMMAND), start))
-    app.add_handler(MessageHandler(filters.TEXT & (~filters.COMMAND), start))
-
-    app.add_handler(MessageHandler(filters.TEXT & (~filters.COMMAND), start))
-
-    # Callback for inline buttons
-    app.add_handler(MessageHandler(filters.ALL, start))
-
-    await app.run_polling()
+    for module in (auth, profile, wallet, games, stats, websocket, bot, media, admin):
+        app.include_router(module.router)
 
+    # Mounted last so it never shadows an API route
+    if os.path.isdir(FRONTEND_DIR):
+        from backend.static import PrecompressedStaticFiles
+
+        app.mount("/", PrecompressedStaticFiles(directory=FRONTEND_DIR, html=True), name="frontend")
+
+    return app
+
+
+def __getattr__(name: str):
+    # backend.app:app is built on first access, so importing this module (the
+    # polling bot below, tests, tooling) does not load every router
+    if name == "app":
+        app = globals()["app"] = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# Run the Telegram bot with long polling
 if __name__ == "__main__":
-    asyncio.run(main())
+    from backend.telegram_bot import main
+
+    main()
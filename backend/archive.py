@@ -0,0 +1,170 @@
+"""Archival of finished games into compact game_history records.
+
+Run once with ``python -m backend.archive`` or keep ``run_archiver`` running
+as a background task.
+
+Archiving deletes a game's called_numbers but keeps its game_participants
+rows, with only their marks cleared: game history pages over those rows, so
+they grow by one small row per player per game. Dropping old ones is a
+retention decision left to the operator, not something the archiver does.
+"""
+import asyncio
+import base64
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from sqlalchemy.orm import Session
+from backend.config import settings
+from backend.database import SessionLocal
+from backend.models import BingoCard, CalledNumber, GameHistory, GameParticipant, GameRoom
+
+logger = logging.getLogger(__name__)
+
+
+def pack_draw_order(numbers: List[int]) -> bytes:
+    return bytes(numbers)
+
+
+def unpack_draw_order(data: Optional[bytes]) -> List[int]:
+    return list(data or b"")
+
+
+def pack_card(numbers: List[List[int]]) -> str:
+    """5x5 grid -> 25 bytes, row-major, base64 for JSON storage"""
+    return base64.b64encode(bytes(n for row in numbers for n in row)).decode()
+
+
+def unpack_card(packed: str) -> List[List[int]]:
+    cells = base64.b64decode(packed)
+    return [list(cells[row * 5:row * 5 + 5]) for row in range(5)]
+
+
+def marks_to_mask(numbers: List[List[int]], marked: List[int]) -> int:
+    """Bit (row * 5 + col) is set for every marked cell; the FREE cell counts as marked"""
+    marked = set(marked)
+    mask = 0
+    for i in range(5):
+        for j in range(5):
+            if numbers[i][j] == 0 or numbers[i][j] in marked:
+                mask |= 1 << (i * 5 + j)
+    return mask
+
+
+def mask_to_marks(mask: int) -> List[List[bool]]:
+    return [[bool(mask >> (i * 5 + j) & 1) for j in range(5)] for i in range(5)]
+
+
+def build_history(db: Session, rooms: List[GameRoom]) -> List[GameHistory]:
+    """Compact records for finished rooms from the live tables, not added to the session"""
+    room_ids = [room.id for room in rooms]
+
+    draws: Dict[int, List[int]] = {room_id: [] for room_id in room_ids}
+    for room_id, number in db.query(CalledNumber.room_id, CalledNumber.number).filter(
+        CalledNumber.room_id.in_(room_ids)
+    ).order_by(CalledNumber.room_id, CalledNumber.id):
+        draws[room_id].append(number)
+
+    participants: Dict[int, List[GameParticipant]] = {room_id: [] for room_id in room_ids}
+    card_ids = set()
+    for participant in db.query(GameParticipant).filter(GameParticipant.room_id.in_(room_ids)):
+        participants[participant.room_id].append(participant)
+        card_ids.update(participant.card_numbers or [])
+
+    cards = {
+        card.id: card.numbers
+        for card in db.query(BingoCard).filter(BingoCard.id.in_(card_ids))
+    } if card_ids else {}
+
+    records = []
+    for room in rooms:
+        entries = []
+        for participant in participants[room.id]:
+            marked = participant.cards_marked or {}
+            entry_cards = []
+            for card_id in participant.card_numbers or []:
+                numbers = cards.get(card_id)
+                if numbers is None:
+                    continue
+                entry_cards.append({
+                    "id": card_id,
+                    "numbers": pack_card(numbers),
+                    "marks": marks_to_mask(numbers, marked.get(str(card_id), []))
+                })
+            entries.append({
+                "user_id": participant.user_id,
+                "status": participant.status,
+                "cards": entry_cards
+            })
+
+        records.append(GameHistory(
+            room_id=room.id,
+            name=room.name,
+            stake_amount=room.stake_amount,
+            pot=room.stake_amount * room.current_players,
+            player_count=room.current_players,
+            draw_order=pack_draw_order(draws[room.id]),
+            participants=entries,
+            winners=[entry["user_id"] for entry in entries if entry["status"] == "won"],
+            start_time=room.start_time,
+            end_time=room.end_time
+        ))
+    return records
+
+
+def archive_finished_games(db: Session, limit: int = settings.ARCHIVE_BATCH_SIZE) -> int:
+    """Compact up to ``limit`` finished rooms; returns how many were archived"""
+    cutoff = datetime.utcnow() - timedelta(minutes=settings.ARCHIVE_AFTER_MINUTES)
+    rooms = db.query(GameRoom).outerjoin(
+        GameHistory, GameHistory.room_id == GameRoom.id
+    ).filter(
+        GameRoom.status == "finished",
+        GameRoom.end_time < cutoff,
+        GameHistory.room_id.is_(None)
+    ).order_by(GameRoom.id).limit(limit).all()
+
+    if not rooms:
+        return 0
+
+    room_ids = [room.id for room in rooms]
+    db.add_all(build_history(db, rooms))
+
+    # The history record now holds the draw order and marks
+    db.query(CalledNumber).filter(
+        CalledNumber.room_id.in_(room_ids)
+    ).delete(synchronize_session=False)
+    db.query(GameParticipant).filter(
+        GameParticipant.room_id.in_(room_ids)
+    ).update({"cards_marked": None}, synchronize_session=False)
+
+    db.commit()
+    return len(rooms)
+
+
+def archive_all() -> int:
+    """Archive batches until no eligible rooms remain"""
+    total = 0
+    db = SessionLocal()
+    try:
+        while True:
+            archived = archive_finished_games(db)
+            total += archived
+            if archived < settings.ARCHIVE_BATCH_SIZE:
+                return total
+    finally:
+        db.close()
+
+
+async def run_archiver(interval: float = settings.ARCHIVE_INTERVAL):
+    """Archive finished games periodically, off the event loop"""
+    while True:
+        try:
+            archived = await asyncio.to_thread(archive_all)
+            if archived:
+                logger.info("Archived %s finished games", archived)
+        except Exception:
+            logger.exception("Error archiving finished games")
+        await asyncio.sleep(interval)
+
+
+if __name__ == "__main__":
+    print(f"Archived {archive_all()} finished games")
@@ -0,0 +1,76 @@
+"""Cold-start benchmark for the ASGI app.
+
+Each run is a fresh interpreter that imports ``backend.app``, builds the app
+the way uvicorn does (first access to ``backend.app:app``) and runs the
+lifespan startup, timing each phase::
+
+    python -m backend.bench_startup --runs 5 --budget 1.0
+
+Prints a JSON summary and exits non-zero when the median total exceeds the
+budget.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+PROBE = r"""
+import asyncio, json, time
+started = time.perf_counter()
+import backend.app
+imported = time.perf_counter()
+
+async def startup():
+    app = backend.app.app
+    built = time.perf_counter()
+    async with app.router.lifespan_context(app):
+        ready = time.perf_counter()
+    return built, ready
+
+built, ready = asyncio.run(startup())
+print(json.dumps({
+    "import": imported - started,
+    "create_app": built - imported,
+    "lifespan": ready - built,
+    "total": ready - started,
+}))
+"""
+
+
+def run_once() -> dict:
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE],
+        capture_output=True,
+        text=True,
+        check=True,
+        # Background jobs don't delay startup; keep them out of the measurement
+        env={**os.environ, "ARCHIVER_ENABLED": "false", "DB_POOL_WARM_CONNECTIONS": "0"},
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=1.0, help="seconds allowed for the median total")
+    args = parser.parse_args(argv)
+
+    runs = [run_once() for _ in range(args.runs)]
+    summary = {
+        phase: {
+            "median": statistics.median(run[phase] for run in runs),
+            "max": max(run[phase] for run in runs),
+        }
+        for phase in ("import", "create_app", "lifespan", "total")
+    }
+    summary["runs"] = args.runs
+    summary["budget"] = args.budget
+    summary["within_budget"] = summary["total"]["median"] <= args.budget
+    print(json.dumps(summary, indent=2))
+    return 0 if summary["within_budget"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -12,16 +12,84 @@ class Settings(BaseSettings):
     SECRET_KEY: str = os.getenv("SECRET_KEY", "your-secret-key-change-in-production")
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 7  # 7 days
+    INIT_DATA_MAX_AGE: int = 60 * 60 * 24  # seconds a Telegram initData stays valid
+    TOKEN_CACHE_SIZE: int = 10000
+    WS_AUTH_TIMEOUT: float = 10.0  # seconds a game socket has to send its token
     
     # Telegram
     TELEGRAM_BOT_TOKEN: str = os.getenv("TELEGRAM_BOT_TOKEN", "")
     TELEGRAM_WEBAPP_URL: str = os.getenv("TELEGRAM_WEBAPP_URL", "http://localhost:8000")
+    TELEGRAM_API_URL: str = "https://api.telegram.org"
+    TELEGRAM_MAX_CONNECTIONS: int = 20
+    TELEGRAM_GLOBAL_RATE: float = 25.0  # messages per second, under Telegram's 30
+    TELEGRAM_PER_CHAT_INTERVAL: float = 1.0  # seconds between messages to one chat
+    TELEGRAM_WEBHOOK_SECRET: str = os.getenv("TELEGRAM_WEBHOOK_SECRET", "")
+    WEBHOOK_WORKERS: int = 8
+    WEBHOOK_QUEUE_SIZE: int = 10000
+    WEBHOOK_DEDUP_SIZE: int = 50000  # recent update_ids remembered
+    BOT_DB_POOL_MIN: int = 1
+    BOT_DB_POOL_MAX: int = 5
+    BOT_CONCURRENT_UPDATES: int = 32
     
     # Game Settings
     NUMBER_CALL_DELAY: int = 3  # seconds between numbers
     GAME_START_DELAY: int = 10  # seconds before game starts
     MAX_PLAYERS_PER_ROOM: int = 100
     MAX_CARDS_PER_PLAYER: int = 2
+    JOIN_BATCH_WINDOW: float = 0.005  # seconds joins to one room are gathered before admission
+    JOIN_BATCH_MAX: int = 100
+    
+    # Caching
+    USER_CACHE_SIZE: int = 10000
+    USER_CACHE_TTL: int = 60  # seconds a cached profile may be stale
+    REPLAY_CACHE_SIZE: int = 2000  # finished games kept decoded for history and replays
+    LOBBY_REFRESH_INTERVAL: int = 5  # seconds between lobby reloads, for rooms created elsewhere
+    
+    # Startup
+    DB_POOL_WARM_CONNECTIONS: int = 2
+    ARCHIVER_ENABLED: bool = True
+    STATIC_MAX_AGE: int = 60 * 60 * 24  # seconds frontend assets may be cached
+    
+    # Media
+    MAX_PHOTO_BYTES: int = 5 * 1024 * 1024
+    THUMBNAIL_WORKERS: int = 2
+    
+    # Archival
+    ARCHIVE_AFTER_MINUTES: int = 10  # grace period after a game finishes
+    ARCHIVE_BATCH_SIZE: int = 100
+    ARCHIVE_INTERVAL: int = 300  # seconds between archiver runs
+    
+    # Stats
+    LEADERBOARD_TOP_SIZE: int = 100  # entries kept ready for leaderboard reads
+    STATS_FLUSH_INTERVAL: int = 30  # seconds between player_stats writes
+    
+    # Idempotency
+    IDEMPOTENCY_CACHE_SIZE: int = 10000
+    IDEMPOTENCY_TTL: int = 60 * 60  # seconds a key's result is replayed
+    
+    # Payments
+    PAYMENTS_WORKER_ENABLED: bool = True
+    PAYMENT_FAKE_PROVIDER: bool = False  # settle every payment locally, for development and tests
+    PAYMENT_METHODS: list = ["telbirr", "cbe", "bank"]
+    PAYMENT_BATCH_SIZE: int = 100  # transactions claimed per worker round
+    PAYMENT_POLL_INTERVAL: float = 5.0  # seconds between rounds once the queue is drained
+    PAYMENT_PROCESSING_TIMEOUT: int = 600  # seconds before a claimed payment is picked up again
+    
+    # Jobs
+    JOB_WORKERS: int = 1  # processes for CPU-heavy admin jobs
+    JOB_NICE: int = 10  # niceness added to job processes so live games win the CPU
+    JOB_HISTORY: int = 100  # finished jobs kept for status and results
+    
+    # Diagnostics
+    ADMIN_TOKEN: str = os.getenv("ADMIN_TOKEN", "")  # /api/admin is disabled when empty
+    LOOP_MONITOR_ENABLED: bool = False
+    LOOP_MONITOR_INTERVAL: float = 0.05  # seconds between loop heartbeats
+    LOOP_STALL_THRESHOLD: float = 0.1  # seconds the loop may be blocked before its stack is logged
+    PROFILE_MAX_SECONDS: int = 60
+    QUERY_ACCOUNTING_ENABLED: bool = True
+    QUERY_BUDGET: int = 10  # statements per request before it is logged
+    QUERY_REPEAT_THRESHOLD: int = 3  # same statement this often in one request looks like N+1
+    QUERY_STATS_HEADERS: bool = False  # add X-DB-Queries / X-DB-Time-Ms to responses
     
     # CORS
     ALLOWED_ORIGINS: list = [
@@ -1,5 +1,7 @@
-from sqlalchemy import create_engine
+from sqlalchemy import DateTime, create_engine
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.sql.functions import FunctionElement
 from backend.config import settings
 import os
 
@@ -14,6 +16,28 @@ engine = create_engine(
     pool_pre_ping=True,
 )
 
+class utcnow(FunctionElement):
+    """The database's current time, written in the same form as Python datetimes
+
+    SQLite keeps DateTime as text. CURRENT_TIMESTAMP has no fraction while
+    values bound from Python carry six digits, and the two do not sort in time
+    order against each other. Used as the column ``default``, so rows stamped
+    by the database compare correctly with cursors and Python-written rows.
+    """
+    type = DateTime()
+    inherit_cache = True
+
+
+@compiles(utcnow)
+def _utcnow(element, compiler, **kw):
+    return "CURRENT_TIMESTAMP"
+
+
+@compiles(utcnow, "sqlite")
+def _utcnow_sqlite(element, compiler, **kw):
+    return "(strftime('%Y-%m-%d %H:%M:%f', 'now') || '000')"
+
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -1,5 +1,12 @@
 import random
-from typing import List, Tuple, Set
+from typing import Dict, List, Tuple, Set
+
+# Rows, columns and the two diagonals, as (row, column) cells
+LINES = (
+    [[(i, j) for j in range(5)] for i in range(5)]
+    + [[(i, j) for i in range(5)] for j in range(5)]
+    + [[(i, i) for i in range(5)], [(i, 4 - i) for i in range(5)]]
+)
 
 class BingoCardGenerator:
     @staticmethod
@@ -26,11 +33,50 @@ class BingoCardGenerator:
         return [BingoCardGenerator.generate_card() for _ in range(count)]
 
 
+class CardProgress:
+    """Uncalled cells left on each line of one card"""
+    
+    def __init__(self, card_id: int, user_id: int, numbers: List[List[int]]):
+        self.card_id = card_id
+        self.user_id = user_id
+        # The FREE centre (0) counts as already called
+        self.remaining = [sum(1 for i, j in line if numbers[i][j] != 0) for line in LINES]
+        self.lines_by_number: Dict[int, List[int]] = {}
+        for index, line in enumerate(LINES):
+            for i, j in line:
+                if numbers[i][j] != 0:
+                    self.lines_by_number.setdefault(numbers[i][j], []).append(index)
+        self.best = min(self.remaining)
+    
+    def call(self, number: int) -> bool:
+        """Cross off a called number; True when the closest line got closer"""
+        for index in self.lines_by_number.get(number, ()):
+            self.remaining[index] -= 1
+        best = min(self.remaining)
+        changed = best != self.best
+        self.best = best
+        return changed
+
+
 class BingoGameLogic:
     def __init__(self):
         self.called_numbers: Set[int] = set()
         self.all_numbers: List[int] = list(range(1, 76))
         random.shuffle(self.all_numbers)
+        self.cards_by_user: Dict[int, List[CardProgress]] = {}
+        self.cards_by_number: Dict[int, List[CardProgress]] = {}
+        self.best_by_user: Dict[int, int] = {}  # user_id -> fewest cells left on any line
+        self.last_changed_users: Set[int] = set()  # users whose best card improved on the last call
+    
+    def register_card(self, card_id: int, user_id: int, numbers: List[List[int]]):
+        """Track a card in play so each call updates only the cards holding that number"""
+        progress = CardProgress(card_id, user_id, numbers)
+        self.cards_by_user.setdefault(user_id, []).append(progress)
+        for number in progress.lines_by_number:
+            self.cards_by_number.setdefault(number, []).append(progress)
+            if number in self.called_numbers:
+                progress.call(number)
+        self.best_by_user[user_id] = min(self.best_by_user.get(user_id, 5), progress.best)
     
     def call_next_number(self) -> Tuple[int, str]:
         """Get next number to call"""
@@ -39,10 +85,31 @@ class BingoGameLogic:
         
         number = self.all_numbers[len(self.called_numbers)]
         self.called_numbers.add(number)
+        self.last_changed_users = self._update_progress(number)
         
         letter = self._get_letter(number)
         return number, letter
     
+    def _update_progress(self, number: int) -> Set[int]:
+        changed = set()
+        for progress in self.cards_by_number.get(number, ()):
+            if progress.call(number) and progress.best < self.best_by_user[progress.user_id]:
+                self.best_by_user[progress.user_id] = progress.best
+                changed.add(progress.user_id)
+        return changed
+    
+    def closeness_summary(self) -> Dict[str, int]:
+        """Players whose best card is one number from a line, or already complete"""
+        bests = self.best_by_user.values()
+        return {
+            "one_away": sum(1 for best in bests if best == 1),
+            "complete": sum(1 for best in bests if best == 0),
+        }
+    
+    def card_progress(self, user_id: int) -> Dict[int, int]:
+        """Fewest cells left on any line of each of the user's cards"""
+        return {p.card_id: p.best for p in self.cards_by_user.get(user_id, ())}
+    
     def _get_letter(self, number: int) -> str:
         """Get bingo letter for a number"""
         if 1 <= number <= 15:
@@ -0,0 +1,44 @@
+import asyncio
+import contextvars
+import logging
+from typing import Coroutine, Dict
+
+logger = logging.getLogger(__name__)
+
+
+class GameScheduler:
+    """Owns the per-room number calling tasks so they can be stopped on shutdown"""
+
+    def __init__(self):
+        self.tasks: Dict[int, asyncio.Task] = {}  # room_id -> running loop
+
+    def start(self, room_id: int, loop: Coroutine) -> bool:
+        if self.is_running(room_id):
+            loop.close()
+            return False
+
+        # A fresh context: the loop outlives the request that started the game
+        task = asyncio.create_task(loop, context=contextvars.Context())
+        self.tasks[room_id] = task
+        task.add_done_callback(lambda done: self._finished(room_id, done))
+        return True
+
+    def is_running(self, room_id: int) -> bool:
+        task = self.tasks.get(room_id)
+        return task is not None and not task.done()
+
+    def _finished(self, room_id: int, task: asyncio.Task):
+        if self.tasks.get(room_id) is task:
+            del self.tasks[room_id]
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Error in game loop for room %s", room_id, exc_info=task.exception())
+
+    async def shutdown(self):
+        tasks = list(self.tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.tasks.clear()
+
+
+scheduler = GameScheduler()
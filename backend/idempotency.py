@@ -0,0 +1,127 @@
+"""Idempotency-Key support for endpoints that move money or seats.
+
+The first call with a given key runs the operation and keeps its result
+(including 4xx errors) for ``IDEMPOTENCY_TTL`` seconds; repeats get the same
+result from memory without touching the database, and duplicates arriving
+while the first call is still running wait for it. Reusing a key with
+different parameters is rejected. Results live in this worker's memory, so
+deployments with several workers should route a user's requests consistently.
+"""
+import asyncio
+import inspect
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+from fastapi import Header, HTTPException
+from fastapi.encoders import jsonable_encoder
+from backend.config import settings
+
+MAX_KEY_LENGTH = 255
+
+
+def get_idempotency_key(idempotency_key: Optional[str] = Header(None)) -> Optional[str]:
+    if idempotency_key is not None and not 0 < len(idempotency_key) <= MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail="Invalid Idempotency-Key")
+    return idempotency_key
+
+
+class IdempotencyStore:
+    """Bounded LRU of (user, operation, key) -> first result, each kept for a TTL"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()  # -> (expires_at, fingerprint, future)
+        self.replays = 0
+        self.waits = 0
+
+    def _get(self, entry_key: tuple) -> Optional[tuple]:
+        entry = self._entries.get(entry_key)
+        if entry is None:
+            return None
+        # Calls still in flight never expire
+        if entry[0] < time.monotonic() and entry[2].done():
+            del self._entries[entry_key]
+            return None
+        self._entries.move_to_end(entry_key)
+        return entry
+
+    def _put(self, entry_key: tuple, fingerprint: str, future: asyncio.Future):
+        self._entries[entry_key] = (time.monotonic() + self.ttl, fingerprint, future)
+        self._entries.move_to_end(entry_key)
+        excess = len(self._entries) - self.maxsize
+        if excess <= 0:
+            return
+        # Least recently used finished entries go first. A call still in flight is never
+        # evicted, or a retry would run it a second time; the store may briefly exceed maxsize.
+        evicted = []
+        for old_key, (_, _, old_future) in self._entries.items():
+            if len(evicted) >= excess:
+                break
+            if old_future.done():
+                evicted.append(old_key)
+        for old_key in evicted:
+            del self._entries[old_key]
+
+    async def run(self, user_id: int, operation: str, key: Optional[str], params: Any, call: Callable) -> Any:
+        """Run ``call`` once per key and return its JSON-encoded result"""
+        if key is None:
+            return await _invoke(call)
+
+        entry_key = (user_id, operation, key)
+        fingerprint = json.dumps(jsonable_encoder(params), sort_keys=True)
+        entry = self._get(entry_key)
+        if entry is not None:
+            if entry[1] != fingerprint:
+                raise HTTPException(status_code=422, detail="Idempotency-Key was used with different parameters")
+            if entry[2].done():
+                self.replays += 1
+            else:
+                self.waits += 1
+            # Shielded so a waiter going away does not cancel the shared call
+            return await asyncio.shield(entry[2])
+
+        future = asyncio.get_running_loop().create_future()
+        self._put(entry_key, fingerprint, future)
+        try:
+            result = jsonable_encoder(await _invoke(call))
+        except HTTPException as e:
+            if e.status_code >= 500:
+                self._entries.pop(entry_key, None)
+            _settle(future, e)
+            raise
+        except BaseException as e:
+            # Unexpected failures are not remembered; a retry runs again
+            self._entries.pop(entry_key, None)
+            _settle(future, e)
+            raise
+        future.set_result(result)
+        return result
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "replays": self.replays,
+            "waits": self.waits,
+        }
+
+
+async def _invoke(call: Callable) -> Any:
+    result = call()
+    if inspect.isawaitable(result):
+        result = await result
+    return result
+
+
+def _settle(future: asyncio.Future, error: BaseException):
+    if isinstance(error, Exception):
+        future.set_exception(error)
+        # Mark it retrieved; nobody may be waiting on it
+        future.exception()
+    else:
+        future.cancel()
+
+
+idempotency = IdempotencyStore(settings.IDEMPOTENCY_CACHE_SIZE, settings.IDEMPOTENCY_TTL)
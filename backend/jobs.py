@@ -0,0 +1,337 @@
+"""CPU-heavy batch jobs run in a process pool, away from the event loop.
+
+A job is split into chunks when it is submitted, and each chunk runs as
+one task in a pool of ``JOB_WORKERS`` processes. The processes are spawned
+fresh, get their own database connections, and are reniced by ``JOB_NICE``
+so live games on the same node keep the CPU. Progress is the share of
+chunks finished. Chunk results can be streamed as they arrive, and
+cancelling a job drops the chunks that have not started yet.
+
+Jobs are submitted through ``/api/admin/jobs``. They can also run in the
+foreground::
+
+    python -m backend.jobs generate_cards count=50000
+    python -m backend.jobs simulate games=2000 players=50
+    python -m backend.jobs reconcile
+"""
+import asyncio
+import contextvars
+import json
+import logging
+import multiprocessing
+import os
+import random
+import sys
+import time
+import uuid
+from collections import Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+from sqlalchemy import case, func
+from backend.config import settings
+from backend.database import SessionLocal
+from backend.game_logic import BingoCardGenerator, CardProgress
+from backend.metrics import registry
+from backend.models import BingoCard, GameParticipant, GameRoom, User
+
+logger = logging.getLogger(__name__)
+
+CARDS_PER_CHUNK = 2000
+GAMES_PER_CHUNK = 100
+ROWS_PER_CHUNK = 5000
+
+jobs_finished = registry.counter("jobs_finished_total", "Background jobs by kind and final status", ("kind", "status"))
+
+
+# Chunk functions run in the pool processes and must stay module-level
+
+def _generate_cards_chunk(count: int, user_id: Optional[int]) -> dict:
+    cards = [BingoCard(user_id=user_id, numbers=numbers) for numbers in BingoCardGenerator.generate_multiple_cards(count)]
+    db = SessionLocal()
+    try:
+        db.add_all(cards)
+        db.flush()
+        ids = [card.id for card in cards]
+        db.commit()
+    finally:
+        db.close()
+    return {"cards": len(ids), "first_id": min(ids), "last_id": max(ids)}
+
+
+def _simulate_chunk(seed: int, games: int, players: int, cards_per_player: int) -> dict:
+    """Play games with random draws; count calls until the first line and how often it is shared"""
+    random.seed(seed)
+    calls_to_win: Counter = Counter()
+    shared_wins = 0
+    for _ in range(games):
+        cards_by_number: Dict[int, List[CardProgress]] = {}
+        for index in range(players * cards_per_player):
+            progress = CardProgress(index, index // cards_per_player, BingoCardGenerator.generate_card())
+            for number in progress.lines_by_number:
+                cards_by_number.setdefault(number, []).append(progress)
+
+        draws = random.sample(range(1, 76), 75)
+        for calls, number in enumerate(draws, start=1):
+            winners = set()
+            for progress in cards_by_number.get(number, ()):
+                progress.call(number)
+                if progress.best == 0:
+                    winners.add(progress.user_id)
+            if winners:
+                calls_to_win[calls] += 1
+                shared_wins += len(winners) > 1
+                break
+    return {"games": games, "calls_to_win": dict(calls_to_win), "shared_wins": shared_wins}
+
+
+def _reconcile_chunk(table: str, first_id: int, last_id: int) -> dict:
+    """Findings for one id range: negative balances, or rooms whose pot does not add up"""
+    db = SessionLocal()
+    try:
+        findings = []
+        if table == "users":
+            for user_id, balance, bonus_balance in db.query(User.id, User.balance, User.bonus_balance).filter(
+                User.id.between(first_id, last_id),
+                (User.balance < 0) | (User.bonus_balance < 0)
+            ):
+                findings.append({"user_id": user_id, "issue": "negative_balance", "balance": balance, "bonus_balance": bonus_balance})
+            return {"table": table, "first_id": first_id, "last_id": last_id, "findings": findings}
+
+        rows = db.query(
+            GameRoom.id, GameRoom.current_players,
+            func.count(GameParticipant.id),
+            func.sum(case((GameParticipant.status == "won", 1), else_=0))
+        ).outerjoin(GameParticipant, GameParticipant.room_id == GameRoom.id).filter(
+            GameRoom.id.between(first_id, last_id),
+            GameRoom.status == "finished"
+        ).group_by(GameRoom.id, GameRoom.current_players)
+        for room_id, current_players, participants, winners in rows:
+            # The pot is stake x current_players, so both must match what was actually staked and paid
+            if participants != current_players:
+                findings.append({"room_id": room_id, "issue": "player_count_mismatch", "current_players": current_players, "participants": participants})
+            if (winners or 0) > 1:
+                findings.append({"room_id": room_id, "issue": "pot_paid_more_than_once", "winners": winners})
+        return {"table": table, "first_id": first_id, "last_id": last_id, "findings": findings}
+    finally:
+        db.close()
+
+
+# Planners run in a thread on the server and return one argument tuple per chunk
+
+def _split(total: int, size: int) -> List[int]:
+    return [min(size, total - start) for start in range(0, total, size)]
+
+
+def _plan_generate_cards(params: dict) -> List[tuple]:
+    count = int(params.get("count", 1000))
+    if not 0 < count <= 1_000_000:
+        raise ValueError("count must be between 1 and 1000000")
+    user_id = int(params["user_id"]) if params.get("user_id") is not None else None  # unassigned inventory by default
+    return [(size, user_id) for size in _split(count, CARDS_PER_CHUNK)]
+
+
+def _plan_simulate(params: dict) -> List[tuple]:
+    games = int(params.get("games", 1000))
+    players = int(params.get("players", 20))
+    cards_per_player = int(params.get("cards_per_player", 1))
+    if not (0 < games <= 1_000_000 and 0 < players <= settings.MAX_PLAYERS_PER_ROOM
+            and 0 < cards_per_player <= settings.MAX_CARDS_PER_PLAYER):
+        raise ValueError("games, players or cards_per_player out of range")
+    seed = int(params.get("seed", time.time_ns()))
+    return [
+        (seed + index, size, players, cards_per_player)
+        for index, size in enumerate(_split(games, GAMES_PER_CHUNK))
+    ]
+
+
+def _plan_reconcile(params: dict) -> List[tuple]:
+    db = SessionLocal()
+    try:
+        max_ids = {"users": db.query(func.max(User.id)).scalar() or 0, "rooms": db.query(func.max(GameRoom.id)).scalar() or 0}
+    finally:
+        db.close()
+    return [
+        (table, start, start + ROWS_PER_CHUNK - 1)
+        for table, max_id in max_ids.items()
+        for start in range(1, max_id + 1, ROWS_PER_CHUNK)
+    ]
+
+
+class JobKind(NamedTuple):
+    plan: Callable[[dict], List[tuple]]
+    run: Callable[..., Any]
+
+
+KINDS: Dict[str, JobKind] = {
+    "generate_cards": JobKind(_plan_generate_cards, _generate_cards_chunk),
+    "simulate": JobKind(_plan_simulate, _simulate_chunk),
+    "reconcile": JobKind(_plan_reconcile, _reconcile_chunk),
+}
+
+
+def _init_worker(nice: int):
+    if nice and hasattr(os, "nice"):
+        os.nice(nice)
+
+
+class Job:
+    def __init__(self, kind: str, params: dict):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.params = params
+        self.status = "queued"  # queued, running, completed, failed, cancelled
+        self.total = 0
+        self.done = 0
+        self.results: List[dict] = []  # chunk results in completion order
+        self.error: Optional[str] = None
+        self.created_at = datetime.utcnow()
+        self.finished_at: Optional[datetime] = None
+        self.task: Optional[asyncio.Task] = None
+        self.changed = asyncio.Condition()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("completed", "failed", "cancelled")
+
+    async def notify(self):
+        async with self.changed:
+            self.changed.notify_all()
+
+    def summary(self) -> dict:
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "params": self.params,
+            "status": self.status,
+            "progress": self.done / self.total if self.total else float(self.status == "completed"),
+            "chunks": {"done": self.done, "total": self.total},
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobRunner:
+    def __init__(self, workers: int, history: int):
+        self.workers = workers
+        self.history = history
+        self.jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # Spawned, not forked: children must not inherit the loop, its threads or open sockets
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(settings.JOB_NICE,)
+            )
+        return self._executor
+
+    def submit(self, kind: str, params: dict) -> Job:
+        if kind not in KINDS:
+            raise KeyError(kind)
+        job = Job(kind, params)
+        self.jobs[job.id] = job
+        self._trim()
+        job.task = asyncio.create_task(self._run(job), context=contextvars.Context())
+        return job
+
+    def _trim(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.finished]
+        for job_id in finished[:max(len(self.jobs) - self.history, 0)]:
+            del self.jobs[job_id]
+
+    async def _run(self, job: Job):
+        kind = KINDS[job.kind]
+        loop = asyncio.get_running_loop()
+        pending = set()
+        try:
+            chunks = await asyncio.to_thread(kind.plan, job.params)
+            job.total = len(chunks)
+            job.status = "running"
+            await job.notify()
+
+            # At most one chunk per worker in flight, so other jobs and cancellation are not stuck behind a long queue
+            queue = iter(chunks)
+            for args in queue:
+                pending.add(loop.run_in_executor(self.executor, kind.run, *args))
+                if len(pending) >= self.workers:
+                    break
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    job.results.append(future.result())
+                    job.done += 1
+                for args in queue:
+                    pending.add(loop.run_in_executor(self.executor, kind.run, *args))
+                    if len(pending) >= self.workers:
+                        break
+                await job.notify()
+            job.status = "completed"
+        except asyncio.CancelledError:
+            job.status = "cancelled"
+        except Exception as e:
+            logger.exception("Job %s (%s) failed", job.id, job.kind)
+            job.status = "failed"
+            job.error = f"{type(e).__name__}: {e}"
+        finally:
+            # Chunks already running in a worker finish there; their results are dropped
+            for future in pending:
+                future.cancel()
+            job.finished_at = datetime.utcnow()
+            jobs_finished.inc(job.kind, job.status)
+            await job.notify()
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        job = self.jobs.get(job_id)
+        if job is not None and not job.finished:
+            job.task.cancel()
+        return job
+
+    async def stream(self, job: Job):
+        """Yield chunk results as they arrive, then the job's final summary"""
+        sent = 0
+        while True:
+            async with job.changed:
+                await job.changed.wait_for(lambda: len(job.results) > sent or job.finished)
+            while sent < len(job.results):
+                yield job.results[sent]
+                sent += 1
+            if job.finished:
+                yield job.summary()
+                return
+
+    async def shutdown(self):
+        for job in list(self.jobs.values()):
+            if not job.finished:
+                job.task.cancel()
+        await asyncio.gather(*(job.task for job in self.jobs.values()), return_exceptions=True)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+runner = JobRunner(settings.JOB_WORKERS, settings.JOB_HISTORY)
+
+
+async def _main(kind: str, params: dict) -> int:
+    job = runner.submit(kind, params)
+    try:
+        async for item in runner.stream(job):
+            print(json.dumps(item, default=str))
+            if job.total and not job.finished:
+                print(f"{job.done}/{job.total} chunks", file=sys.stderr)
+    finally:
+        await runner.shutdown()
+    return 0 if job.status == "completed" else 1
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in KINDS:
+        print(__doc__)
+        sys.exit(2)
+    sys.exit(asyncio.run(_main(sys.argv[1], dict(arg.split("=", 1) for arg in sys.argv[2:]))))
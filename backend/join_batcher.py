@@ -0,0 +1,225 @@
+"""Per-room join admission in micro-batches.
+
+Joins for a room that arrive within ``JOIN_BATCH_WINDOW`` seconds of each
+other are admitted together in one transaction. The room row is locked once,
+its status and capacity, the players' cards and their balances are checked
+for the whole batch, and every stake is debited with a single conditional
+UPDATE. The participants are inserted together and the room gets one
+player-count update, one lobby push and one ``player_joined`` broadcast
+listing everyone admitted. Batches for the same room run one at a time.
+"""
+import asyncio
+import contextvars
+import logging
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+from fastapi import HTTPException
+from sqlalchemy import update
+from backend.config import settings
+from backend.database import SessionLocal
+from backend.lobby import lobby
+from backend.metrics import registry
+from backend.models import BingoCard, GameParticipant, GameRoom, User
+from backend.websocket_manager import manager
+
+logger = logging.getLogger(__name__)
+
+batch_sizes = registry.histogram(
+    "game_join_batch_size", "Joins admitted per batch transaction",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128)
+)
+
+
+class _Join(NamedTuple):
+    user: dict  # cached profile
+    card_ids: List[int]
+    future: asyncio.Future
+
+
+class JoinBatcher:
+    def __init__(self, window: float, max_batch: int):
+        self.window = window
+        self.max_batch = max_batch
+        self._pending: Dict[int, List[_Join]] = {}  # room_id -> joins waiting for the next batch
+        self._timers: Dict[int, asyncio.TimerHandle] = {}
+        self._running: Set[int] = set()
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def admit(self, room_id: int, user: dict, card_ids: List[int]) -> dict:
+        """Queue a join for the room's next batch and return the new participant"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        pending = self._pending.setdefault(room_id, [])
+        pending.append(_Join(user, card_ids, future))
+
+        if len(pending) >= self.max_batch:
+            self._dispatch(room_id)
+        elif room_id not in self._timers:
+            # A fresh context so batch work is not attributed to whichever request came first
+            self._timers[room_id] = loop.call_later(
+                self.window, self._dispatch, room_id, context=contextvars.Context()
+            )
+        return await future
+
+    def _take(self, room_id: int) -> List[_Join]:
+        pending = self._pending.pop(room_id, [])
+        if len(pending) > self.max_batch:
+            self._pending[room_id] = pending[self.max_batch:]
+            pending = pending[:self.max_batch]
+        return pending
+
+    def _dispatch(self, room_id: int):
+        timer = self._timers.pop(room_id, None)
+        if timer is not None:
+            timer.cancel()
+        # A running batch picks up whatever arrived meanwhile when it finishes
+        if room_id in self._running or room_id not in self._pending:
+            return
+        self._running.add(room_id)
+        task = asyncio.create_task(self._run(room_id), context=contextvars.Context())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, room_id: int):
+        try:
+            while room_id in self._pending:
+                timer = self._timers.pop(room_id, None)
+                if timer is not None:
+                    timer.cancel()
+                await self._admit_batch(room_id, self._take(room_id))
+        finally:
+            self._running.discard(room_id)
+
+    async def _admit_batch(self, room_id: int, batch: List[_Join]):
+        try:
+            results, room = await asyncio.to_thread(self._apply, room_id, batch)
+        except Exception:
+            logger.exception("Error admitting joins for room %s", room_id)
+            results, room = [HTTPException(status_code=503, detail="Could not join, please retry")] * len(batch), None
+
+        admitted = []
+        for join, result in zip(batch, results):
+            if join.future.done():
+                continue
+            if isinstance(result, Exception):
+                join.future.set_exception(result)
+            else:
+                join.future.set_result(result)
+                admitted.append(join.user)
+
+        if room is None or not admitted:
+            return
+        batch_sizes.observe(len(admitted))
+        await lobby.update_room(room)
+        users = [
+            {"id": user["id"], "username": user["username"], "first_name": user["first_name"]}
+            for user in admitted
+        ]
+        # Same event as a single join: clients reading ``user`` get the latest player, ``users`` has them all
+        await manager.broadcast_to_room(room_id, {
+            "type": "player_joined",
+            "player_count": room.current_players,
+            "user": users[-1],
+            "users": users
+        })
+
+    def _apply(self, room_id: int, batch: List[_Join]) -> Tuple[list, Optional[GameRoom]]:
+        """One transaction for the whole batch; returns a participant dict or an error per join"""
+        # Loaded attributes stay readable after commit for the lobby and broadcast
+        db = SessionLocal(expire_on_commit=False)
+        try:
+            room = db.query(GameRoom).filter(GameRoom.id == room_id).with_for_update().first()
+            if not room:
+                return [HTTPException(status_code=404, detail="Room not found")] * len(batch), None
+            # Checked under the row lock: the game may have started since these joins were queued
+            if room.status != "waiting":
+                return [HTTPException(status_code=400, detail="Game already started")] * len(batch), None
+
+            user_ids = [join.user["id"] for join in batch]
+            seen = {
+                user_id for (user_id,) in db.query(GameParticipant.user_id).filter(
+                    GameParticipant.room_id == room_id,
+                    GameParticipant.user_id.in_(user_ids)
+                )
+            }
+            card_owners = dict(db.query(BingoCard.id, BingoCard.user_id).filter(
+                BingoCard.id.in_({card_id for join in batch for card_id in join.card_ids})
+            ))
+            results: list = [None] * len(batch)
+            candidates = []
+            for index, user_id in enumerate(user_ids):
+                card_ids = batch[index].card_ids
+                if user_id in seen:
+                    results[index] = HTTPException(status_code=400, detail="Already in this game")
+                elif not 0 < len(set(card_ids)) == len(card_ids) <= settings.MAX_CARDS_PER_PLAYER:
+                    results[index] = HTTPException(
+                        status_code=400, detail=f"Choose 1 to {settings.MAX_CARDS_PER_PLAYER} different cards"
+                    )
+                elif any(card_owners.get(card_id) != user_id for card_id in card_ids):
+                    results[index] = HTTPException(status_code=400, detail="Card not found")
+                else:
+                    seen.add(user_id)
+                    candidates.append(index)
+
+            seats = max(room.max_players - room.current_players, 0)
+            funded: Set[int] = set()
+            if candidates and seats:
+                # Debit every candidate whose balance covers the stake in one statement
+                funded = set(db.scalars(
+                    update(User)
+                    .where(User.id.in_([user_ids[i] for i in candidates]), User.balance >= room.stake_amount)
+                    .values(balance=User.balance - room.stake_amount)
+                    .returning(User.id),
+                    execution_options={"synchronize_session": False}
+                ))
+
+            admitted, refunds = [], []
+            for index in candidates:
+                user_id = user_ids[index]
+                if not seats:
+                    results[index] = HTTPException(status_code=400, detail="Room is full")
+                elif user_id not in funded:
+                    results[index] = HTTPException(status_code=400, detail="Insufficient balance")
+                elif len(admitted) >= seats:
+                    refunds.append(user_id)
+                    results[index] = HTTPException(status_code=400, detail="Room is full")
+                else:
+                    admitted.append(index)
+
+            if refunds:
+                db.execute(
+                    update(User).where(User.id.in_(refunds))
+                    .values(balance=User.balance + room.stake_amount),
+                    execution_options={"synchronize_session": False}
+                )
+
+            participants = [
+                GameParticipant(
+                    user_id=user_ids[index],
+                    room_id=room_id,
+                    card_numbers=batch[index].card_ids,
+                    status="playing",
+                    cards_marked={}
+                )
+                for index in admitted
+            ]
+            db.add_all(participants)
+            room.current_players += len(participants)
+            db.flush()
+
+            for index, participant in zip(admitted, participants):
+                results[index] = {
+                    "id": participant.id,
+                    "user_id": participant.user_id,
+                    "room_id": participant.room_id,
+                    "card_numbers": participant.card_numbers,
+                    "cards_marked": participant.cards_marked,
+                    "status": participant.status,
+                    "joined_at": participant.joined_at,
+                }
+            db.commit()
+            return results, room
+        finally:
+            db.close()
+
+
+join_batcher = JoinBatcher(settings.JOIN_BATCH_WINDOW, settings.JOIN_BATCH_MAX)
@@ -0,0 +1,397 @@
+"""End-to-end load test against a running app.
+
+Start the app against a local database (a short call delay keeps games
+brief), then run the harness with the same environment so the bot token and
+database match::
+
+    NUMBER_CALL_DELAY=1 uvicorn backend.app:app
+    python -m backend.loadtest --players 2000 --rooms 20 --out baseline.json
+    python -m backend.loadtest --players 2000 --rooms 20 --compare baseline.json
+
+Players log in through ``/api/auth/login`` with signed initData, generate
+cards, join seeded rooms and hold a game WebSocket each, then mark called
+numbers after a human-like delay and claim as soon as a line is complete.
+Rooms and balances are seeded directly in the database. The JSON summary
+reports per-operation throughput, latency percentiles and error rates plus
+number-call fan-out lag and how many claims won; ``--compare`` adds the
+change against a previous summary and exits non-zero when a p99 regresses
+beyond ``--tolerance``.
+
+Setup concurrency defaults to the app's database pool size (read from the
+engine built from the same environment), so requests do not queue for a
+connection behind the overflow kept for game loops and workers.
+"""
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import random
+import sys
+import time
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional
+from urllib.parse import urlencode
+import httpx
+import websockets
+from backend.config import settings
+from backend.database import SessionLocal, engine
+from backend.models import GameRoom, User
+
+# Expected rejections that are part of normal play, not failures
+EXPECTED_STATUSES = {"check_win": {400}}
+
+CLAIM_PATH_NOTE = (
+    "Each player claims once, on the first card whose marks complete a line; "
+    "a rejected claim is not retried, and only the first winner in a room is paid"
+)
+
+
+def pool_limits() -> tuple:
+    """(pool size, size plus overflow) of the app's engine; None where the pool is unbounded"""
+    size = getattr(engine.pool, "size", None)
+    if size is None:
+        return None, None
+    overflow = getattr(engine.pool, "_max_overflow", 0)
+    return size(), size() + overflow if overflow >= 0 else None
+
+
+def sign_init_data(bot_token: str, user: dict) -> str:
+    """Build initData the way the Telegram client signs it"""
+    fields = {"auth_date": str(int(time.time())), "query_id": "loadtest", "user": json.dumps(user)}
+    data_check_string = "\n".join(f"{key}={value}" for key, value in sorted(fields.items()))
+    secret_key = hmac.new(b"WebAppData", bot_token.encode(), hashlib.sha256).digest()
+    fields["hash"] = hmac.new(secret_key, data_check_string.encode(), hashlib.sha256).hexdigest()
+    return urlencode(fields)
+
+
+def percentile(values: List[float], fraction: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+def summarize(values: List[float]) -> dict:
+    return {
+        "count": len(values),
+        "p50": percentile(values, 0.50),
+        "p90": percentile(values, 0.90),
+        "p99": percentile(values, 0.99),
+        "max": max(values) if values else None,
+    }
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Counter] = defaultdict(Counter)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.fanout_lag: List[float] = []
+        self.started = time.perf_counter()
+
+    def record(self, operation: str, seconds: float, status):
+        self.latencies[operation].append(seconds)
+        self.statuses[operation][str(status)] += 1
+        expected = EXPECTED_STATUSES.get(operation, set())
+        if not (isinstance(status, int) and (status < 400 or status in expected)):
+            self.errors[operation] += 1
+
+    def summary(self) -> dict:
+        elapsed = time.perf_counter() - self.started
+        operations = {}
+        for operation, latencies in self.latencies.items():
+            operations[operation] = {
+                **summarize(latencies),
+                "throughput": len(latencies) / elapsed if elapsed else 0.0,
+                "errors": self.errors[operation],
+                "error_rate": self.errors[operation] / len(latencies),
+                "statuses": dict(self.statuses[operation]),
+            }
+        return {"elapsed": elapsed, "operations": operations, "fanout_lag": summarize(self.fanout_lag)}
+
+
+class Player:
+    def __init__(self, telegram_id: int, room_id: int):
+        self.telegram_id = telegram_id
+        self.room_id = room_id
+        self.user_id: Optional[int] = None
+        self.token: Optional[str] = None
+        self.cards: List[dict] = []
+        self.marked: List[set] = []
+        self.claimed = False
+        self.claim: Optional[asyncio.Task] = None
+
+
+class LoadTest:
+    def __init__(self, args):
+        self.args = args
+        self.recorder = Recorder()
+        self.client: Optional[httpx.AsyncClient] = None
+        self.setup_slots = asyncio.Semaphore(args.concurrency)
+        self.rooms_done: Dict[int, asyncio.Event] = {}
+        self.sockets = Counter()
+        self.claims = Counter()
+
+    async def request(self, operation: str, method: str, path: str, player: Optional[Player] = None, **kwargs):
+        headers = {"Authorization": f"Bearer {player.token}"} if player and player.token else {}
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, path, headers=headers, **kwargs)
+        except httpx.HTTPError as e:
+            self.recorder.record(operation, time.perf_counter() - started, type(e).__name__)
+            return None
+        self.recorder.record(operation, time.perf_counter() - started, response.status_code)
+        return response
+
+    def seed_rooms(self) -> List[int]:
+        per_room = -(-self.args.players // self.args.rooms)
+        db = SessionLocal()
+        try:
+            rooms = [
+                GameRoom(
+                    name=f"loadtest {i + 1}",
+                    stake_amount=self.args.stake,
+                    max_players=per_room,
+                    status="waiting",
+                )
+                for i in range(self.args.rooms)
+            ]
+            db.add_all(rooms)
+            db.commit()
+            return [room.id for room in rooms]
+        finally:
+            db.close()
+
+    def fund(self, players: List[Player]):
+        db = SessionLocal()
+        try:
+            db.query(User).filter(User.id.in_([p.user_id for p in players if p.user_id])).update(
+                {User.balance: self.args.stake}, synchronize_session=False
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    async def login(self, player: Player, delay: float):
+        await asyncio.sleep(delay)
+        async with self.setup_slots:
+            user = {"id": player.telegram_id, "first_name": f"Load {player.telegram_id}", "username": f"load{player.telegram_id}"}
+            response = await self.request(
+                "login", "POST", "/api/auth/login",
+                json={"init_data": sign_init_data(self.args.bot_token, user)}
+            )
+            if response is None or response.status_code != 200:
+                return
+            body = response.json()
+            player.token = body["access_token"]
+            player.user_id = body["user"]["id"]
+
+    async def join(self, player: Player):
+        async with self.setup_slots:
+            response = await self.request(
+                "generate_cards", "POST", "/api/games/generate-cards", player, params={"count": self.args.cards}
+            )
+            if response is None or response.status_code != 200:
+                return False
+            player.cards = response.json()["cards"]
+            player.marked = [{0} for _ in player.cards]
+
+            response = await self.request(
+                "join_game", "POST", "/api/games/join-game", player,
+                params={"room_id": player.room_id, "card_ids": [card["id"] for card in player.cards]}
+            )
+            return response is not None and response.status_code == 200
+
+    async def play(self, player: Player, connected: asyncio.Event, ready: List[int]):
+        url = self.args.base_url.replace("http", "ws", 1) + f"/ws/game/{player.room_id}?token={player.token}"
+        try:
+            async with websockets.connect(url, open_timeout=30, ping_interval=None) as ws:
+                self.sockets["connected"] += 1
+                ready[0] += 1
+                if ready[0] == ready[1]:
+                    connected.set()
+                pending = set()
+                async for raw in ws:
+                    message = json.loads(raw)
+                    if message.get("type") == "number_called":
+                        if "ts" in message:
+                            self.recorder.fanout_lag.append(time.time() - message["ts"])
+                        task = asyncio.create_task(self.mark(player, message["number"]))
+                        pending.add(task)
+                        task.add_done_callback(pending.discard)
+                        if message.get("total_called") == 75:
+                            self.rooms_done[player.room_id].set()
+                    elif message.get("type") == "player_won":
+                        self.rooms_done[player.room_id].set()
+                    if self.rooms_done[player.room_id].is_set():
+                        break
+                for task in pending:
+                    task.cancel()
+        except (OSError, websockets.WebSocketException, asyncio.TimeoutError) as e:
+            self.sockets[type(e).__name__] += 1
+            ready[0] += 1
+            if ready[0] == ready[1]:
+                connected.set()
+        if player.claim is not None:
+            await player.claim
+
+    async def mark(self, player: Player, number: int):
+        for index, card in enumerate(player.cards):
+            if not any(number in row for row in card["numbers"]):
+                continue
+            await asyncio.sleep(random.uniform(0, self.args.mark_delay))
+            await self.request(
+                "mark_number", "POST", "/api/games/mark-number", player,
+                params={"room_id": player.room_id, "number": number, "card_index": index}
+            )
+            player.marked[index].add(number)
+            if not player.claimed and has_line(card["numbers"], player.marked[index]):
+                player.claimed = True
+                # Its own task: the winner hears player_won before the response, and the
+                # pending marks are cancelled then
+                player.claim = asyncio.create_task(self.claim(player, index))
+
+    async def claim(self, player: Player, card_index: int):
+        response = await self.request(
+            "check_win", "POST", "/api/games/check-win", player,
+            params={"room_id": player.room_id, "card_index": card_index}
+        )
+        if response is None or response.status_code != 200:
+            self.claims["rejected"] += 1
+        elif response.json().get("status") == "won":
+            self.claims["won"] += 1
+        else:
+            self.claims["not_won"] += 1
+
+    async def run_room(self, room_id: int, players: List[Player]):
+        self.rooms_done[room_id] = asyncio.Event()
+        joined = [p for p in await asyncio.gather(*(self._joined(p) for p in players)) if p]
+        if not joined:
+            self.rooms_done[room_id].set()
+            return
+
+        connected = asyncio.Event()
+        ready = [0, len(joined)]
+        sockets = [asyncio.create_task(self.play(p, connected, ready)) for p in joined]
+        await connected.wait()
+        await self.request("start_game", "POST", f"/api/games/start-game/{room_id}")
+        await asyncio.gather(*sockets)
+
+    async def _joined(self, player: Player) -> Optional[Player]:
+        return player if player.token and await self.join(player) else None
+
+    async def run(self) -> dict:
+        room_ids = self.seed_rooms()
+        players = [
+            Player(self.args.telegram_id_start + i, room_ids[i % len(room_ids)])
+            for i in range(self.args.players)
+        ]
+
+        limits = httpx.Limits(max_connections=self.args.concurrency, max_keepalive_connections=self.args.concurrency)
+        async with httpx.AsyncClient(base_url=self.args.base_url, timeout=30, limits=limits) as client:
+            self.client = client
+            await asyncio.gather(*(
+                self.login(p, self.args.ramp * i / len(players)) for i, p in enumerate(players)
+            ))
+            self.fund(players)
+
+            by_room: Dict[int, List[Player]] = defaultdict(list)
+            for player in players:
+                by_room[player.room_id].append(player)
+            games = asyncio.gather(*(self.run_room(room_id, members) for room_id, members in by_room.items()))
+            try:
+                await asyncio.wait_for(games, self.args.duration)
+                timed_out = False
+            except asyncio.TimeoutError:
+                timed_out = True
+
+        summary = self.recorder.summary()
+        summary["config"] = {
+            key: value for key, value in vars(self.args).items()
+            if key not in ("bot_token", "out", "compare")
+        }
+        summary["websockets"] = dict(self.sockets)
+        summary["rooms_finished"] = sum(event.is_set() for event in self.rooms_done.values())
+        summary["claims"] = {"attempted": sum(self.claims.values()), "won": 0, **self.claims}
+        summary["notes"] = [CLAIM_PATH_NOTE]
+        summary["timed_out"] = timed_out
+        return summary
+
+
+def has_line(numbers: List[List[int]], marked: set) -> bool:
+    cells = [[numbers[i][j] in marked for j in range(5)] for i in range(5)]
+    lines = cells + [list(column) for column in zip(*cells)]
+    lines.append([cells[i][i] for i in range(5)])
+    lines.append([cells[i][4 - i] for i in range(5)])
+    return any(all(line) for line in lines)
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> dict:
+    """Per-operation change against a previous summary"""
+    result = {"regressions": []}
+    names = set(current["operations"]) | set(baseline["operations"])
+    for name in sorted(names):
+        now = current["operations"].get(name, {})
+        before = baseline["operations"].get(name, {})
+        result[name] = {}
+        for metric in ("p50", "p99", "throughput", "error_rate"):
+            a, b = before.get(metric), now.get(metric)
+            change = (b - a) / a if a and b is not None else None
+            result[name][metric] = {"baseline": a, "current": b, "change": change}
+        p99_change = result[name]["p99"]["change"]
+        if p99_change is not None and p99_change > tolerance:
+            result["regressions"].append(name)
+    a, b = baseline["fanout_lag"].get("p99"), current["fanout_lag"].get("p99")
+    result["fanout_lag_p99"] = {"baseline": a, "current": b, "change": (b - a) / a if a and b is not None else None}
+    return result
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--bot-token", default=settings.TELEGRAM_BOT_TOKEN, help="token the app verifies initData with")
+    parser.add_argument("--players", type=int, default=200)
+    parser.add_argument("--rooms", type=int, default=4)
+    parser.add_argument("--cards", type=int, default=2, help="cards per player")
+    parser.add_argument("--stake", type=float, default=10.0)
+    parser.add_argument("--ramp", type=float, default=10.0, help="seconds over which logins are spread")
+    pool_size, pool_capacity = pool_limits()
+    parser.add_argument(
+        "--concurrency", type=int, default=pool_size or 5,
+        help=f"max in-flight setup requests (default: the app's database pool size, {pool_size or 5})"
+    )
+    parser.add_argument("--mark-delay", type=float, default=2.0, help="max seconds a player takes to mark a number")
+    parser.add_argument("--duration", type=float, default=600.0, help="stop the games after this many seconds")
+    parser.add_argument("--telegram-id-start", type=int, default=9_000_000_000)
+    parser.add_argument("--out", help="write the JSON summary here")
+    parser.add_argument("--compare", help="previous summary to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p99 increase as a fraction")
+    args = parser.parse_args(argv)
+
+    if not args.bot_token:
+        parser.error("TELEGRAM_BOT_TOKEN or --bot-token is required to sign initData")
+    if pool_capacity is not None and args.concurrency > pool_capacity:
+        print(
+            f"warning: --concurrency {args.concurrency} exceeds the app's {pool_capacity} database connections; "
+            "latencies will include waiting for the pool",
+            file=sys.stderr
+        )
+
+    summary = asyncio.run(LoadTest(args).run())
+    if args.compare:
+        with open(args.compare) as f:
+            summary["comparison"] = compare(summary, json.load(f), args.tolerance)
+
+    output = json.dumps(summary, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(output)
+    print(output)
+    if summary["rooms_finished"] and not summary["claims"]["won"]:
+        print(f"warning: no claim won in {summary['rooms_finished']} finished rooms; check the mark and claim path", file=sys.stderr)
+    return 1 if summary.get("comparison", {}).get("regressions") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,133 @@
+import asyncio
+import hashlib
+import json
+import logging
+from typing import Dict, List, Optional
+from sqlalchemy.orm import Session
+from backend.config import settings
+from backend.database import SessionLocal
+from backend.models import GameRoom
+from backend.schemas import GameRoomResponse
+from backend.websocket_manager import manager
+
+logger = logging.getLogger(__name__)
+
+LOBBY_STATUSES = ("waiting", "starting")
+
+
+class LobbyCache:
+    """In-memory snapshot of the rooms shown in the lobby.
+
+    The game routes keep the snapshot current as rooms are joined, started and
+    finished. ``run_refresher`` reloads it every ``LOBBY_REFRESH_INTERVAL``
+    seconds, which picks up rooms created outside this worker. The serialized
+    body and its ETag are rebuilt lazily, only after something has changed.
+    """
+
+    def __init__(self):
+        self.rooms: Dict[int, dict] = {}  # room_id -> serialized GameRoomResponse
+        self.loaded = False
+        self.version = 0  # bumped on every change applied by this worker
+        self._body: Optional[bytes] = None
+        self._etag: Optional[str] = None
+
+    @classmethod
+    def fetch(cls, db: Session) -> Dict[int, dict]:
+        rooms = db.query(GameRoom).filter(GameRoom.status.in_(LOBBY_STATUSES)).all()
+        return {room.id: cls._serialize(room) for room in rooms}
+
+    def load(self, db: Session):
+        """Fill the snapshot from the database"""
+        self._replace(self.fetch(db))
+
+    def _replace(self, rooms: Dict[int, dict]):
+        self.rooms = rooms
+        self.loaded = True
+        self.version += 1
+        self._invalidate()
+
+    async def refresh(self) -> bool:
+        """Reload off the loop with a short-lived session; True if the lobby changed"""
+        version = self.version
+
+        def fetch() -> Dict[int, dict]:
+            db = SessionLocal()
+            try:
+                return self.fetch(db)
+            finally:
+                db.close()
+
+        rooms = await asyncio.to_thread(fetch)
+        # A change applied meanwhile may be newer than what was read; the next refresh catches up
+        if self.loaded and (self.version != version or rooms == self.rooms):
+            return False
+        self._replace(rooms)
+        return True
+
+    def ensure_loaded(self, db: Session):
+        if not self.loaded:
+            self.load(db)
+
+    def snapshot(self) -> List[dict]:
+        return [self.rooms[room_id] for room_id in sorted(self.rooms)]
+
+    @property
+    def body(self) -> bytes:
+        if self._body is None:
+            self._body = json.dumps(self.snapshot(), separators=(",", ":")).encode()
+        return self._body
+
+    @property
+    def etag(self) -> str:
+        if self._etag is None:
+            self._etag = '"%s"' % hashlib.sha1(self.body).hexdigest()
+        return self._etag
+
+    async def update_room(self, room: GameRoom):
+        """Apply a room change and push the new lobby to subscribers"""
+        if not self.loaded:
+            return
+        if room.status in LOBBY_STATUSES:
+            self.rooms[room.id] = self._serialize(room)
+        elif self.rooms.pop(room.id, None) is None:
+            return
+        self.version += 1
+        self._invalidate()
+        await self.publish()
+
+    async def remove_room(self, room_id: int):
+        if self.rooms.pop(room_id, None) is None:
+            return
+        self.version += 1
+        self._invalidate()
+        await self.publish()
+
+    async def publish(self):
+        """Push the current snapshot over the lobby WebSocket channel"""
+        await manager.broadcast_to_lobby({
+            "type": "lobby_update",
+            "etag": self.etag,
+            "rooms": self.snapshot()
+        })
+
+    def _invalidate(self):
+        self._body = None
+        self._etag = None
+
+    @staticmethod
+    def _serialize(room: GameRoom) -> dict:
+        return GameRoomResponse.model_validate(room).model_dump(mode="json")
+
+
+lobby = LobbyCache()
+
+
+async def run_refresher(interval: float = settings.LOBBY_REFRESH_INTERVAL):
+    """Reload the lobby periodically and push it when rooms appeared or changed elsewhere"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            if await lobby.refresh():
+                await lobby.publish()
+        except Exception:
+            logger.exception("Error refreshing the lobby")
@@ -0,0 +1,242 @@
+"""Content-addressed storage for profile photos.
+
+Uploads are parsed straight from the request stream, which is abandoned as
+soon as it exceeds the size cap, and stored as ``<sha256>.<ext>``, so
+identical images are kept once. Images whose header claims more pixels than
+Pillow will decode are refused before they are stored. Avatar thumbnails are
+rendered in a worker pool off the event loop.
+"""
+import asyncio
+import contextvars
+import hashlib
+import logging
+import os
+import re
+import time
+import uuid
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Optional, Set
+import aiofiles
+from fastapi import HTTPException, Request
+from sqlalchemy.orm import Session
+from starlette.datastructures import UploadFile
+from starlette.formparsers import MultiPartException, MultiPartParser
+from backend.config import settings
+from backend.database import SessionLocal
+from backend.models import User
+from backend.user_cache import user_cache
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_DIR = "uploads/profiles"
+URL_PREFIX = "/uploads/profiles/"
+CHUNK_SIZE = 64 * 1024
+MULTIPART_OVERHEAD = 16 * 1024  # boundaries and part headers around the photo
+THUMBNAIL_SIZE = (128, 128)
+
+ALLOWED_TYPES = {
+    "image/jpeg": ".jpg",
+    "image/png": ".png",
+    "image/webp": ".webp",
+    "image/gif": ".gif",
+}
+
+FILENAME_PATTERN = re.compile(r"^(?P<digest>[0-9a-f]{64})(\.thumb)?\.(jpg|png|webp|gif)$")
+
+thumbnail_pool = ThreadPoolExecutor(max_workers=settings.THUMBNAIL_WORKERS, thread_name_prefix="thumbnail")
+_background_tasks: Set[asyncio.Task] = set()
+
+
+async def save_upload(file: UploadFile) -> str:
+    """Stream an upload to disk and return its content-addressed filename"""
+    extension = ALLOWED_TYPES.get(file.content_type)
+    if extension is None:
+        raise HTTPException(status_code=415, detail="Unsupported image type")
+
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    temp_path = os.path.join(UPLOAD_DIR, f".upload-{uuid.uuid4().hex}")
+    digest = hashlib.sha256()
+    size = 0
+
+    try:
+        async with aiofiles.open(temp_path, "wb") as out:
+            while True:
+                chunk = await file.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > settings.MAX_PHOTO_BYTES:
+                    raise HTTPException(status_code=413, detail="Photo is too large")
+                digest.update(chunk)
+                await out.write(chunk)
+
+        if size == 0:
+            raise HTTPException(status_code=400, detail="Empty file")
+
+        if await asyncio.get_running_loop().run_in_executor(thumbnail_pool, is_decompression_bomb, temp_path):
+            raise HTTPException(status_code=400, detail="Image dimensions are too large")
+
+        filename = digest.hexdigest() + extension
+        final_path = os.path.join(UPLOAD_DIR, filename)
+        if os.path.exists(final_path):
+            os.remove(temp_path)
+        else:
+            os.replace(temp_path, final_path)
+        return filename
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+async def _capped(stream: AsyncIterator[bytes], limit: int) -> AsyncIterator[bytes]:
+    received = 0
+    async for chunk in stream:
+        received += len(chunk)
+        if received > limit:
+            raise HTTPException(status_code=413, detail="Photo is too large")
+        yield chunk
+
+
+async def receive_photo(request: Request) -> str:
+    """Save the ``file`` part of a multipart upload and return its filename.
+
+    A ``File(...)`` parameter would have the whole body spooled before the
+    endpoint runs, so the form is parsed here from the raw stream instead.
+    """
+    limit = settings.MAX_PHOTO_BYTES + MULTIPART_OVERHEAD
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) > limit:
+        raise HTTPException(status_code=413, detail="Photo is too large")
+    if not request.headers.get("content-type", "").startswith("multipart/form-data"):
+        raise HTTPException(status_code=415, detail="Expected a multipart upload")
+
+    parser = MultiPartParser(request.headers, _capped(request.stream(), limit), max_files=1, max_fields=10)
+    try:
+        form = await parser.parse()
+    except MultiPartException as e:
+        raise HTTPException(status_code=400, detail=e.message)
+    try:
+        file = form.get("file")
+        if not isinstance(file, UploadFile):
+            raise HTTPException(status_code=400, detail="Missing file")
+        return await save_upload(file)
+    finally:
+        await form.close()
+
+
+def is_decompression_bomb(path: str) -> bool:
+    """True when the image header claims more pixels than Pillow allows; reads the header only"""
+    try:
+        from PIL import Image
+    except ImportError:
+        return False
+
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("error", Image.DecompressionBombWarning)
+            with Image.open(path):
+                return False
+    except (Image.DecompressionBombError, Image.DecompressionBombWarning):
+        return True
+    except (OSError, ValueError):
+        # Not an image Pillow can read; the thumbnail step skips it
+        return False
+
+
+def thumbnail_name(filename: str) -> str:
+    return filename.split(".", 1)[0] + ".thumb.jpg"
+
+
+def render_thumbnail(filename: str) -> Optional[str]:
+    """Resize a stored photo to an avatar thumbnail (runs in the worker pool)"""
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+
+    thumb = thumbnail_name(filename)
+    thumb_path = os.path.join(UPLOAD_DIR, thumb)
+    if os.path.exists(thumb_path):
+        return thumb
+
+    temp_path = f"{thumb_path}.{uuid.uuid4().hex}.tmp"
+    try:
+        with Image.open(os.path.join(UPLOAD_DIR, filename)) as image:
+            image = image.convert("RGB")
+            image.thumbnail(THUMBNAIL_SIZE)
+            image.save(temp_path, "JPEG", quality=85, optimize=True)
+        os.replace(temp_path, thumb_path)
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        logger.warning("Error creating thumbnail for %s: %s", filename, e)
+        return None
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return thumb
+
+
+async def create_thumbnail(user_id: int, filename: str):
+    """Render the thumbnail and point the user's photo at it once it exists"""
+    loop = asyncio.get_running_loop()
+    thumb = await loop.run_in_executor(thumbnail_pool, render_thumbnail, filename)
+    if thumb is None:
+        return
+
+    def update_photo_url():
+        db = SessionLocal()
+        try:
+            # Skip if the user has uploaded another photo in the meantime
+            db.query(User).filter(
+                User.id == user_id,
+                User.photo_url == URL_PREFIX + filename
+            ).update({"photo_url": URL_PREFIX + thumb}, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    await loop.run_in_executor(thumbnail_pool, update_photo_url)
+    user_cache.invalidate(user_id)
+
+
+def schedule_thumbnail(user_id: int, filename: str):
+    # Not attributed to the upload request, which has already finished
+    task = asyncio.create_task(create_thumbnail(user_id, filename), context=contextvars.Context())
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+def referenced_digests(db: Session) -> Set[str]:
+    digests = set()
+    for (photo_url,) in db.query(User.photo_url).filter(User.photo_url.like(URL_PREFIX + "%")):
+        match = FILENAME_PATTERN.match(photo_url[len(URL_PREFIX):])
+        if match:
+            digests.add(match.group("digest"))
+    return digests
+
+
+def remove_orphaned_photos(db: Session, min_age: float = 3600) -> int:
+    """Delete stored photos no user points at any more; returns the count removed"""
+    if not os.path.isdir(UPLOAD_DIR):
+        return 0
+
+    keep = referenced_digests(db)
+    cutoff = time.time() - min_age
+    removed = 0
+    for entry in os.scandir(UPLOAD_DIR):
+        match = FILENAME_PATTERN.match(entry.name)
+        if not match or match.group("digest") in keep:
+            continue
+        if entry.stat().st_mtime > cutoff:
+            continue
+        os.remove(entry.path)
+        removed += 1
+    return removed
+
+
+if __name__ == "__main__":
+    db = SessionLocal()
+    try:
+        print(f"Removed {remove_orphaned_photos(db)} orphaned photos")
+    finally:
+        db.close()
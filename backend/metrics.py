@@ -0,0 +1,270 @@
+"""Prometheus text-format metrics without external dependencies.
+
+Collectors are plain counters and fixed-bucket histograms updated in place;
+gauges that mirror existing state (connections, queues, pools) are read only
+when ``/metrics`` is scraped.
+"""
+import bisect
+import time
+from typing import Callable, Dict, Iterable, List, Tuple
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_labels(names: Tuple[str, ...], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        self.values[labels] = self.values.get(labels, 0.0) + amount
+
+    def collect(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} counter"
+        for labels, value in self.values.items():
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {value}"
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self.series: Dict[LabelValues, list] = {}  # labels -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, *labels: str):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [0] * len(self.buckets) + [0.0, 0]
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            series[index] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def time(self, *labels: str) -> "_Timer":
+        return _Timer(self, labels)
+
+    def collect(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        for labels, series in self.series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                bucket_labels = _format_labels(self.labelnames, labels, 'le="%s"' % bound)
+                yield f"{self.name}_bucket{bucket_labels} {cumulative}"
+            bucket_labels = _format_labels(self.labelnames, labels, 'le="+Inf"')
+            yield f"{self.name}_bucket{bucket_labels} {series[-1]}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, labels)} {series[-2]}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, labels)} {series[-1]}"
+
+
+class _Timer:
+    def __init__(self, histogram: Histogram, labels: LabelValues):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+
+
+class Gauge:
+    """Gauge whose samples are computed at scrape time"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...], sample: Callable[[], Dict[LabelValues, float]]):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.sample = sample
+
+    def collect(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} gauge"
+        for labels, value in self.sample().items():
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {value}"
+
+
+class Registry:
+    def __init__(self):
+        self.collectors: List = []
+
+    def register(self, collector):
+        self.collectors.append(collector)
+        return collector
+
+    def counter(self, *args, **kwargs) -> Counter:
+        return self.register(Counter(*args, **kwargs))
+
+    def histogram(self, *args, **kwargs) -> Histogram:
+        return self.register(Histogram(*args, **kwargs))
+
+    def gauge(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        """Decorator registering a function that returns {label values: sample}"""
+        def decorator(sample: Callable[[], Dict[LabelValues, float]]):
+            self.register(Gauge(name, documentation, labelnames, sample))
+            return sample
+        return decorator
+
+    def render(self) -> str:
+        lines = []
+        for collector in self.collectors:
+            try:
+                lines.extend(collector.collect())
+            except Exception as e:
+                lines.append(f"# error collecting {collector.name}: {e}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_request_duration = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", ("method", "route", "status")
+)
+broadcast_duration = registry.histogram(
+    "websocket_broadcast_duration_seconds", "Time to fan a message out to a room", ("type",)
+)
+broadcast_recipients = registry.counter(
+    "websocket_broadcast_recipients_total", "Messages delivered by room broadcasts", ("type",)
+)
+number_call_lag = registry.histogram(
+    "game_number_call_lag_seconds", "Delay of each number call beyond its scheduled time",
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0)
+)
+win_checks = registry.counter("game_win_checks_total", "Win checks by result", ("result",))
+bot_handler_duration = registry.histogram(
+    "bot_handler_duration_seconds", "Telegram bot handler latency", ("handler",)
+)
+
+
+@registry.gauge("websocket_connections", "Open game WebSocket connections")
+def _websocket_connections():
+    from backend.websocket_manager import manager
+
+    return {(): sum(len(connections) for connections in manager.active_connections.values())}
+
+
+@registry.gauge("websocket_lobby_connections", "Open lobby WebSocket connections")
+def _lobby_connections():
+    from backend.websocket_manager import manager
+
+    return {(): len(manager.lobby_connections)}
+
+
+@registry.gauge("websocket_rooms", "Rooms with at least one WebSocket connection")
+def _websocket_rooms():
+    from backend.websocket_manager import manager
+
+    return {(): len(manager.active_connections)}
+
+
+@registry.gauge("game_active_games", "Games with a running number loop")
+def _active_games():
+    from backend.game_scheduler import scheduler
+
+    return {(): len(scheduler.tasks)}
+
+
+@registry.gauge("db_pool_connections", "SQLAlchemy pool connections by state", ("state",))
+def _db_pool():
+    from backend.database import engine
+
+    pool = engine.pool
+    if not hasattr(pool, "checkedout"):
+        return {}
+    return {
+        ("size",): pool.size(),
+        ("checked_out",): pool.checkedout(),
+        ("idle",): pool.checkedin(),
+        ("overflow",): max(pool.overflow(), 0),
+    }
+
+
+@registry.gauge("user_cache", "User profile cache counters", ("stat",))
+def _user_cache():
+    from backend.user_cache import user_cache
+
+    stats = user_cache.stats()
+    return {(key,): stats[key] for key in ("size", "hits", "misses", "evictions", "hit_rate")}
+
+
+@registry.gauge("idempotency_store", "Idempotency-Key store counters", ("stat",))
+def _idempotency():
+    from backend.idempotency import idempotency
+
+    return {(key,): value for key, value in idempotency.stats().items()}
+
+
+@registry.gauge("replay_cache", "Finished-game replay cache counters", ("stat",))
+def _replay_cache():
+    from backend.replays import replays
+
+    return {(key,): value for key, value in replays.stats().items()}
+
+
+@registry.gauge("telegram_send_queue", "Outbound Telegram queue counters", ("stat",))
+def _send_queue():
+    from backend.telegram_client import send_queue
+
+    return {(key,): value for key, value in send_queue.stats().items()}
+
+
+@registry.gauge("telegram_webhook_queue", "Webhook pipeline counters", ("stat",))
+def _webhook_queue():
+    from backend.routes.bot import pipeline
+
+    return {(key,): value for key, value in pipeline.stats().items()}
+
+
+class MetricsMiddleware:
+    """Records request latency labelled by the matched route template"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            # Static files and unknown paths share one label so the series count stays bounded
+            path = getattr(route, "path", None) or "other"
+            http_request_duration.observe(
+                time.perf_counter() - started, scope["method"], path, str(status[0])
+            )
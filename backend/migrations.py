@@ -0,0 +1,381 @@
+"""Versioned schema migrations.
+
+Each migration runs once, in version order, and is recorded in the
+``schema_migrations`` table. Run with::
+
+    python -m backend.migrations upgrade
+    python -m backend.migrations status
+    python -m backend.migrations check-plans
+"""
+import re
+import sys
+from datetime import datetime
+from typing import Callable, List, NamedTuple
+from sqlalchemy import (
+    JSON, Boolean, Column, DateTime, Enum, Float, ForeignKey, Integer, MetaData, String, Table, Text,
+    case, inspect, select, text, update
+)
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import func
+from backend.database import Base, engine, utcnow
+from backend.models import (
+    CalledNumber, GameHistory, GameParticipant, GameRoom, PlayerStats, Transaction, TransactionType, User, Wallet
+)
+
+migration_metadata = MetaData()
+
+schema_migrations = Table(
+    "schema_migrations",
+    migration_metadata,
+    Column("version", Integer, primary_key=True),
+    Column("description", String),
+    Column("applied_at", DateTime, server_default=func.now()),
+)
+
+
+# The schema as it stood before versioned migrations, frozen here so that
+# later model changes only ever reach a database through their own migration
+baseline_metadata = MetaData()
+
+Table(
+    "users", baseline_metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("telegram_id", String, unique=True, index=True),
+    Column("username", String, nullable=True),
+    Column("first_name", String, nullable=True),
+    Column("last_name", String, nullable=True),
+    Column("photo_url", String, nullable=True),
+    Column("language", String),
+    Column("balance", Float),
+    Column("bonus_balance", Float),
+    Column("created_at", DateTime, server_default=func.now()),
+)
+
+Table(
+    "game_rooms", baseline_metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("name", String),
+    Column("stake_amount", Float),
+    Column("max_players", Integer),
+    Column("current_players", Integer),
+    Column("status", String),
+    Column("start_time", DateTime, nullable=True),
+    Column("end_time", DateTime, nullable=True),
+    Column("created_at", DateTime, server_default=func.now()),
+)
+
+Table(
+    "game_participants", baseline_metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("user_id", Integer, ForeignKey("users.id")),
+    Column("room_id", Integer, ForeignKey("game_rooms.id")),
+    Column("card_numbers", JSON),
+    Column("status", String),
+    Column("cards_marked", JSON),
+    Column("joined_at", DateTime, server_default=func.now()),
+)
+
+Table(
+    "bingo_cards", baseline_metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("user_id", Integer, ForeignKey("users.id")),
+    Column("numbers", JSON),
+    Column("created_at", DateTime, server_default=func.now()),
+)
+
+Table(
+    "called_numbers", baseline_metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("room_id", Integer, ForeignKey("game_rooms.id")),
+    Column("number", Integer),
+    Column("called_at", DateTime, server_default=func.now()),
+)
+
+Table(
+    "transactions", baseline_metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("user_id", Integer, ForeignKey("users.id")),
+    Column("type", Enum(TransactionType)),
+    Column("amount", Float),
+    Column("method", String),
+    Column("status", String),
+    Column("transaction_id", String, nullable=True, unique=True),
+    Column("description", Text, nullable=True),
+    Column("created_at", DateTime, server_default=func.now()),
+    Column("updated_at", DateTime, server_default=func.now()),
+)
+
+Table(
+    "wallets", baseline_metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("user_id", Integer, ForeignKey("users.id")),
+    Column("method", String),
+    Column("account_info", JSON),
+    Column("is_primary", Boolean),
+    Column("created_at", DateTime, server_default=func.now()),
+)
+
+
+class Migration(NamedTuple):
+    version: int
+    description: str
+    upgrade: Callable[[Connection], None]
+
+
+def _create_indexes(*names: str) -> Callable[[Connection], None]:
+    def upgrade(conn: Connection):
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                if index.name in names:
+                    index.create(bind=conn, checkfirst=True)
+    return upgrade
+
+
+def _create_player_stats(conn: Connection):
+    PlayerStats.__table__.create(bind=conn, checkfirst=True)
+    # Streaks and period winnings start fresh; totals come from finished games
+    won = GameParticipant.status == "won"
+    totals = (
+        select(
+            GameParticipant.user_id,
+            func.count(),
+            func.sum(case((won, 1), else_=0)),
+            func.sum(case((won, GameRoom.stake_amount * GameRoom.current_players), else_=0.0)),
+            func.max(GameRoom.end_time),
+        )
+        .join(GameRoom, GameRoom.id == GameParticipant.room_id)
+        .where(GameRoom.status == "finished")
+        .group_by(GameParticipant.user_id)
+    )
+    conn.execute(PlayerStats.__table__.insert().from_select(
+        ["user_id", "games_played", "wins", "total_winnings", "last_played_at"], totals
+    ))
+
+
+def _dedupe_wallets(conn: Connection):
+    from backend.payments import account_key
+
+    columns = {
+        table: {column["name"] for column in inspect(conn).get_columns(table)}
+        for table in ("wallets", "transactions")
+    }
+    if "account_key" not in columns["wallets"]:
+        conn.execute(text("ALTER TABLE wallets ADD COLUMN account_key VARCHAR"))
+    if "wallet_id" not in columns["transactions"]:
+        conn.execute(text("ALTER TABLE transactions ADD COLUMN wallet_id INTEGER REFERENCES wallets(id)"))
+
+    # Keep the oldest wallet for each account; withdrawals used to add one per request
+    wallets = Wallet.__table__
+    keep, duplicates = {}, []
+    saved = {}  # (user_id, method) -> [(created_at, kept wallet id)] in save order
+    for row in conn.execute(select(
+        wallets.c.id, wallets.c.user_id, wallets.c.method, wallets.c.account_info, wallets.c.created_at
+    ).order_by(wallets.c.id)):
+        identity = (row.user_id, row.method, account_key(row.account_info))
+        if identity in keep:
+            duplicates.append(row.id)
+        else:
+            keep[identity] = row.id
+        saved.setdefault((row.user_id, row.method), []).append((row.created_at, keep[identity]))
+    if duplicates:
+        conn.execute(wallets.delete().where(wallets.c.id.in_(duplicates)))
+    if keep:
+        conn.execute(
+            text("UPDATE wallets SET account_key = :account_key WHERE id = :id"),
+            [{"id": wallet_id, "account_key": identity[2]} for identity, wallet_id in keep.items()]
+        )
+    _create_indexes("ux_wallets_user_method_account")(conn)
+    _hold_pending_withdrawals(conn, saved)
+
+
+def _hold_pending_withdrawals(conn: Connection, saved: dict):
+    """Bring withdrawals requested before amounts were held in line with new ones
+
+    Each gets the wallet saved with its request and its amount is debited now,
+    oldest first. One the balance no longer covers, or without a saved wallet,
+    is failed, so the payment worker never pays out money that was not held.
+    """
+    transactions, users = Transaction.__table__, User.__table__
+    legacy = conn.execute(select(
+        transactions.c.id, transactions.c.user_id, transactions.c.method,
+        transactions.c.amount, transactions.c.created_at
+    ).where(
+        transactions.c.type == TransactionType.WITHDRAW,
+        transactions.c.status == "pending",
+        transactions.c.wallet_id.is_(None)
+    ).order_by(transactions.c.id)).all()
+
+    for row in legacy:
+        candidates = saved.get((row.user_id, row.method), [])
+        # The wallet row the old endpoint inserted alongside this request
+        earlier = [wallet_id for created_at, wallet_id in candidates
+                   if created_at is None or row.created_at is None or created_at <= row.created_at]
+        wallet_id = (earlier or [wallet_id for _, wallet_id in candidates] or [None])[-1]
+
+        held = wallet_id is not None and conn.execute(
+            update(users)
+            .where(users.c.id == row.user_id, users.c.balance >= row.amount)
+            .values(balance=users.c.balance - row.amount)
+        ).rowcount
+        if held:
+            conn.execute(update(transactions).where(transactions.c.id == row.id).values(wallet_id=wallet_id))
+        else:
+            reason = "no saved account" if wallet_id is None else "balance no longer covers it"
+            conn.execute(update(transactions).where(transactions.c.id == row.id).values(
+                status="failed",
+                wallet_id=wallet_id,
+                description=f"Withdrawal via {row.method} (not processed: {reason})"
+            ))
+
+
+def _canonical_timestamps(conn: Connection):
+    """Give SQLite rows stamped by CURRENT_TIMESTAMP the fraction Python values carry"""
+    if conn.dialect.name != "sqlite":
+        return
+    for table in Base.metadata.sorted_tables:
+        for column in table.columns:
+            if column.default is not None and isinstance(column.default.arg, utcnow):
+                conn.execute(text(
+                    f"UPDATE {table.name} SET {column.name} = {column.name} || '.000000' "
+                    f"WHERE length({column.name}) = 19"
+                ))
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "Baseline schema", lambda conn: baseline_metadata.create_all(bind=conn)),
+    Migration(2, "Composite indexes for history and participant lookups", _create_indexes(
+        "ix_transactions_user_created",
+        "ix_game_participants_user_room",
+        "ix_game_participants_user_joined",
+        "ix_called_numbers_room",
+    )),
+    Migration(3, "Compact game_history archive", lambda conn: GameHistory.__table__.create(bind=conn, checkfirst=True)),
+    Migration(4, "player_stats backfilled from finished games", _create_player_stats),
+    Migration(5, "Deduplicated wallets linked from transactions", _dedupe_wallets),
+    Migration(6, "Timestamps in one sortable format on SQLite", _canonical_timestamps),
+]
+
+
+def applied_versions(conn: Connection) -> List[int]:
+    migration_metadata.create_all(bind=conn)
+    return [row.version for row in conn.execute(select(schema_migrations.c.version))]
+
+
+def upgrade(bind: Engine = engine) -> List[int]:
+    """Apply all pending migrations, each in its own transaction"""
+    applied = []
+    with bind.begin() as conn:
+        done = set(applied_versions(conn))
+
+    for migration in sorted(MIGRATIONS, key=lambda m: m.version):
+        if migration.version in done:
+            continue
+        with bind.begin() as conn:
+            migration.upgrade(conn)
+            conn.execute(schema_migrations.insert().values(
+                version=migration.version,
+                description=migration.description
+            ))
+        applied.append(migration.version)
+    return applied
+
+
+# Hot queries and the indexes they are expected to use, built the way the endpoints build them
+def _plan_queries(db: Session):
+    from backend.pagination import encode_cursor, keyset_query
+    from backend.routes.games import game_history
+    from backend.routes.wallet import transaction_history
+
+    cursor = encode_cursor(datetime(2024, 1, 1), 1000)
+    return [
+        (
+            "transaction history page",
+            keyset_query(transaction_history(db, 1), Transaction.created_at, Transaction.id, cursor, 20).statement,
+            "ix_transactions_user_created",
+        ),
+        (
+            "participant lookup (mark_number)",
+            select(GameParticipant)
+            .where(GameParticipant.user_id == 1, GameParticipant.room_id == 1)
+            .limit(1),
+            "ix_game_participants_user_room",
+        ),
+        (
+            "game history page",
+            keyset_query(game_history(db, 1), GameParticipant.joined_at, GameParticipant.id, cursor, 20).statement,
+            "ix_game_participants_user_joined",
+        ),
+        (
+            "called numbers of a room",
+            select(CalledNumber)
+            .where(CalledNumber.room_id == 1)
+            .order_by(CalledNumber.id),
+            "ix_called_numbers_room",
+        ),
+    ]
+
+
+def explain(conn: Connection, statement) -> str:
+    sql = str(statement.compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True}))
+    if conn.dialect.name == "postgresql":
+        # Small tables would otherwise always be planned as sequential scans
+        conn.exec_driver_sql("SET LOCAL enable_seqscan = off")
+        rows = conn.exec_driver_sql(f"EXPLAIN {sql}").fetchall()
+        return "\n".join(row[0] for row in rows)
+    rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}").fetchall()
+    return "\n".join(str(row[-1]) for row in rows)
+
+
+def sorts(plan: str) -> bool:
+    """Whether the plan sorts rows itself instead of reading them in index order"""
+    return "TEMP B-TREE" in plan or re.search(r"\bSort\b", plan) is not None
+
+
+def check_query_plans(bind: Engine = engine) -> List[dict]:
+    """Explain each hot query and report whether its index serves it without a sort"""
+    results = []
+    with bind.begin() as conn:
+        for name, statement, index_name in _plan_queries(Session(bind=conn)):
+            plan = explain(conn, statement)
+            results.append({
+                "query": name,
+                "index": index_name,
+                "uses_index": index_name in plan and not sorts(plan),
+                "plan": plan,
+            })
+    return results
+
+
+def main(argv: List[str]) -> int:
+    command = argv[0] if argv else "upgrade"
+
+    if command == "upgrade":
+        applied = upgrade()
+        print(f"Applied migrations: {applied or 'none'}")
+        return 0
+
+    if command == "status":
+        with engine.begin() as conn:
+            done = set(applied_versions(conn))
+        for migration in MIGRATIONS:
+            mark = "x" if migration.version in done else " "
+            print(f"[{mark}] {migration.version:03d} {migration.description}")
+        return 0
+
+    if command == "check-plans":
+        ok = True
+        for result in check_query_plans():
+            status = "OK  " if result["uses_index"] else "FAIL"
+            print(f"{status} {result['query']} -> {result['index']}")
+            if not result["uses_index"]:
+                ok = False
+                print(result["plan"])
+        return 0 if ok else 1
+
+    print(__doc__)
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
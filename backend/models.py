@@ -1,7 +1,7 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Boolean, Text, Enum, JSON
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Boolean, Text, Enum, JSON, Index, LargeBinary
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
-from backend.database import Base
+from backend.database import Base, utcnow
 from datetime import datetime
 import enum
 
@@ -17,7 +17,7 @@ class User(Base):
     language = Column(String, default="en")
     balance = Column(Float, default=0.0)
     bonus_balance = Column(Float, default=0.0)
-    created_at = Column(DateTime, server_default=func.now())
+    created_at = Column(DateTime, default=utcnow(), server_default=func.now())
     
     # Relationships
     game_participants = relationship("GameParticipant", back_populates="user")
@@ -39,7 +39,7 @@ class GameRoom(Base):
     status = Column(String, default="waiting")  # waiting, starting, running, finished
     start_time = Column(DateTime, nullable=True)
     end_time = Column(DateTime, nullable=True)
-    created_at = Column(DateTime, server_default=func.now())
+    created_at = Column(DateTime, default=utcnow(), server_default=func.now())
     
     # Relationships
     participants = relationship("GameParticipant", back_populates="room")
@@ -58,12 +58,19 @@ class GameParticipant(Base):
     card_numbers = Column(JSON)  # Store selected card IDs
     status = Column(String, default="playing")  # playing, won, lost
     cards_marked = Column(JSON, default={})  # {card_id: [marked_numbers]}
-    joined_at = Column(DateTime, server_default=func.now())
+    joined_at = Column(DateTime, default=utcnow(), server_default=func.now())
     
     # Relationships
     user = relationship("User", back_populates="game_participants")
     room = relationship("GameRoom", back_populates="participants")
     
+    __table_args__ = (
+        Index("ix_game_participants_user_room", "user_id", "room_id"),
+        Index("ix_game_participants_user_joined", "user_id", "joined_at", "id"),
+    )
+    # joined_at comes back from the INSERT, so it is set by the database clock alone
+    __mapper_args__ = {"eager_defaults": True}
+    
     def __repr__(self):
         return f"<GameParticipant user_id={self.user_id} room_id={self.room_id}>"
 
@@ -74,7 +81,7 @@ class BingoCard(Base):
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
     numbers = Column(JSON)  # Store 5x5 grid of numbers
-    created_at = Column(DateTime, server_default=func.now())
+    created_at = Column(DateTime, default=utcnow(), server_default=func.now())
     
     def __repr__(self):
         return f"<BingoCard id={self.id}>"
@@ -86,10 +93,54 @@ class CalledNumber(Base):
     id = Column(Integer, primary_key=True, index=True)
     room_id = Column(Integer, ForeignKey("game_rooms.id"))
     number = Column(Integer)
-    called_at = Column(DateTime, server_default=func.now())
+    called_at = Column(DateTime, default=utcnow(), server_default=func.now())
     
     # Relationships
     room = relationship("GameRoom", back_populates="called_numbers")
+    
+    __table_args__ = (
+        Index("ix_called_numbers_room", "room_id", "id"),
+    )
+
+
+class GameHistory(Base):
+    """Compact record of a finished game, replacing its per-number rows"""
+    __tablename__ = "game_history"
+    
+    room_id = Column(Integer, ForeignKey("game_rooms.id"), primary_key=True)
+    name = Column(String)
+    stake_amount = Column(Float)
+    pot = Column(Float)
+    player_count = Column(Integer)
+    draw_order = Column(LargeBinary)  # One byte per called number, in call order
+    participants = Column(JSON)  # [{user_id, status, cards: [{id, numbers, marks}]}]
+    winners = Column(JSON)  # [user_id]
+    start_time = Column(DateTime, nullable=True)
+    end_time = Column(DateTime, nullable=True)
+    archived_at = Column(DateTime, default=utcnow(), server_default=func.now())
+    
+    def __repr__(self):
+        return f"<GameHistory room_id={self.room_id}>"
+
+
+class PlayerStats(Base):
+    """Per-player totals maintained at game settlement, never aggregated on read"""
+    __tablename__ = "player_stats"
+    
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    games_played = Column(Integer, default=0)
+    wins = Column(Integer, default=0)
+    total_winnings = Column(Float, default=0.0)
+    current_streak = Column(Integer, default=0)  # consecutive wins
+    best_streak = Column(Integer, default=0)
+    daily_period = Column(String, nullable=True)  # e.g. 2024-05-17
+    daily_winnings = Column(Float, default=0.0)
+    weekly_period = Column(String, nullable=True)  # e.g. 2024-W20
+    weekly_winnings = Column(Float, default=0.0)
+    last_played_at = Column(DateTime, nullable=True)
+    
+    def __repr__(self):
+        return f"<PlayerStats user_id={self.user_id}>"
 
 
 class TransactionType(str, enum.Enum):
@@ -110,12 +161,17 @@ class Transaction(Base):
     method = Column(String)  # telbirr, cbe, bank, internal
     status = Column(String, default="pending")  # pending, completed, failed
     transaction_id = Column(String, nullable=True, unique=True)
+    wallet_id = Column(Integer, ForeignKey("wallets.id"), nullable=True)  # account paid from / to
     description = Column(Text, nullable=True)
-    created_at = Column(DateTime, server_default=func.now())
-    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+    created_at = Column(DateTime, default=utcnow(), server_default=func.now())
+    updated_at = Column(DateTime, default=utcnow(), server_default=func.now(), onupdate=utcnow())
     
     # Relationships
     user = relationship("User", back_populates="transactions")
+    
+    __table_args__ = (
+        Index("ix_transactions_user_created", "user_id", "created_at", "id"),
+    )
 
 
 class Wallet(Base):
@@ -125,9 +181,14 @@ class Wallet(Base):
     user_id = Column(Integer, ForeignKey("users.id"))
     method = Column(String)  # telbirr, cbe, bank
     account_info = Column(JSON)  # {phone: xxx, account: xxx}
+    account_key = Column(String)  # canonical account_info, one wallet per user, method and account
     is_primary = Column(Boolean, default=False)
-    created_at = Column(DateTime, server_default=func.now())
+    created_at = Column(DateTime, default=utcnow(), server_default=func.now())
     
     # Relationships
     user = relationship("User", back_populates="wallets")
+    
+    __table_args__ = (
+        Index("ux_wallets_user_method_account", "user_id", "method", "account_key", unique=True),
+    )
 
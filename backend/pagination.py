@@ -0,0 +1,38 @@
+import base64
+from datetime import datetime
+from typing import Optional, Tuple
+from fastapi import HTTPException
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Query
+
+# Keyset pagination: the cursor is the (timestamp, id) of the last row returned,
+# and the next page continues strictly after it in (timestamp DESC, id DESC) order.
+
+def encode_cursor(timestamp: datetime, row_id: int) -> str:
+    raw = f"{timestamp.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        timestamp, row_id = base64.urlsafe_b64decode(padded).decode().split("|")
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+# The raw columns are compared and ordered so a (user, timestamp, id) index
+# serves the page without a sort; on SQLite this relies on every row being
+# written in one timestamp format (see database.utcnow).
+
+def keyset_query(query: Query, timestamp_column, id_column, cursor: Optional[str], limit: int) -> Query:
+    """``query`` restricted to one page in (timestamp DESC, id DESC) order, after ``cursor``"""
+    if cursor:
+        timestamp, last_id = decode_cursor(cursor)
+        query = query.filter(tuple_(timestamp_column, id_column) < tuple_(timestamp, last_id))
+    return query.order_by(timestamp_column.desc(), id_column.desc()).limit(limit)
+
+
+def keyset_page(query: Query, timestamp_column, id_column, cursor: Optional[str], limit: int) -> list:
+    return keyset_query(query, timestamp_column, id_column, cursor, limit).all()
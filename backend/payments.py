@@ -0,0 +1,243 @@
+"""Background processing of pending deposits and withdrawals.
+
+``run_payment_worker`` claims pending transactions in batches with
+``FOR UPDATE SKIP LOCKED`` (so several workers never pick the same rows),
+marks them ``processing`` and releases the lock before calling the provider
+registered for each method. Results are written back with one UPDATE per
+outcome, and balances are adjusted in a single statement: completed deposits
+are credited, and failed withdrawals get their held amount back. Users hear
+about the outcome over the bot and their WebSocket, so nobody has to poll.
+
+Providers receive each transaction's ``transaction_id`` as their idempotency
+reference. Rows left in ``processing`` by a crashed worker are claimed again
+after ``PAYMENT_PROCESSING_TIMEOUT``.
+"""
+import abc
+import asyncio
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, NamedTuple, Optional
+from sqlalchemy import and_, case, or_, update
+from backend.config import settings
+from backend.database import SessionLocal
+from backend.metrics import registry
+from backend.models import Transaction, TransactionType, User, Wallet
+
+logger = logging.getLogger(__name__)
+
+payments_processed = registry.counter(
+    "payments_processed_total", "Deposits and withdrawals settled by the worker", ("method", "status")
+)
+
+
+def account_key(account_info) -> str:
+    """Canonical form of account details, used to keep one wallet per account"""
+    if isinstance(account_info, dict):
+        account_info = {key: str(value).strip() for key, value in account_info.items()}
+    elif account_info is not None:
+        account_info = str(account_info).strip()
+    return json.dumps(account_info, sort_keys=True, separators=(",", ":"))
+
+
+class PaymentResult(NamedTuple):
+    transaction_id: str
+    status: str  # completed or failed
+    error: Optional[str] = None
+
+
+class PaymentProvider(abc.ABC):
+    """Adapter for one payment rail; gets a batch of claimed transactions"""
+
+    @abc.abstractmethod
+    async def process(self, transactions: List[dict]) -> List[PaymentResult]:
+        ...
+
+
+class FakeProvider(PaymentProvider):
+    """Settles everything at once; ``fail_when`` decides which transactions fail"""
+
+    def __init__(self, fail_when: Callable[[dict], bool] = lambda transaction: False):
+        self.fail_when = fail_when
+        self.processed: List[dict] = []
+
+    async def process(self, transactions: List[dict]) -> List[PaymentResult]:
+        self.processed.extend(transactions)
+        return [
+            PaymentResult(t["transaction_id"], "failed", "Rejected by fake provider")
+            if self.fail_when(t) else PaymentResult(t["transaction_id"], "completed")
+            for t in transactions
+        ]
+
+
+providers: Dict[str, PaymentProvider] = {}  # method -> provider
+
+
+def register_provider(method: str, provider: PaymentProvider):
+    providers[method] = provider
+
+
+def claim_batch(limit: int) -> List[dict]:
+    """Lock up to ``limit`` pending transactions, mark them processing and return them"""
+    if not providers:
+        return []
+    db = SessionLocal()
+    try:
+        stale = datetime.utcnow() - timedelta(seconds=settings.PAYMENT_PROCESSING_TIMEOUT)
+        rows = db.query(
+            Transaction.id, Transaction.transaction_id, Transaction.user_id, Transaction.type,
+            Transaction.amount, Transaction.method, Wallet.account_info, User.telegram_id
+        ).join(User, User.id == Transaction.user_id).outerjoin(
+            Wallet, Wallet.id == Transaction.wallet_id
+        ).filter(
+            Transaction.type.in_([TransactionType.DEPOSIT, TransactionType.WITHDRAW]),
+            Transaction.method.in_(list(providers)),
+            # A withdrawal is only paid out to the account it was held for
+            or_(Transaction.type == TransactionType.DEPOSIT, Transaction.wallet_id.isnot(None)),
+            or_(
+                Transaction.status == "pending",
+                and_(Transaction.status == "processing", Transaction.updated_at < stale)
+            )
+        ).order_by(Transaction.id).limit(limit).with_for_update(of=Transaction, skip_locked=True).all()
+
+        if rows:
+            db.query(Transaction).filter(Transaction.id.in_([row.id for row in rows])).update(
+                {Transaction.status: "processing", Transaction.updated_at: datetime.utcnow()},
+                synchronize_session=False
+            )
+        db.commit()
+        return [
+            {
+                "id": row.id,
+                "transaction_id": row.transaction_id,
+                "user_id": row.user_id,
+                "type": row.type.value,
+                "amount": row.amount,
+                "method": row.method,
+                "account_info": row.account_info,
+                "telegram_id": row.telegram_id,
+            }
+            for row in rows
+        ]
+    finally:
+        db.close()
+
+
+def _set_status(db, ids: List[int], status: str) -> List[int]:
+    """Move still-processing rows to ``status`` and return the ids that changed"""
+    if not ids:
+        return []
+    return list(db.scalars(
+        update(Transaction)
+        .where(Transaction.id.in_(ids), Transaction.status == "processing")
+        .values(status=status, updated_at=datetime.utcnow())
+        .returning(Transaction.id),
+        execution_options={"synchronize_session": False}
+    ))
+
+
+def settle(claimed: List[dict], results: List[PaymentResult]) -> List[dict]:
+    """Write provider outcomes back in bulk; returns the transactions that were settled"""
+    by_reference = {t["transaction_id"]: t for t in claimed}
+    outcomes = {"completed": [], "failed": [], "pending": []}
+    for result in results:
+        transaction = by_reference.get(result.transaction_id)
+        if transaction is not None and result.status in outcomes:
+            outcomes[result.status].append(transaction["id"])
+
+    db = SessionLocal()
+    try:
+        changed = {status: set(_set_status(db, ids, status)) for status, ids in outcomes.items()}
+        settled = []
+        credits: Dict[int, float] = {}  # user_id -> amount
+        for transaction in claimed:
+            status = next((s for s in ("completed", "failed") if transaction["id"] in changed[s]), None)
+            if status is None:
+                continue
+            settled.append({**transaction, "status": status})
+            # Withdrawals are debited when requested, so only a failure moves money back
+            if (transaction["type"], status) in (("deposit", "completed"), ("withdraw", "failed")):
+                credits[transaction["user_id"]] = credits.get(transaction["user_id"], 0.0) + transaction["amount"]
+
+        if credits:
+            db.execute(
+                update(User)
+                .where(User.id.in_(list(credits)))
+                .values(balance=User.balance + case(credits, value=User.id, else_=0.0)),
+                execution_options={"synchronize_session": False}
+            )
+        db.commit()
+        return settled
+    finally:
+        db.close()
+
+
+def _release(ids: List[int]):
+    """Hand transactions back to the queue after a provider error"""
+    db = SessionLocal()
+    try:
+        _set_status(db, ids, "pending")
+        db.commit()
+    finally:
+        db.close()
+
+
+async def notify(transaction: dict):
+    from backend.telegram_client import send_queue
+    from backend.websocket_manager import manager
+
+    await manager.send_personal_message(transaction["user_id"], {
+        "type": "transaction_update",
+        "transaction_id": transaction["transaction_id"],
+        "kind": transaction["type"],
+        "status": transaction["status"],
+        "amount": transaction["amount"],
+    })
+    telegram_id = transaction["telegram_id"]
+    if settings.TELEGRAM_BOT_TOKEN and telegram_id and telegram_id.isdigit():
+        outcome = "completed ✅" if transaction["status"] == "completed" else "failed ❌"
+        send_queue.send_message(
+            int(telegram_id),
+            f"Your {transaction['type']} of {transaction['amount']:g} via {transaction['method']} {outcome}"
+        )
+
+
+async def process_batch(limit: int = settings.PAYMENT_BATCH_SIZE) -> int:
+    """Claim, process and settle one batch; returns how many were claimed"""
+    claimed = await asyncio.to_thread(claim_batch, limit)
+    if not claimed:
+        return 0
+
+    by_method: Dict[str, List[dict]] = {}
+    for transaction in claimed:
+        by_method.setdefault(transaction["method"], []).append(transaction)
+
+    for method, transactions in by_method.items():
+        try:
+            results = await providers[method].process(transactions)
+        except Exception:
+            logger.exception("Error processing %s payments", method)
+            await asyncio.to_thread(_release, [t["id"] for t in transactions])
+            continue
+
+        settled = await asyncio.to_thread(settle, transactions, results)
+        for transaction in settled:
+            payments_processed.inc(method, transaction["status"])
+            await notify(transaction)
+    return len(claimed)
+
+
+async def run_payment_worker(interval: float = settings.PAYMENT_POLL_INTERVAL):
+    """Drain pending payments, sleeping only when a batch comes back short"""
+    if settings.PAYMENT_FAKE_PROVIDER:
+        for method in settings.PAYMENT_METHODS:
+            providers.setdefault(method, FakeProvider())
+
+    while True:
+        try:
+            claimed = await process_batch()
+        except Exception:
+            logger.exception("Error in payment worker")
+            claimed = 0
+        if claimed < settings.PAYMENT_BATCH_SIZE:
+            await asyncio.sleep(interval)
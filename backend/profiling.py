@@ -0,0 +1,136 @@
+"""Event loop stall detection and an on-demand sampling profiler.
+
+``LoopMonitor`` is started by the app lifespan only when
+``LOOP_MONITOR_ENABLED`` is set: a coroutine records how late each of its
+wakeups is, and a watchdog thread logs the loop thread's stack whenever the
+loop has not come back for longer than ``LOOP_STALL_THRESHOLD``.
+
+``profile()`` samples thread stacks from a worker thread for a fixed time and
+returns counts of collapsed stacks (``outer;...;inner count`` lines), which
+flamegraph.pl and speedscope read directly.
+"""
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter, deque
+from typing import Optional
+from backend.config import settings
+from backend.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+loop_lag = registry.histogram(
+    "event_loop_lag_seconds", "Delay of loop monitor wakeups beyond their schedule",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+)
+loop_stalls = registry.counter("event_loop_stalls_total", "Times the loop was blocked past the stall threshold")
+
+
+class LoopMonitor:
+    def __init__(self, interval: float, threshold: float):
+        self.interval = interval
+        self.threshold = threshold
+        self.heartbeat = time.monotonic()
+        self.stalls = deque(maxlen=20)  # most recent stall reports
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+
+    def start(self):
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self.heartbeat = time.monotonic()
+        self._stopping.clear()
+        self._task = asyncio.create_task(self._tick())
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    async def stop(self):
+        self._stopping.set()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._thread is not None:
+            await asyncio.to_thread(self._thread.join)
+            self._thread = None
+
+    async def _tick(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            loop_lag.observe(max(now - expected, 0.0))
+            self.heartbeat = now
+
+    def _watch(self):
+        reported = None  # heartbeat of the stall already logged
+        while not self._stopping.wait(self.threshold / 2):
+            heartbeat = self.heartbeat
+            stalled_for = time.monotonic() - heartbeat - self.interval
+            if stalled_for < self.threshold or heartbeat == reported:
+                continue
+            reported = heartbeat
+
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            stack = "".join(traceback.format_stack(frame))
+            loop_stalls.inc()
+            self.stalls.append({"at": time.time(), "stalled_for": stalled_for, "stack": stack})
+            logger.warning("Event loop blocked for %.3fs so far:\n%s", stalled_for, stack)
+
+    def stats(self) -> dict:
+        return {
+            "running": self._task is not None,
+            "interval": self.interval,
+            "threshold": self.threshold,
+            "stalls": list(self.stalls),
+        }
+
+
+monitor = LoopMonitor(settings.LOOP_MONITOR_INTERVAL, settings.LOOP_STALL_THRESHOLD)
+
+
+def collapse(frame) -> str:
+    frames = []
+    while frame is not None:
+        code = frame.f_code
+        frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(frames))
+
+
+def sample_stacks(seconds: float, interval: float, thread_id: Optional[int] = None) -> Counter:
+    """Count collapsed stacks of every thread (or just ``thread_id``) until the time is up"""
+    counts = Counter()
+    own = threading.get_ident()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        for ident, frame in sys._current_frames().items():
+            if ident == own or (thread_id is not None and ident != thread_id):
+                continue
+            counts[collapse(frame)] += 1
+        time.sleep(interval)
+    return counts
+
+
+def render_collapsed(counts: Counter) -> str:
+    return "".join(f"{stack} {count}\n" for stack, count in counts.most_common())
+
+
+_profiling = asyncio.Lock()
+
+
+async def profile(seconds: float, interval: float, thread_id: Optional[int] = None) -> Counter:
+    """Sample from a worker thread so the loop being profiled keeps running"""
+    if _profiling.locked():
+        raise RuntimeError("A profile is already running")
+    async with _profiling:
+        return await asyncio.to_thread(sample_stacks, seconds, interval, thread_id)
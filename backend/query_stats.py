@@ -0,0 +1,142 @@
+"""Per-request SQL accounting on top of SQLAlchemy engine events.
+
+``QueryAccountingMiddleware`` gives each HTTP request a ``QueryStats`` through
+a context variable; the cursor event hooks add every statement's duration to
+it. Requests over ``QUERY_BUDGET`` or repeating one statement shape at least
+``QUERY_REPEAT_THRESHOLD`` times (the N+1 pattern) are logged with the
+offending shapes.
+
+In tests, wrap calls in ``assert_max_queries`` to pin an endpoint's budget::
+
+    with assert_max_queries(3):
+        client.post("/api/games/check-win", params=...)
+"""
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Optional, Tuple
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.types import ASGIApp, Receive, Scope, Send
+from backend.config import settings
+from backend.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+queries_per_request = registry.histogram(
+    "db_queries_per_request", "SQL statements executed per HTTP request", ("route",),
+    buckets=(1, 2, 3, 5, 8, 13, 21, 34, 55)
+)
+
+# Expanded IN lists vary in length per call but are the same query
+_IN_LIST = re.compile(r"\((?:\s*(?:\?|%\(\w+\)s|%s|\$\d+)\s*,)+\s*(?:\?|%\(\w+\)s|%s|\$\d+)\s*\)")
+
+
+def statement_shape(statement: str) -> str:
+    return _IN_LIST.sub("(...)", " ".join(statement.split()))
+
+
+class QueryStats:
+    def __init__(self):
+        self.count = 0
+        self.total_time = 0.0
+        self.slowest: Tuple[float, str] = (0.0, "")
+        self.shapes: Counter = Counter()
+
+    def record(self, statement: str, elapsed: float):
+        self.count += 1
+        self.total_time += elapsed
+        if elapsed > self.slowest[0]:
+            self.slowest = (elapsed, statement)
+        self.shapes[statement_shape(statement)] += 1
+
+    def repeated(self, threshold: int) -> List[Tuple[str, int]]:
+        return [(shape, count) for shape, count in self.shapes.most_common() if count >= threshold]
+
+
+_current: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+_captures: List[QueryStats] = []  # assert_max_queries blocks, which see queries from any thread
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None or _captures:
+        conn.info["query_started"] = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.pop("query_started", None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    stats = _current.get()
+    if stats is not None:
+        stats.record(statement, elapsed)
+    for capture in _captures:
+        capture.record(statement, elapsed)
+
+
+class QueryAccountingMiddleware:
+    """Counts the SQL run by each request and flags budget overruns and N+1 shapes"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats()
+        token = _current.set(stats)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and settings.QUERY_STATS_HEADERS:
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-db-queries", str(stats.count).encode()),
+                    (b"x-db-time-ms", f"{stats.total_time * 1000:.1f}".encode()),
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            self._report(scope, stats)
+
+    def _report(self, scope: Scope, stats: QueryStats):
+        if not stats.count:
+            return
+        route = getattr(scope.get("route"), "path", None) or "other"
+        queries_per_request.observe(stats.count, route)
+
+        repeated = stats.repeated(settings.QUERY_REPEAT_THRESHOLD)
+        if stats.count <= settings.QUERY_BUDGET and not repeated:
+            return
+        lines = [
+            f"{scope['method']} {route}: {stats.count} queries in {stats.total_time * 1000:.1f} ms "
+            f"(budget {settings.QUERY_BUDGET}), slowest {stats.slowest[0] * 1000:.1f} ms: {statement_shape(stats.slowest[1])}"
+        ]
+        lines.extend(f"  repeated x{count}: {shape}" for shape, count in repeated)
+        logger.warning("\n".join(lines))
+
+
+@contextmanager
+def assert_max_queries(max_queries: int, allow_repeats: bool = True):
+    """Fail when the block runs more than ``max_queries`` statements"""
+    stats = QueryStats()
+    _captures.append(stats)
+    try:
+        yield stats
+    finally:
+        _captures.remove(stats)
+
+    shapes = "\n".join(f"  x{count}: {shape}" for shape, count in stats.shapes.most_common())
+    if stats.count > max_queries:
+        raise AssertionError(f"Expected at most {max_queries} queries, ran {stats.count}:\n{shapes}")
+    if not allow_repeats and stats.repeated(2):
+        raise AssertionError(f"Repeated statements:\n{shapes}")
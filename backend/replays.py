@@ -0,0 +1,121 @@
+"""Replays of finished games, decoded from their compact history records.
+
+A finished game never changes, so each decoded record is kept in an LRU of
+``REPLAY_CACHE_SIZE`` games and served with immutable cache headers. A page
+of history costs one query for the records that are not cached yet. Rooms
+that finished too recently to be archived are built from the live tables
+once and then cached the same way.
+"""
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy.orm import Session
+from backend.archive import build_history, mask_to_marks, unpack_card, unpack_draw_order
+from backend.config import settings
+from backend.models import GameHistory, GameRoom
+
+REPLAY_CACHE_CONTROL = "private, max-age=31536000, immutable"
+
+
+def decode_record(record: GameHistory) -> dict:
+    return {
+        "room_id": record.room_id,
+        "name": record.name,
+        "stake_amount": record.stake_amount,
+        "pot": record.pot,
+        "player_count": record.player_count,
+        "winners": record.winners or [],
+        "start_time": record.start_time,
+        "end_time": record.end_time,
+        "draw_order": unpack_draw_order(record.draw_order),
+        # Cards stay packed until a player's view is built
+        "players": {entry["user_id"]: entry for entry in record.participants or []},
+    }
+
+
+def _cards(entry: dict) -> List[dict]:
+    return [
+        {"id": card["id"], "numbers": unpack_card(card["numbers"]), "marks": mask_to_marks(card["marks"])}
+        for card in entry["cards"]
+    ]
+
+
+def player_view(game: dict, user_id: int) -> Optional[dict]:
+    """One player's replay: the draw order, their cards and marks, and the result"""
+    entry = game["players"].get(user_id)
+    if entry is None:
+        return None
+    won = entry["status"] == "won"
+    return {
+        **{key: value for key, value in game.items() if key != "players"},
+        "status": entry["status"],
+        "winnings": (game["pot"] or 0.0) if won else 0.0,
+        "cards": _cards(entry),
+    }
+
+
+def full_view(game: dict) -> dict:
+    """Every participant's cards, for support"""
+    return {
+        **{key: value for key, value in game.items() if key != "players"},
+        "players": [
+            {"user_id": user_id, "status": entry["status"], "cards": _cards(entry)}
+            for user_id, entry in game["players"].items()
+        ],
+    }
+
+
+class ReplayCache:
+    """Bounded LRU of room_id -> decoded history record"""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._games: "OrderedDict[int, dict]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _put(self, room_id: int, game: dict):
+        self._games[room_id] = game
+        self._games.move_to_end(room_id)
+        while len(self._games) > self.maxsize:
+            self._games.popitem(last=False)
+
+    def get_many(self, db: Session, room_ids: Iterable[int]) -> Dict[int, dict]:
+        """Decoded records for the finished rooms among ``room_ids``"""
+        found: Dict[int, dict] = {}
+        missing = []
+        for room_id in dict.fromkeys(room_ids):
+            game = self._games.get(room_id)
+            if game is None:
+                missing.append(room_id)
+            else:
+                self._games.move_to_end(room_id)
+                found[room_id] = game
+        self.hits += len(found)
+        self.misses += len(missing)
+        if not missing:
+            return found
+
+        records = db.query(GameHistory).filter(GameHistory.room_id.in_(missing)).all()
+        unarchived = set(missing) - {record.room_id for record in records}
+        if unarchived:
+            rooms = db.query(GameRoom).filter(
+                GameRoom.id.in_(unarchived),
+                GameRoom.status == "finished"
+            ).all()
+            if rooms:
+                records.extend(build_history(db, rooms))
+
+        for record in records:
+            game = decode_record(record)
+            self._put(record.room_id, game)
+            found[record.room_id] = game
+        return found
+
+    def get(self, db: Session, room_id: int) -> Optional[dict]:
+        return self.get_many(db, [room_id]).get(room_id)
+
+    def stats(self) -> dict:
+        return {"size": len(self._games), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+
+
+replays = ReplayCache(settings.REPLAY_CACHE_SIZE)
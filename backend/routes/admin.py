@@ -0,0 +1,86 @@
+import json
+import threading
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
+from backend.config import settings
+from sqlalchemy.orm import Session
+from backend.database import get_db
+from backend.jobs import KINDS, runner
+from backend.profiling import monitor, profile, render_collapsed
+from backend.replays import replays, full_view
+from backend.security import require_admin
+
+router = APIRouter(prefix="/api/admin", tags=["admin"], dependencies=[Depends(require_admin)])
+
+class JobRequest(BaseModel):
+    kind: str  # generate_cards, simulate, reconcile
+    params: dict = {}
+
+@router.get("/profile", response_class=PlainTextResponse)
+async def capture_profile(
+    seconds: float = Query(10.0, gt=0, le=settings.PROFILE_MAX_SECONDS),
+    interval: float = Query(0.005, ge=0.001, le=1.0),
+    all_threads: bool = Query(False)
+):
+    """Sample this worker and return collapsed stacks for a flamegraph"""
+    # By default only the event loop thread, which is what stalls the game
+    thread_id = None if all_threads else threading.get_ident()
+    try:
+        counts = await profile(seconds, interval, thread_id)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return PlainTextResponse(render_collapsed(counts))
+
+@router.get("/loop")
+async def loop_status():
+    """Loop monitor settings and recent stalls"""
+    return monitor.stats()
+
+@router.get("/games/{room_id}/replay")
+async def game_replay(room_id: int, db: Session = Depends(get_db)):
+    """Full replay of a finished game with every participant's cards, for support"""
+    game = replays.get(db, room_id)
+    if game is None:
+        raise HTTPException(status_code=404, detail="No finished game to replay")
+    return full_view(game)
+
+@router.post("/jobs", status_code=202)
+async def submit_job(request: JobRequest):
+    """Start a CPU-heavy job in the process pool"""
+    if request.kind not in KINDS:
+        raise HTTPException(status_code=400, detail=f"Unknown job kind, expected one of {', '.join(KINDS)}")
+    return runner.submit(request.kind, request.params).summary()
+
+@router.get("/jobs")
+async def list_jobs():
+    """Recent jobs, oldest first"""
+    return [job.summary() for job in runner.jobs.values()]
+
+def _get_job(job_id: str):
+    job = runner.jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Job status and progress"""
+    return _get_job(job_id).summary()
+
+@router.get("/jobs/{job_id}/results")
+async def stream_job_results(job_id: str):
+    """Chunk results as newline-delimited JSON while the job runs, ending with its summary"""
+    job = _get_job(job_id)
+
+    async def lines():
+        async for item in runner.stream(job):
+            yield json.dumps(item, default=str) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+@router.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """Cancel a job; chunks already running finish but are discarded"""
+    _get_job(job_id)
+    return runner.cancel(job_id).summary()
@@ -1,54 +1,71 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from backend.database import get_db
 from backend.models import User
-from backend.schemas import UserCreate, UserResponse, UserUpdate
-from datetime import datetime
+from backend.schemas import UserResponse, UserUpdate, LoginRequest, LoginResponse
+from backend.user_cache import user_cache, get_user_with_balance
+from backend.security import verify_init_data, create_access_token, get_current_user_id
+from sqlalchemy.dialects import postgresql, sqlite
 
 router = APIRouter(prefix="/api/auth", tags=["auth"])
 
-@router.post("/login", response_model=UserResponse)
+def upsert_user(db: Session, telegram_user: dict) -> User:
+    """Create or refresh the user in a single INSERT ... ON CONFLICT ... RETURNING"""
+    insert = postgresql.insert if db.bind.dialect.name == "postgresql" else sqlite.insert
+    stmt = insert(User).values(
+        telegram_id=str(telegram_user["id"]),
+        first_name=telegram_user.get("first_name"),
+        last_name=telegram_user.get("last_name"),
+        username=telegram_user.get("username"),
+        photo_url=telegram_user.get("photo_url"),
+        language="en",
+        balance=0.0,
+        bonus_balance=10.0  # Welcome bonus
+    )
+    # Existing users keep their balances, language and uploaded photo
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[User.telegram_id],
+        set_={
+            "first_name": stmt.excluded.first_name,
+            "last_name": stmt.excluded.last_name,
+            "username": stmt.excluded.username
+        }
+    ).returning(User)
+    
+    return db.scalars(stmt, execution_options={"populate_existing": True}).one()
+
+@router.post("/login", response_model=LoginResponse)
 async def login(
-    telegram_id: str = Query(...),
-    first_name: str = Query(None),
-    last_name: str = Query(None),
-    username: str = Query(None),
-    photo_url: str = Query(None),
+    request: LoginRequest,
     db: Session = Depends(get_db)
 ):
-    """User login via Telegram"""
-    user = db.query(User).filter(User.telegram_id == telegram_id).first()
-    
-    if not user:
-        user = User(
-            telegram_id=telegram_id,
-            first_name=first_name,
-            last_name=last_name,
-            username=username,
-            photo_url=photo_url,
-            balance=0.0,
-            bonus_balance=10.0  # Welcome bonus
-        )
-        db.add(user)
-        db.commit()
-        db.refresh(user)
+    """User login via Telegram WebApp initData"""
+    telegram_user = verify_init_data(request.init_data)
+    user = upsert_user(db, telegram_user)
+    user_cache.put(user)
     
-    return user
+    # Build the response before commit expires the returned row
+    response = {
+        "access_token": create_access_token(user.id, user.language),
+        "user": UserResponse.model_validate(user)
+    }
+    db.commit()
+    return response
 
 @router.get("/me", response_model=UserResponse)
 async def get_current_user(
-    user_id: int = Query(...),
+    user_id: int = Depends(get_current_user_id),
     db: Session = Depends(get_db)
 ):
     """Get current user info"""
-    user = db.query(User).filter(User.id == user_id).first()
+    user = get_user_with_balance(db, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return user
 
 @router.put("/me", response_model=UserResponse)
 async def update_profile(
-    user_id: int = Query(...),
+    user_id: int = Depends(get_current_user_id),
     update_data: UserUpdate = None,
     db: Session = Depends(get_db)
 ):
@@ -69,5 +86,6 @@ async def update_profile(
     
     db.commit()
     db.refresh(user)
+    user_cache.invalidate(user.id)
     return user
 
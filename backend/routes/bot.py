@@ -1,25 +1,50 @@
-from fastapi import FastAPI, Request
-import requests
-import os
+import asyncio
+import hmac
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Request
+from backend.config import settings
+from backend.security import require_admin
+from backend.telegram_client import send_queue
+from backend.webhook_pipeline import UpdatePipeline
 
+router = APIRouter(prefix="/api/bot", tags=["bot"])
 
-app = FastAPI()
-
-# Load your Telegram bot token from environment variables
-TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
-TELEGRAM_API_URL = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}"
-
-@app.post("/api/bot/webhook")
-async def telegram_webhook(request: Request):
-    update = await request.json()  # Telegram sends JSON updates
+async def handle_update(update: dict):
     chat_id = update.get("message", {}).get("chat", {}).get("id")
     text = update.get("message", {}).get("text")
 
     if chat_id and text:
-        # Example: simple echo reply
-        requests.post(
-            f"{TELEGRAM_API_URL}/sendMessage",
-            json={"chat_id": chat_id, "text": f"You said: {text}"}
-        )
+        # Example: simple echo reply, queued instead of sent inline
+        send_queue.send_message(chat_id, f"You said: {text}")
+
+pipeline = UpdatePipeline(handle_update)
+
+@router.post("/webhook")
+async def telegram_webhook(
+    request: Request,
+    x_telegram_bot_api_secret_token: Optional[str] = Header(None)
+):
+    # Without a secret anyone could post updates, so the webhook only exists once it is set
+    if not settings.TELEGRAM_WEBHOOK_SECRET:
+        raise HTTPException(status_code=404, detail="Not Found")
+    # Telegram echoes the secret_token given to setWebhook in this header
+    if not hmac.compare_digest(x_telegram_bot_api_secret_token or "", settings.TELEGRAM_WEBHOOK_SECRET):
+        raise HTTPException(status_code=401, detail="Invalid secret token")
+
+    try:
+        update = await request.json()  # Telegram sends JSON updates
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid JSON body")
+    if not isinstance(update, dict):
+        raise HTTPException(status_code=400, detail="Update must be a JSON object")
+    try:
+        pipeline.submit(update)
+    except asyncio.QueueFull:
+        # Telegram redelivers on non-2xx responses
+        raise HTTPException(status_code=503, detail="Update queue is full")
 
     return {"ok": True}
+
+@router.get("/webhook/stats", dependencies=[Depends(require_admin)])
+async def webhook_stats():
+    return pipeline.stats()
@@ -1,13 +1,26 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Header, Response
 from sqlalchemy.orm import Session
 from sqlalchemy import func
-from backend.database import get_db
+from backend.database import get_db, SessionLocal
 from backend.models import GameRoom, GameParticipant, User, BingoCard, CalledNumber
-from backend.schemas import GameRoomResponse, GameParticipantResponse, JoinGameRequest, BingoCardResponse
+from backend.schemas import GameRoomResponse, GameParticipantResponse, JoinGameRequest, BingoCardResponse, GameHistoryResponse, GameReplayResponse
 from backend.game_logic import BingoCardGenerator, BingoGameLogic
-from typing import List
+from backend.lobby import lobby
+from backend.game_scheduler import scheduler
+from backend.security import get_current_user_id
+from backend.user_cache import get_profile
+from backend.pagination import encode_cursor, keyset_page
+from backend.idempotency import idempotency, get_idempotency_key
+from backend.stats import record_room
+from backend.replays import replays, player_view, REPLAY_CACHE_CONTROL
+from backend.join_batcher import join_batcher
+from backend.telegram_client import send_queue
+from backend.metrics import number_call_lag, win_checks
+from backend.config import settings
+from typing import List, Optional
 from datetime import datetime, timedelta
 import asyncio
+import time
 from backend.websocket_manager import manager
 
 router = APIRouter(prefix="/api/games", tags=["games"])
@@ -16,104 +29,139 @@ router = APIRouter(prefix="/api/games", tags=["games"])
 active_games: dict = {}
 
 @router.get("/rooms", response_model=List[GameRoomResponse])
-async def get_game_rooms(db: Session = Depends(get_db)):
+async def get_game_rooms(
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
     """Get all available game rooms"""
-    rooms = db.query(GameRoom).filter(GameRoom.status.in_(["waiting", "starting"])).all()
-    return rooms
+    lobby.ensure_loaded(db)
+    headers = {"ETag": lobby.etag, "Cache-Control": "no-cache"}
+    
+    if if_none_match and lobby.etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    
+    return Response(content=lobby.body, media_type="application/json", headers=headers)
 
 @router.get("/my-cards", response_model=List[BingoCardResponse])
 async def get_my_cards(
-    user_id: int = Query(...),
+    user_id: int = Depends(get_current_user_id),
     db: Session = Depends(get_db)
 ):
     """Get user's generated bingo cards"""
     cards = db.query(BingoCard).filter(BingoCard.user_id == user_id).all()
     return cards
 
+def game_history(db: Session, user_id: int):
+    return db.query(GameParticipant, GameRoom).join(
+        GameRoom, GameRoom.id == GameParticipant.room_id
+    ).filter(GameParticipant.user_id == user_id)
+
+@router.get("/history", response_model=List[GameHistoryResponse])
+async def get_game_history(
+    response: Response,
+    user_id: int = Depends(get_current_user_id),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None),
+    include_replay: bool = Query(False),
+    db: Session = Depends(get_db)
+):
+    """Get games the user has played, newest first, one page at a time"""
+    rows = keyset_page(game_history(db, user_id), GameParticipant.joined_at, GameParticipant.id, cursor, limit)
+    
+    if len(rows) == limit:
+        last = rows[-1][0]
+        response.headers["X-Next-Cursor"] = encode_cursor(last.joined_at, last.id)
+    
+    # Finished games come with their replay, read from the compact records
+    games = replays.get_many(
+        db, [room.id for _, room in rows if room.status == "finished"]
+    ) if include_replay else {}
+    
+    return [
+        {
+            "participant_id": participant.id,
+            "room_id": room.id,
+            "room_name": room.name,
+            "stake_amount": room.stake_amount,
+            "room_status": room.status,
+            "status": participant.status,
+            "card_numbers": participant.card_numbers,
+            "joined_at": participant.joined_at,
+            "end_time": room.end_time,
+            "replay": player_view(games[room.id], user_id) if room.id in games else None
+        }
+        for participant, room in rows
+    ]
+
+@router.get("/history/{room_id}", response_model=GameReplayResponse)
+async def get_game_replay(
+    room_id: int,
+    response: Response,
+    user_id: int = Depends(get_current_user_id),
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
+    """Replay of a finished game the user played: draw order, their cards, marks and result"""
+    game = replays.get(db, room_id)
+    replay = player_view(game, user_id) if game else None
+    if replay is None:
+        raise HTTPException(status_code=404, detail="No finished game to replay")
+    
+    # Finished games never change, so clients may keep the replay for good
+    etag = f'"replay-{room_id}"'
+    headers = {"ETag": etag, "Cache-Control": REPLAY_CACHE_CONTROL}
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    
+    response.headers.update(headers)
+    return replay
+
 @router.post("/generate-cards")
 async def generate_cards(
-    user_id: int = Query(...),
+    user_id: int = Depends(get_current_user_id),
     count: int = Query(2, le=10),
     db: Session = Depends(get_db)
 ):
     """Generate new bingo cards for user"""
-    user = db.query(User).filter(User.id == user_id).first()
+    user = get_profile(db, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
     cards_data = BingoCardGenerator.generate_multiple_cards(count)
     
-    saved_cards = []
-    for card_data in cards_data:
-        card = BingoCard(user_id=user_id, numbers=card_data)
-        db.add(card)
-        db.flush()
-        saved_cards.append(card)
-    
-    db.commit()
-    return {
+    # One flush batches the inserts; build the response before commit expires the cards
+    saved_cards = [BingoCard(user_id=user_id, numbers=card_data) for card_data in cards_data]
+    db.add_all(saved_cards)
+    db.flush()
+    result = {
         "message": f"Generated {count} cards",
         "cards": [{"id": c.id, "numbers": c.numbers} for c in saved_cards]
     }
+    
+    db.commit()
+    return result
 
 @router.post("/join-game")
 async def join_game(
-    user_id: int = Query(...),
+    user_id: int = Depends(get_current_user_id),
     room_id: int = Query(...),
     card_ids: List[int] = Query(...),
+    idempotency_key: Optional[str] = Depends(get_idempotency_key),
     db: Session = Depends(get_db)
 ):
     """Join a game room"""
-    user = db.query(User).filter(User.id == user_id).first()
+    return await idempotency.run(
+        user_id, "join_game", idempotency_key, {"room_id": room_id, "card_ids": card_ids},
+        lambda: _join_game(user_id, room_id, card_ids, db)
+    )
+
+async def _join_game(user_id: int, room_id: int, card_ids: List[int], db: Session):
+    user = get_profile(db, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    room = db.query(GameRoom).filter(GameRoom.id == room_id).first()
-    if not room:
-        raise HTTPException(status_code=404, detail="Room not found")
-    
-    if room.current_players >= room.max_players:
-        raise HTTPException(status_code=400, detail="Room is full")
-    
-    # Check if user already in room
-    existing = db.query(GameParticipant).filter(
-        GameParticipant.user_id == user_id,
-        GameParticipant.room_id == room_id
-    ).first()
-    
-    if existing:
-        raise HTTPException(status_code=400, detail="Already in this game")
-    
-    # Deduct stake from user balance
-    if user.balance < room.stake_amount:
-        raise HTTPException(status_code=400, detail="Insufficient balance")
-    
-    user.balance -= room.stake_amount
-    
-    # Create participant
-    participant = GameParticipant(
-        user_id=user_id,
-        room_id=room_id,
-        card_numbers=card_ids,
-        cards_marked={}
-    )
-    db.add(participant)
-    room.current_players += 1
-    db.commit()
-    db.refresh(participant)
-    
-    # Broadcast to room
-    await manager.broadcast_to_room(room_id, {
-        "type": "player_joined",
-        "player_count": room.current_players,
-        "user": {
-            "id": user.id,
-            "username": user.username,
-            "first_name": user.first_name
-        }
-    })
-    
-    return participant
+    # Capacity, balance and duplicate checks happen per batch in one transaction
+    return await join_batcher.admit(room_id, user, card_ids)
 
 @router.post("/start-game/{room_id}")
 async def start_game(
@@ -124,13 +172,35 @@ async def start_game(
     room = db.query(GameRoom).filter(GameRoom.id == room_id).first()
     if not room:
         raise HTTPException(status_code=404, detail="Room not found")
-    
-    room.status = "starting"
-    room.start_time = datetime.utcnow()
+    if scheduler.is_running(room_id) or room_id in active_games:
+        raise HTTPException(status_code=409, detail="Game already started")
+    
+    # Only one caller moves the room out of waiting; a second start would orphan the draw loop
+    claimed = db.query(GameRoom).filter(
+        GameRoom.id == room_id,
+        GameRoom.status == "waiting"
+    ).update({"status": "starting", "start_time": datetime.utcnow()}, synchronize_session=False)
     db.commit()
-    
-    # Initialize game logic
-    active_games[room_id] = BingoGameLogic()
+    if not claimed:
+        raise HTTPException(status_code=409, detail="Game already started")
+    db.refresh(room)
+    await lobby.update_room(room)
+    
+    # Initialize game logic with every card in play
+    game = BingoGameLogic()
+    participants = db.query(GameParticipant.user_id, GameParticipant.card_numbers).filter(
+        GameParticipant.room_id == room_id
+    ).all()
+    card_owners = {card_id: p.user_id for p in participants for card_id in (p.card_numbers or [])}
+    if card_owners:
+        cards = db.query(BingoCard.id, BingoCard.numbers).filter(BingoCard.id.in_(card_owners)).all()
+        for card in cards:
+            game.register_card(card.id, card_owners[card.id], card.numbers)
+    
+    # Schedule the number calls; the loop first runs after this request's next await
+    if not scheduler.start(room_id, call_numbers_loop(room_id)):
+        raise HTTPException(status_code=409, detail="Game already started")
+    active_games[room_id] = game
     
     # Broadcast game started
     await manager.broadcast_to_room(room_id, {
@@ -138,24 +208,56 @@ async def start_game(
         "message": "Game is starting!"
     })
     
-    # Schedule first number call in 3 seconds
-    asyncio.create_task(call_numbers_loop(room_id, db))
+    # Notify players over the bot, paced by the send queue
+    if settings.TELEGRAM_BOT_TOKEN:
+        telegram_ids = db.query(User.telegram_id).join(
+            GameParticipant, GameParticipant.user_id == User.id
+        ).filter(GameParticipant.room_id == room_id).all()
+        send_queue.broadcast(
+            [int(row.telegram_id) for row in telegram_ids if row.telegram_id and row.telegram_id.isdigit()],
+            f"🎲 {room.name} is starting now!"
+        )
     
     return {"status": "Game started"}
 
-async def call_numbers_loop(room_id: int, db: Session):
+async def finish_game(room_id: int, db: Session):
+    """Mark a room as finished, settle player stats and drop it from the lobby"""
+    game = active_games.pop(room_id, None)
+    db.query(GameRoom).filter(GameRoom.id == room_id).update({
+        "status": "finished",
+        "end_time": datetime.utcnow()
+    })
+    db.commit()
+    # Only the call that actually ended the game counts it
+    if game is not None:
+        record_room(db, room_id)
+    await lobby.remove_room(room_id)
+
+async def call_numbers_loop(room_id: int):
     """Call numbers with 3 second delay"""
-    from config import settings
-    
+    db = SessionLocal()
+    try:
+        await _call_numbers(room_id, db)
+    finally:
+        db.close()
+
+async def _call_numbers(room_id: int, db: Session):
     game = active_games.get(room_id)
     if not game:
         return
     
     db.query(GameRoom).filter(GameRoom.id == room_id).update({"status": "running"})
     db.commit()
+    await lobby.remove_room(room_id)
     
     while len(game.called_numbers) < 75:
+        scheduled = time.perf_counter() + settings.NUMBER_CALL_DELAY
         await asyncio.sleep(settings.NUMBER_CALL_DELAY)
+        number_call_lag.observe(max(time.perf_counter() - scheduled, 0.0))
+        
+        # Stop once the game has been won
+        if active_games.get(room_id) is not game:
+            return
         
         number, letter = game.call_next_number()
         
@@ -172,12 +274,23 @@ async def call_numbers_loop(room_id: int, db: Session):
             "type": "number_called",
             "number": number,
             "letter": letter,
-            "total_called": len(game.called_numbers)
+            "total_called": len(game.called_numbers),
+            "closeness": game.closeness_summary(),
+            "ts": time.time()
         })
+        
+        # Only players whose best card just got closer hear about it
+        for user_id in game.last_changed_users:
+            await manager.send_personal_message(user_id, {
+                "type": "card_progress",
+                "cards": game.card_progress(user_id)
+            })
+    
+    await finish_game(room_id, db)
 
 @router.post("/mark-number")
 async def mark_number(
-    user_id: int = Query(...),
+    user_id: int = Depends(get_current_user_id),
     room_id: int = Query(...),
     number: int = Query(...),
     card_index: int = Query(...),
@@ -192,23 +305,19 @@ async def mark_number(
     if not participant:
         raise HTTPException(status_code=404, detail="Participant not found")
     
-    if not participant.cards_marked:
-        participant.cards_marked = {}
-    
-    card_id = participant.card_numbers[card_index]
-    if str(card_id) not in participant.cards_marked:
-        participant.cards_marked[str(card_id)] = []
-    
-    if number not in participant.cards_marked[str(card_id)]:
-        participant.cards_marked[str(card_id)].append(number)
+    card_id = str(participant.card_numbers[card_index])
+    marked = participant.cards_marked or {}
     
-    db.commit()
+    if number not in marked.get(card_id, []):
+        # Assign a new dict: changes made inside a JSON value are not tracked and never written
+        participant.cards_marked = {**marked, card_id: [*marked.get(card_id, []), number]}
+        db.commit()
     
     return {"status": "Number marked"}
 
 @router.post("/check-win")
 async def check_win(
-    user_id: int = Query(...),
+    user_id: int = Depends(get_current_user_id),
     room_id: int = Query(...),
     card_index: int = Query(...),
     db: Session = Depends(get_db)
@@ -230,7 +339,7 @@ async def check_win(
         raise HTTPException(status_code=404, detail="Card not found")
     
     # Build marked positions
-    marked_numbers = participant.cards_marked.get(str(card.id), [])
+    marked_numbers = (participant.cards_marked or {}).get(str(card.id), [])
     marked_positions = [
         [card.numbers[i][j] == 0 or card.numbers[i][j] in marked_numbers for j in range(5)]
         for i in range(5)
@@ -241,15 +350,18 @@ async def check_win(
         raise HTTPException(status_code=400, detail="Game not active")
     
     has_won, pattern = game.check_win(card.numbers, marked_positions)
+    win_checks.inc("win" if has_won else "no_win")
     
     if has_won and participant.status == "playing":
         participant.status = "won"
         room = db.query(GameRoom).filter(GameRoom.id == room_id).first()
         
         # Add winnings to user balance
-        user = db.query(User).filter(User.id == user_id).first()
+        user = get_profile(db, user_id)
         pot = room.stake_amount * room.current_players
-        user.balance += pot
+        db.query(User).filter(User.id == user_id).update(
+            {User.balance: User.balance + pot}, synchronize_session=False
+        )
         
         db.commit()
         
@@ -257,10 +369,12 @@ async def check_win(
         await manager.broadcast_to_room(room_id, {
             "type": "player_won",
             "user_id": user_id,
-            "username": user.username,
+            "username": user["username"],
             "pattern": pattern,
             "winning_amount": pot
         })
+        
+        await finish_game(room_id, db)
     
     return {
         "has_won": has_won,
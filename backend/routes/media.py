@@ -0,0 +1,21 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import FileResponse
+from backend.media import UPLOAD_DIR, FILENAME_PATTERN
+import os
+
+router = APIRouter(prefix="/uploads", tags=["media"])
+
+# Names are content hashes, so a given URL never changes content
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+
+@router.get("/profiles/{filename}")
+async def get_profile_photo(filename: str):
+    """Serve a stored profile photo or thumbnail"""
+    if not FILENAME_PATTERN.match(filename):
+        raise HTTPException(status_code=404, detail="Photo not found")
+    
+    path = os.path.join(UPLOAD_DIR, filename)
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Photo not found")
+    
+    return FileResponse(path, headers={"Cache-Control": IMMUTABLE_CACHE})
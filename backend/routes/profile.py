@@ -1,52 +1,60 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlalchemy.orm import Session
 from backend.database import get_db
 from backend.models import User
 from backend.schemas import UserResponse
-import aiofiles
-import os
+from backend.security import get_current_user_id
+from backend.user_cache import user_cache, get_user_with_balance
+from backend.media import URL_PREFIX, receive_photo, schedule_thumbnail
 
 router = APIRouter(prefix="/api/profile", tags=["profile"])
 
-UPLOAD_DIR = "uploads/profiles"
-
 @router.get("/", response_model=UserResponse)
 async def get_profile(
-    user_id: int = Query(...),
+    user_id: int = Depends(get_current_user_id),
     db: Session = Depends(get_db)
 ):
     """Get user profile"""
-    user = db.query(User).filter(User.id == user_id).first()
+    user = get_user_with_balance(db, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return user
 
-@router.post("/upload-photo")
+# The body is parsed by receive_photo, so it is described here for the schema
+PHOTO_UPLOAD_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {"multipart/form-data": {"schema": {
+            "type": "object",
+            "properties": {"file": {"type": "string", "format": "binary"}},
+            "required": ["file"]
+        }}}
+    }
+}
+
+@router.post("/upload-photo", openapi_extra=PHOTO_UPLOAD_BODY)
 async def upload_photo(
-    user_id: int = Query(...),
-    file: UploadFile = File(...),
+    request: Request,
+    user_id: int = Depends(get_current_user_id),
     db: Session = Depends(get_db)
 ):
     """Upload profile photo"""
+    # Multipart field "file"; stream to disk under a content-addressed name.
+    # Received before the user is loaded, so no transaction stays open during the upload
+    filename = await receive_photo(request)
+    
     user = db.query(User).filter(User.id == user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    os.makedirs(UPLOAD_DIR, exist_ok=True)
-    
-    # Generate filename
-    filename = f"{user_id}_{file.filename}"
-    filepath = os.path.join(UPLOAD_DIR, filename)
-    
-    # Save file
-    async with aiofiles.open(filepath, 'wb') as f:
-        content = await file.read()
-        await f.write(content)
-    
     # Update user photo URL
-    user.photo_url = f"/uploads/profiles/{filename}"
+    user.photo_url = URL_PREFIX + filename
     db.commit()
     db.refresh(user)
+    user_cache.invalidate(user_id)
+    
+    # Avatar thumbnail replaces the photo URL once rendered
+    schedule_thumbnail(user_id, filename)
     
     return {
         "message": "Photo uploaded successfully",
@@ -55,18 +63,17 @@ async def upload_photo(
 
 @router.put("/language")
 async def update_language(
-    user_id: int = Query(...),
+    user_id: int = Depends(get_current_user_id),
     language: str = Query(...),
     db: Session = Depends(get_db)
 ):
     """Update language preference"""
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
+    updated = db.query(User).filter(User.id == user_id).update({"language": language})
+    if not updated:
         raise HTTPException(status_code=404, detail="User not found")
     
-    user.language = language
     db.commit()
-    db.refresh(user)
+    user_cache.invalidate(user_id)
     
-    return {"language": user.language}
+    return {"language": language}
 
@@ -0,0 +1,30 @@
+from typing import Literal
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from backend.database import get_db
+from backend.security import get_current_user_id
+from backend.stats import stats
+
+router = APIRouter(prefix="/api/stats", tags=["stats"])
+
+@router.get("/leaderboard/{period}")
+async def get_leaderboard(
+    period: Literal["daily", "weekly", "all_time"],
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db)
+):
+    """Top players by winnings, served from memory"""
+    stats.ensure_loaded(db)
+    return stats.leaderboard(period, limit)
+
+@router.get("/me")
+async def get_my_stats(
+    user_id: int = Depends(get_current_user_id),
+    db: Session = Depends(get_db)
+):
+    """Player totals, streaks and leaderboard ranks"""
+    stats.ensure_loaded(db)
+    player = stats.get(user_id)
+    if player is None:
+        raise HTTPException(status_code=404, detail="No games played yet")
+    return player
@@ -1,9 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.orm import Session
 from backend.database import get_db
 from backend.models import User, Transaction, TransactionType, Wallet
 from backend.schemas import DepositRequest, WithdrawRequest, TransferRequest, TransactionResponse
-from typing import List
+from backend.user_cache import get_profile
+from backend.security import get_current_user_id
+from backend.pagination import encode_cursor, keyset_page
+from backend.idempotency import idempotency, get_idempotency_key
+from backend.payments import account_key
+from typing import List, Optional
 from datetime import datetime
 import uuid
 
@@ -11,11 +17,11 @@ router = APIRouter(prefix="/api/wallet", tags=["wallet"])
 
 @router.get("/balance")
 async def get_balance(
-    user_id: int = Query(...),
+    user_id: int = Depends(get_current_user_id),
     db: Session = Depends(get_db)
 ):
     """Get user balance"""
-    user = db.query(User).filter(User.id == user_id).first()
+    user = db.query(User.balance, User.bonus_balance).filter(User.id == user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -28,12 +34,34 @@ async def get_balance(
 @router.post("/deposit")
 async def deposit(
     request: DepositRequest,
-    user_id: int = Query(...),
+    user_id: int = Depends(get_current_user_id),
+    idempotency_key: Optional[str] = Depends(get_idempotency_key),
     db: Session = Depends(get_db)
 ):
-
     """Initiate deposit"""
-    user = db.query(User).filter(User.id == user_id).first()
+    return await idempotency.run(
+        user_id, "deposit", idempotency_key, request,
+        lambda: _deposit(request, user_id, db)
+    )
+
+def _save_wallet(db: Session, user_id: int, method: str, account_info: dict) -> int:
+    """Insert the wallet unless this account is already saved; returns its id"""
+    insert = postgresql.insert if db.bind.dialect.name == "postgresql" else sqlite.insert
+    stmt = insert(Wallet).values(
+        user_id=user_id,
+        method=method,
+        account_info=account_info,
+        account_key=account_key(account_info)
+    )
+    # A no-op update so RETURNING gives the existing row's id too
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Wallet.user_id, Wallet.method, Wallet.account_key],
+        set_={"method": stmt.excluded.method}
+    ).returning(Wallet.id)
+    return db.execute(stmt).scalar_one()
+
+def _deposit(request: DepositRequest, user_id: int, db: Session) -> dict:
+    user = get_profile(db, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -43,6 +71,7 @@ async def deposit(
         amount=request.amount,
         method=request.method,
         status="pending",
+        wallet_id=_save_wallet(db, user_id, request.method, {"account": request.phone_or_account}),
         transaction_id=str(uuid.uuid4()),
         description=f"Deposit via {request.method}"
     )
@@ -61,15 +90,28 @@ async def deposit(
 @router.post("/withdraw")
 async def withdraw(
     request: WithdrawRequest,
-    user_id: int = Query(...),
+    user_id: int = Depends(get_current_user_id),
+    idempotency_key: Optional[str] = Depends(get_idempotency_key),
     db: Session = Depends(get_db)
 ):
     """Initiate withdrawal"""
-    user = db.query(User).filter(User.id == user_id).first()
+    return await idempotency.run(
+        user_id, "withdraw", idempotency_key, request,
+        lambda: _withdraw(request, user_id, db)
+    )
+
+def _withdraw(request: WithdrawRequest, user_id: int, db: Session) -> dict:
+    user = get_profile(db, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    if user.balance < request.amount:
+    # Hold the amount now; the payment worker refunds it if the payout fails
+    debited = db.query(User).filter(
+        User.id == user_id,
+        User.balance >= request.amount
+    ).update({User.balance: User.balance - request.amount}, synchronize_session=False)
+    
+    if not debited:
         raise HTTPException(status_code=400, detail="Insufficient balance")
     
     transaction = Transaction(
@@ -79,18 +121,10 @@ async def withdraw(
         method=request.method,
         status="pending",
         transaction_id=str(uuid.uuid4()),
+        wallet_id=_save_wallet(db, user_id, request.method, request.account_info),
         description=f"Withdrawal via {request.method}"
     )
     db.add(transaction)
-    
-    # Store wallet info
-    wallet = Wallet(
-        user_id=user_id,
-        method=request.method,
-        account_info=request.account_info
-    )
-    db.add(wallet)
-    
     db.commit()
     db.refresh(transaction)
     
@@ -104,27 +138,38 @@ async def withdraw(
 @router.post("/transfer")
 async def transfer(
     request: TransferRequest,
-    user_id: int = Query(...),
+    user_id: int = Depends(get_current_user_id),
+    idempotency_key: Optional[str] = Depends(get_idempotency_key),
     db: Session = Depends(get_db)
 ):
-
     """Transfer funds to another user"""
-    sender = db.query(User).filter(User.id == user_id).first()
+    return await idempotency.run(
+        user_id, "transfer", idempotency_key, request,
+        lambda: _transfer(request, user_id, db)
+    )
+
+def _transfer(request: TransferRequest, user_id: int, db: Session) -> dict:
+    sender = get_profile(db, user_id)
     if not sender:
         raise HTTPException(status_code=404, detail="Sender not found")
     
-    recipient = db.query(User).filter(User.id == request.recipient_id).first()
+    recipient = get_profile(db, request.recipient_id)
     if not recipient:
         raise HTTPException(status_code=404, detail="Recipient not found")
     
-    if sender.balance < request.amount:
-        raise HTTPException(status_code=400, detail="Insufficient balance")
+    # Deduct from sender, only if the balance covers it
+    debited = db.query(User).filter(
+        User.id == user_id,
+        User.balance >= request.amount
+    ).update({User.balance: User.balance - request.amount}, synchronize_session=False)
     
-    # Deduct from sender
-    sender.balance -= request.amount
+    if not debited:
+        raise HTTPException(status_code=400, detail="Insufficient balance")
     
     # Add to recipient
-    recipient.balance += request.amount
+    db.query(User).filter(User.id == request.recipient_id).update(
+        {User.balance: User.balance + request.amount}, synchronize_session=False
+    )
     
     # Create transaction records
     transaction = Transaction(
@@ -134,7 +179,7 @@ async def transfer(
         method="internal",
         status="completed",
         transaction_id=str(uuid.uuid4()),
-        description=f"Transfer to {recipient.username or recipient.first_name}"
+        description=f"Transfer to {recipient['username'] or recipient['first_name']}"
     )
     db.add(transaction)
     db.commit()
@@ -142,20 +187,28 @@ async def transfer(
     return {
         "status": "completed",
         "amount": request.amount,
-        "recipient": recipient.username,
+        "recipient": recipient["username"],
         "message": "Transfer successful"
     }
 
+def transaction_history(db: Session, user_id: int):
+    return db.query(Transaction).filter(Transaction.user_id == user_id)
+
 @router.get("/transactions", response_model=List[TransactionResponse])
 async def get_transactions(
-    user_id: int = Query(...),
-    limit: int = Query(20, le=100),
+    response: Response,
+    user_id: int = Depends(get_current_user_id),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None),
     db: Session = Depends(get_db)
 ):
-    """Get user transaction history"""
-    transactions = db.query(Transaction).filter(
-        Transaction.user_id == user_id
-    ).order_by(Transaction.created_at.desc()).limit(limit).all()
+    """Get user transaction history, newest first, one page at a time"""
+    transactions = keyset_page(transaction_history(db, user_id), Transaction.created_at, Transaction.id, cursor, limit)
+    
+    # Cursor for the next page goes in a header so the body stays a plain list
+    if len(transactions) == limit:
+        last = transactions[-1]
+        response.headers["X-Next-Cursor"] = encode_cursor(last.created_at, last.id)
     
     return transactions
 
@@ -1,15 +1,46 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query
+import asyncio
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query, WebSocket, WebSocketDisconnect, status
+from backend.config import settings
+from backend.lobby import lobby
+from backend.security import decode_access_token
 from backend.websocket_manager import manager
 
 router = APIRouter(prefix="/ws", tags=["websocket"])
 
+async def authenticate_socket(websocket: WebSocket, token: Optional[str]) -> Optional[int]:
+    """User id from the access token, given as ?token= or as a first {"type": "auth"} message"""
+    if not token:
+        # Browsers cannot set headers on a WebSocket, so the token may follow the handshake
+        await websocket.accept()
+        try:
+            message = await asyncio.wait_for(websocket.receive_json(), settings.WS_AUTH_TIMEOUT)
+        except (asyncio.TimeoutError, ValueError, WebSocketDisconnect):
+            message = None
+        if isinstance(message, dict) and message.get("type") == "auth":
+            token = message.get("token")
+        if not isinstance(token, str) or not token:
+            return None
+    try:
+        return decode_access_token(token)["user_id"]
+    except HTTPException:
+        return None
+
+@router.websocket("/game/{room_id}")
 @router.websocket("/game/{room_id}/{user_id}")
 async def websocket_endpoint(
     websocket: WebSocket,
     room_id: int,
-    user_id: int
+    user_id: Optional[int] = None,
+    token: Optional[str] = Query(None)
 ):
     """WebSocket connection for real-time game updates"""
+    token_user_id = await authenticate_socket(websocket, token)
+    # The id in the legacy path is only accepted when it matches the token
+    if token_user_id is None or user_id not in (None, token_user_id):
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    user_id = token_user_id
     await manager.connect(websocket, room_id, user_id)
     
     try:
@@ -40,3 +71,25 @@ async def websocket_endpoint(
             "user_id": user_id
         })
 
+@router.websocket("/lobby")
+async def lobby_websocket(websocket: WebSocket):
+    """WebSocket channel pushing lobby room list updates"""
+    # No request-scoped session: it would hold a pooled connection for the socket's lifetime
+    if not lobby.loaded:
+        await lobby.refresh()
+    await manager.connect_lobby(websocket)
+    
+    try:
+        await websocket.send_json({
+            "type": "lobby_update",
+            "etag": lobby.etag,
+            "rooms": lobby.snapshot()
+        })
+        while True:
+            data = await websocket.receive_json()
+            if data.get("type") == "ping":
+                await websocket.send_json({"type": "pong"})
+    
+    except WebSocketDisconnect:
+        manager.disconnect_lobby(websocket)
+
@@ -28,6 +28,14 @@ class UserResponse(UserBase):
     class Config:
         from_attributes = True
 
+class LoginRequest(BaseModel):
+    init_data: str  # Telegram.WebApp.initData
+
+class LoginResponse(BaseModel):
+    access_token: str
+    token_type: str = "bearer"
+    user: UserResponse
+
 class GameRoomResponse(BaseModel):
     id: int
     name: str
@@ -59,6 +67,37 @@ class GameParticipantResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class ReplayCard(BaseModel):
+    id: int
+    numbers: List[List[int]]
+    marks: List[List[bool]]  # FREE cell included
+
+class GameReplayResponse(BaseModel):
+    room_id: int
+    name: Optional[str]
+    stake_amount: Optional[float]
+    pot: Optional[float]
+    player_count: Optional[int]
+    winners: List[int]
+    start_time: Optional[datetime]
+    end_time: Optional[datetime]
+    draw_order: List[int]
+    status: str
+    winnings: float
+    cards: List[ReplayCard]
+
+class GameHistoryResponse(BaseModel):
+    participant_id: int
+    room_id: int
+    room_name: Optional[str]
+    stake_amount: Optional[float]
+    room_status: Optional[str]
+    status: str
+    card_numbers: Optional[List[int]]
+    joined_at: datetime
+    end_time: Optional[datetime]
+    replay: Optional[GameReplayResponse] = None
+
 class TransactionResponse(BaseModel):
     id: int
     type: str
@@ -0,0 +1,109 @@
+import hashlib
+import hmac
+import json
+import time
+from collections import OrderedDict
+from typing import Optional
+from urllib.parse import parse_qsl
+import jwt
+from fastapi import Depends, Header, HTTPException
+from backend.config import settings
+
+
+def verify_init_data(init_data: str, bot_token: str = settings.TELEGRAM_BOT_TOKEN) -> dict:
+    """Check the HMAC of Telegram WebApp initData and return its user object"""
+    fields = dict(parse_qsl(init_data, keep_blank_values=True))
+    received_hash = fields.pop("hash", None)
+    if not received_hash or not bot_token:
+        raise HTTPException(status_code=401, detail="Invalid init data")
+
+    data_check_string = "\n".join(f"{key}={value}" for key, value in sorted(fields.items()))
+    secret_key = hmac.new(b"WebAppData", bot_token.encode(), hashlib.sha256).digest()
+    expected_hash = hmac.new(secret_key, data_check_string.encode(), hashlib.sha256).hexdigest()
+    if not hmac.compare_digest(expected_hash, received_hash):
+        raise HTTPException(status_code=401, detail="Invalid init data")
+
+    auth_date = int(fields.get("auth_date") or 0)
+    if settings.INIT_DATA_MAX_AGE and time.time() - auth_date > settings.INIT_DATA_MAX_AGE:
+        raise HTTPException(status_code=401, detail="Init data expired")
+
+    try:
+        user = json.loads(fields.get("user") or "{}")
+    except ValueError:
+        raise HTTPException(status_code=401, detail="Invalid init data")
+    if not user.get("id"):
+        raise HTTPException(status_code=401, detail="Invalid init data")
+    return user
+
+
+def create_access_token(user_id: int, language: str) -> str:
+    payload = {
+        "sub": str(user_id),
+        "lang": language,
+        "exp": int(time.time()) + settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+    }
+    return jwt.encode(payload, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+
+
+class TokenCache:
+    """Bounded LRU of tokens whose signature has already been verified"""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[str, dict]" = OrderedDict()  # token -> claims
+
+    def get(self, token: str) -> Optional[dict]:
+        claims = self._entries.get(token)
+        if claims is None:
+            return None
+        if claims["exp"] < time.time():
+            del self._entries[token]
+            return None
+        self._entries.move_to_end(token)
+        return claims
+
+    def put(self, token: str, claims: dict):
+        self._entries[token] = claims
+        self._entries.move_to_end(token)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+
+token_cache = TokenCache(settings.TOKEN_CACHE_SIZE)
+
+
+def decode_access_token(token: str) -> dict:
+    claims = token_cache.get(token)
+    if claims is not None:
+        return claims
+    try:
+        claims = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        claims["user_id"] = int(claims["sub"])
+    except (jwt.PyJWTError, KeyError, ValueError):
+        raise HTTPException(status_code=401, detail="Invalid or expired token")
+    token_cache.put(token, claims)
+    return claims
+
+
+def get_token_claims(authorization: Optional[str] = Header(None)) -> dict:
+    """Verify the bearer token without touching the database"""
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        raise HTTPException(
+            status_code=401,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+    return decode_access_token(token)
+
+
+def get_current_user_id(claims: dict = Depends(get_token_claims)) -> int:
+    return claims["user_id"]
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Admin endpoints only exist when ADMIN_TOKEN is configured"""
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not hmac.compare_digest(x_admin_token or "", settings.ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
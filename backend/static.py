@@ -0,0 +1,81 @@
+"""Static frontend serving with precompressed assets.
+
+Build the compressed copies once per deploy with::
+
+    python -m backend.static frontend
+"""
+import gzip
+import os
+import sys
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import StaticFiles
+from starlette.types import Scope
+from backend.config import settings
+
+COMPRESSIBLE = (".html", ".css", ".js", ".svg", ".json", ".txt")
+
+# Accept-Encoding token -> suffix of the precompressed copy, in preference order
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """Serves ``<file>.br`` / ``<file>.gz`` when present and accepted by the client"""
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        response = await super().get_response(path, scope)
+        if not isinstance(response, FileResponse):
+            return response
+
+        original = response.path
+        accept_encoding = Headers(scope=scope).get("accept-encoding", "")
+        for encoding, suffix in ENCODINGS:
+            if encoding in accept_encoding and os.path.isfile(original + suffix):
+                response = FileResponse(
+                    original + suffix,
+                    media_type=response.media_type,
+                    headers={"Content-Encoding": encoding}
+                )
+                break
+
+        response.headers["Vary"] = "Accept-Encoding"
+        if original.endswith(".html"):
+            response.headers["Cache-Control"] = "no-cache"
+        else:
+            response.headers["Cache-Control"] = f"public, max-age={settings.STATIC_MAX_AGE}"
+        return response
+
+
+def precompress(directory: str) -> int:
+    """Write .gz (and .br when brotli is installed) next to each text asset"""
+    try:
+        import brotli
+    except ImportError:
+        brotli = None
+
+    written = 0
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if not name.endswith(COMPRESSIBLE):
+                continue
+            path = os.path.join(root, name)
+            with open(path, "rb") as f:
+                data = f.read()
+
+            variants = [(".gz", gzip.compress(data, compresslevel=9, mtime=0))]
+            if brotli is not None:
+                variants.append((".br", brotli.compress(data, quality=11)))
+
+            for suffix, compressed in variants:
+                # Not worth serving if it does not save anything
+                if len(compressed) >= len(data):
+                    continue
+                with open(path + suffix, "wb") as f:
+                    f.write(compressed)
+                written += 1
+    return written
+
+
+if __name__ == "__main__":
+    target = sys.argv[1] if len(sys.argv) > 1 else "frontend"
+    print(f"Wrote {precompress(target)} precompressed files in {target}")
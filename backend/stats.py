@@ -0,0 +1,320 @@
+"""Player stats and leaderboards maintained incrementally at game settlement.
+
+``stats`` holds every player's totals in memory, loaded on first use.
+``record_game`` updates them when a game finishes, and ``run_persister``
+writes the changes back every ``STATS_FLUSH_INTERVAL`` seconds, so reads
+never aggregate over participants or transactions. Changes are written as
+increments on the stored row, so several workers never overwrite each
+other's games. Leaderboards keep players sorted by winnings: top-N reads
+come from a cached slice and rank lookups are a binary search.
+"""
+import asyncio
+import bisect
+import logging
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from sqlalchemy import case, func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from backend.config import settings
+from backend.database import SessionLocal
+from backend.models import GameParticipant, GameRoom, PlayerStats, User
+
+logger = logging.getLogger(__name__)
+
+PERIODS = ("daily", "weekly", "all_time")
+
+STAT_FIELDS = (
+    "games_played", "wins", "total_winnings", "current_streak", "best_streak",
+    "daily_period", "daily_winnings", "weekly_period", "weekly_winnings", "last_played_at",
+)
+
+
+def period_keys(now: datetime) -> Dict[str, str]:
+    year, week, _ = now.isocalendar()
+    return {"daily": now.date().isoformat(), "weekly": f"{year}-W{week:02d}"}
+
+
+class GameResult(NamedTuple):
+    user_id: int
+    name: Optional[str]
+    won: bool
+    winnings: float
+
+
+class Leaderboard:
+    """Players ordered by score, highest first, ties broken by user id.
+
+    The order is a plain sorted list, so an update shifts it in O(n). That is
+    fine for the tens of thousands of players a board holds today; beyond that
+    it wants a sorted container or a skip list.
+    """
+
+    def __init__(self, top_size: int):
+        self.top_size = top_size
+        self.scores: Dict[int, float] = {}
+        self._order: List[Tuple[float, int]] = []  # (-score, user_id), ascending
+        self._top: Optional[List[Tuple[int, float]]] = None
+
+    def update(self, user_id: int, score: float):
+        old = self.scores.get(user_id)
+        if old is not None:
+            del self._order[bisect.bisect_left(self._order, (-old, user_id))]
+        self.scores[user_id] = score
+        bisect.insort(self._order, (-score, user_id))
+        self._top = None
+
+    def rank(self, user_id: int) -> Optional[int]:
+        score = self.scores.get(user_id)
+        if score is None:
+            return None
+        return bisect.bisect_left(self._order, (-score, user_id)) + 1
+
+    def top(self, limit: int) -> List[Tuple[int, float]]:
+        if self._top is None:
+            self._top = [(user_id, -score) for score, user_id in self._order[:self.top_size]]
+        return self._top[:limit]
+
+    def clear(self):
+        self.scores.clear()
+        self._order.clear()
+        self._top = None
+
+    def __len__(self):
+        return len(self.scores)
+
+
+class StatsStore:
+    def __init__(self, top_size: int):
+        self.players: Dict[int, dict] = {}  # user_id -> STAT_FIELDS plus "name"
+        self.boards = {period: Leaderboard(top_size) for period in PERIODS}
+        self.periods = period_keys(datetime.utcnow())
+        self.pending: Dict[int, dict] = {}  # user_id -> changes since the last flush
+        self.loaded = False
+
+    def load(self, db: Session):
+        rows = db.query(PlayerStats, User.username, User.first_name).join(
+            User, User.id == PlayerStats.user_id
+        ).all()
+        self.players.clear()
+        for board in self.boards.values():
+            board.clear()
+        self.periods = period_keys(datetime.utcnow())
+
+        for row, username, first_name in rows:
+            player = {field: getattr(row, field) for field in STAT_FIELDS}
+            player["name"] = username or first_name
+            self.players[row.user_id] = player
+            self._rank(row.user_id, player)
+        self.loaded = True
+
+    def ensure_loaded(self, db: Session):
+        if not self.loaded:
+            self.load(db)
+
+    def _roll_periods(self, now: datetime):
+        keys = period_keys(now)
+        for period, key in keys.items():
+            if self.periods[period] != key:
+                # A new day or week starts with an empty board
+                self.boards[period].clear()
+                self.periods[period] = key
+
+    def _rank(self, user_id: int, player: dict):
+        self.boards["all_time"].update(user_id, player["total_winnings"] or 0.0)
+        for period in ("daily", "weekly"):
+            if player[f"{period}_period"] == self.periods[period]:
+                self.boards[period].update(user_id, player[f"{period}_winnings"] or 0.0)
+
+    def record_game(self, results: List[GameResult], now: Optional[datetime] = None):
+        """Apply one finished game to every participant's totals"""
+        now = now or datetime.utcnow()
+        self._roll_periods(now)
+        for result in results:
+            player = self.players.get(result.user_id)
+            if player is None:
+                player = self.players[result.user_id] = {field: None for field in STAT_FIELDS}
+                player.update(games_played=0, wins=0, total_winnings=0.0, current_streak=0, best_streak=0)
+            player["name"] = result.name
+
+            player["games_played"] += 1
+            player["last_played_at"] = now
+            if result.won:
+                player["wins"] += 1
+                player["total_winnings"] += result.winnings
+                player["current_streak"] += 1
+                player["best_streak"] = max(player["best_streak"], player["current_streak"])
+            else:
+                player["current_streak"] = 0
+
+            for period in ("daily", "weekly"):
+                if player[f"{period}_period"] != self.periods[period]:
+                    player[f"{period}_period"] = self.periods[period]
+                    player[f"{period}_winnings"] = 0.0
+                if result.won:
+                    player[f"{period}_winnings"] += result.winnings
+
+            self._rank(result.user_id, player)
+            self._track(result, player, now)
+
+    def _track(self, result: GameResult, player: dict, now: datetime):
+        change = self.pending.get(result.user_id)
+        if change is None:
+            change = self.pending[result.user_id] = {
+                "user_id": result.user_id, "games_played": 0, "wins": 0, "total_winnings": 0.0,
+                "current_streak": 0, "streak_broken": False,
+                "daily_period": None, "daily_winnings": 0.0, "weekly_period": None, "weekly_winnings": 0.0,
+            }
+        change["games_played"] += 1
+        if result.won:
+            change["wins"] += 1
+            change["total_winnings"] += result.winnings
+            change["current_streak"] += 1
+        else:
+            change["current_streak"] = 0
+            change["streak_broken"] = True
+        change["best_streak"] = player["best_streak"]
+        change["last_played_at"] = now
+        for period in ("daily", "weekly"):
+            if change[f"{period}_period"] != self.periods[period]:
+                change[f"{period}_period"] = self.periods[period]
+                change[f"{period}_winnings"] = 0.0
+            if result.won:
+                change[f"{period}_winnings"] += result.winnings
+
+    def get(self, user_id: int) -> Optional[dict]:
+        player = self.players.get(user_id)
+        if player is None:
+            return None
+        self._roll_periods(datetime.utcnow())
+        result = {field: player[field] for field in ("games_played", "wins", "total_winnings", "current_streak", "best_streak")}
+        for period in ("daily", "weekly"):
+            current = player[f"{period}_period"] == self.periods[period]
+            result[f"{period}_winnings"] = player[f"{period}_winnings"] if current else 0.0
+        result["ranks"] = {period: self.boards[period].rank(user_id) for period in PERIODS}
+        return result
+
+    def leaderboard(self, period: str, limit: int) -> List[dict]:
+        self._roll_periods(datetime.utcnow())
+        return [
+            {"rank": rank, "user_id": user_id, "name": self.players[user_id]["name"], "winnings": score}
+            for rank, (user_id, score) in enumerate(self.boards[period].top(limit), start=1)
+        ]
+
+    def take_dirty(self) -> List[dict]:
+        """Take the changes made since the last flush, one row per player"""
+        changes, self.pending = self.pending, {}
+        return list(changes.values())
+
+    def restore(self, rows: List[dict]):
+        """Put back changes a failed flush did not write, ahead of newer ones"""
+        for row in rows:
+            newer = self.pending.get(row["user_id"])
+            self.pending[row["user_id"]] = row if newer is None else merge_changes(row, newer)
+
+
+def merge_changes(older: dict, newer: dict) -> dict:
+    merged = dict(newer)
+    for field in ("games_played", "wins", "total_winnings"):
+        merged[field] = older[field] + newer[field]
+    if not newer["streak_broken"]:
+        merged["current_streak"] = older["current_streak"] + newer["current_streak"]
+        merged["streak_broken"] = older["streak_broken"]
+    for period in ("daily", "weekly"):
+        if older[f"{period}_period"] == newer[f"{period}_period"]:
+            merged[f"{period}_winnings"] = older[f"{period}_winnings"] + newer[f"{period}_winnings"]
+    return merged
+
+
+stats = StatsStore(settings.LEADERBOARD_TOP_SIZE)
+
+
+def record_room(db: Session, room_id: int):
+    """Settle a finished room's participants into the stats in one query"""
+    stats.ensure_loaded(db)
+    rows = db.query(
+        GameParticipant.user_id, GameParticipant.status, User.username, User.first_name,
+        GameRoom.stake_amount, GameRoom.current_players
+    ).join(User, User.id == GameParticipant.user_id).join(
+        GameRoom, GameRoom.id == GameParticipant.room_id
+    ).filter(GameParticipant.room_id == room_id).all()
+
+    stats.record_game([
+        GameResult(
+            user_id=row.user_id,
+            name=row.username or row.first_name,
+            won=row.status == "won",
+            winnings=(row.stake_amount or 0.0) * (row.current_players or 0) if row.status == "won" else 0.0,
+        )
+        for row in rows
+    ])
+
+
+def _add_changes(dialect: str, rows: List[dict], streak_broken: bool):
+    """Upsert that adds each row's changes to whatever is already stored"""
+    insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+    greatest = func.greatest if dialect == "postgresql" else func.max
+    stmt = insert(PlayerStats).values(rows)
+    stored, new = PlayerStats.__table__.c, stmt.excluded
+
+    def plus(field: str):
+        return func.coalesce(stored[field], 0) + new[field]
+
+    # A loss since the last flush restarts the streak; otherwise the new wins extend it
+    streak = new.current_streak if streak_broken else plus("current_streak")
+    set_ = {field: plus(field) for field in ("games_played", "wins", "total_winnings")}
+    set_.update(
+        current_streak=streak,
+        best_streak=greatest(func.coalesce(stored.best_streak, 0), new.best_streak, streak),
+        last_played_at=new.last_played_at,
+    )
+    for period in ("daily", "weekly"):
+        set_[f"{period}_period"] = new[f"{period}_period"]
+        set_[f"{period}_winnings"] = case(
+            (stored[f"{period}_period"] == new[f"{period}_period"], plus(f"{period}_winnings")),
+            else_=new[f"{period}_winnings"],
+        )
+    return stmt.on_conflict_do_update(index_elements=[PlayerStats.user_id], set_=set_)
+
+
+def write_stats(rows: List[dict]):
+    db = SessionLocal()
+    try:
+        for streak_broken in (False, True):
+            batch = [
+                {field: value for field, value in row.items() if field != "streak_broken"}
+                for row in rows if row["streak_broken"] is streak_broken
+            ]
+            if batch:
+                db.execute(_add_changes(db.bind.dialect.name, batch, streak_broken))
+        db.commit()
+    finally:
+        db.close()
+
+
+async def flush_stats() -> int:
+    rows = stats.take_dirty()
+    if not rows:
+        return 0
+    try:
+        await asyncio.to_thread(write_stats, rows)
+    except Exception:
+        # Written again on the next flush
+        stats.restore(rows)
+        raise
+    return len(rows)
+
+
+async def run_persister(interval: float = settings.STATS_FLUSH_INTERVAL):
+    """Write changed stats back periodically and once more on shutdown"""
+    try:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await flush_stats()
+            except Exception:
+                logger.exception("Error persisting player stats")
+    finally:
+        rows = stats.take_dirty()
+        if rows:
+            write_stats(rows)
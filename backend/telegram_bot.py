@@ -0,0 +1,124 @@
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Optional
+import asyncpg
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
+from telegram.ext import Application, ApplicationBuilder, ContextTypes, TypeHandler
+from backend.config import settings
+from backend.metrics import bot_handler_duration
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[Update, ContextTypes.DEFAULT_TYPE], Awaitable[None]]
+
+# handler name -> {"count", "total_ms", "max_ms"}
+handler_stats: Dict[str, dict] = {}
+
+
+async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await context.bot.send_message(
+        chat_id=update.effective_chat.id,
+        text="Welcome! Please register first."
+    )
+
+async def register(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    chat_id = update.effective_chat.id
+    user = update.effective_user
+    pool: asyncpg.Pool = context.bot_data["db_pool"]
+
+    async with pool.acquire() as conn:
+        await conn.execute(
+            "INSERT INTO users (telegram_id, first_name, username, language, balance, bonus_balance) "
+            "VALUES ($1, $2, $3, 'en', 0, 10) ON CONFLICT (telegram_id) DO NOTHING",
+            str(user.id), user.first_name, user.username
+        )
+
+    # Send play button (as inline keyboard)
+    keyboard = [[InlineKeyboardButton("Play", callback_data="play")]]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    await context.bot.send_message(chat_id=chat_id, text="Registration successful!", reply_markup=reply_markup)
+
+async def play(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.answer()
+    await query.edit_message_text(text="🎮 Game started!")
+
+
+# Routing tables: command name / callback data -> handler
+COMMANDS: Dict[str, Handler] = {
+    "start": start,
+    "register": register,
+}
+
+CALLBACKS: Dict[str, Handler] = {
+    "play": play,
+}
+
+DEFAULT_HANDLER: Handler = start
+
+
+def route(update: Update) -> Optional[Handler]:
+    """Pick the single handler for an update"""
+    if update.callback_query:
+        return CALLBACKS.get(update.callback_query.data)
+
+    message = update.effective_message
+    if message and message.text and message.text.startswith("/"):
+        command = message.text[1:].split(maxsplit=1)[0].split("@")[0].lower()
+        return COMMANDS.get(command, DEFAULT_HANDLER)
+
+    return DEFAULT_HANDLER if update.effective_chat else None
+
+
+async def dispatch(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    handler = route(update)
+    if handler is None:
+        return
+
+    started = time.perf_counter()
+    try:
+        await handler(update, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        bot_handler_duration.observe(elapsed, handler.__name__)
+        elapsed_ms = elapsed * 1000
+        stats = handler_stats.setdefault(handler.__name__, {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+        stats["count"] += 1
+        stats["total_ms"] += elapsed_ms
+        stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+        logger.debug("%s handled update %s in %.1f ms", handler.__name__, update.update_id, elapsed_ms)
+
+
+async def open_db_pool(application: Application):
+    dsn = settings.DATABASE_URL.replace("postgres://", "postgresql://", 1)
+    application.bot_data["db_pool"] = await asyncpg.create_pool(
+        dsn,
+        min_size=settings.BOT_DB_POOL_MIN,
+        max_size=settings.BOT_DB_POOL_MAX,
+    )
+
+async def close_db_pool(application: Application):
+    pool = application.bot_data.pop("db_pool", None)
+    if pool is not None:
+        await pool.close()
+
+
+def build_application() -> Application:
+    if not settings.TELEGRAM_BOT_TOKEN:
+        raise ValueError("TELEGRAM_BOT_TOKEN is not set!")
+
+    application = (
+        ApplicationBuilder()
+        .token(settings.TELEGRAM_BOT_TOKEN)
+        .concurrent_updates(settings.BOT_CONCURRENT_UPDATES)
+        .post_init(open_db_pool)
+        .post_shutdown(close_db_pool)
+        .build()
+    )
+    application.add_handler(TypeHandler(Update, dispatch))
+    return application
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    build_application().run_polling()
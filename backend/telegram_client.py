@@ -0,0 +1,225 @@
+"""Outbound Telegram Bot API client.
+
+All sends go through ``SendQueue``, which paces messages to stay inside
+Telegram's limits (about 30 messages per second overall and one per second to
+the same chat) and retries after the ``retry_after`` delay of a 429 response.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import deque
+from typing import TYPE_CHECKING, Deque, Dict, Iterable, List, Optional, Tuple
+from backend.config import settings
+
+if TYPE_CHECKING:
+    import httpx
+
+logger = logging.getLogger(__name__)
+
+
+class TelegramAPIError(Exception):
+    def __init__(self, method: str, description: str, retry_after: Optional[float] = None):
+        super().__init__(f"{method}: {description}")
+        self.retry_after = retry_after
+
+
+class TelegramClient:
+    """Thin async wrapper around the Bot API on a pooled HTTP client"""
+
+    def __init__(
+        self,
+        token: str = settings.TELEGRAM_BOT_TOKEN,
+        base_url: str = settings.TELEGRAM_API_URL,
+        transport: Optional["httpx.AsyncBaseTransport"] = None,
+    ):
+        self.base_url = f"{base_url.rstrip('/')}/bot{token}"
+        self.transport = transport
+        self._http: Optional["httpx.AsyncClient"] = None
+
+    @property
+    def http(self) -> "httpx.AsyncClient":
+        if self._http is None:
+            # Imported on first send; httpx is a large share of startup time
+            import httpx
+
+            self._http = httpx.AsyncClient(
+                transport=self.transport,
+                timeout=httpx.Timeout(10.0, connect=5.0),
+                limits=httpx.Limits(
+                    max_connections=settings.TELEGRAM_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.TELEGRAM_MAX_CONNECTIONS
+                ),
+            )
+        return self._http
+
+    async def call(self, method: str, payload: dict) -> dict:
+        response = await self.http.post(f"{self.base_url}/{method}", json=payload)
+        try:
+            data = response.json()
+        except ValueError:
+            raise TelegramAPIError(method, f"HTTP {response.status_code}")
+        if not data.get("ok"):
+            retry_after = (data.get("parameters") or {}).get("retry_after")
+            raise TelegramAPIError(method, data.get("description", response.reason_phrase), retry_after)
+        return data["result"]
+
+    async def send_message(self, chat_id: int, text: str, **kwargs) -> dict:
+        return await self.call("sendMessage", {"chat_id": chat_id, "text": text, **kwargs})
+
+    async def close(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+
+class SendQueue:
+    """Scheduler that delivers queued messages within Telegram's rate limits.
+
+    Each chat has its own FIFO; a heap orders chats by the earliest time they
+    may be sent to again. The dispatcher takes the next ready chat, waits for a
+    global send slot and hands the message to a worker.
+    """
+
+    def __init__(
+        self,
+        client: TelegramClient,
+        global_rate: float = settings.TELEGRAM_GLOBAL_RATE,
+        per_chat_interval: float = settings.TELEGRAM_PER_CHAT_INTERVAL,
+        max_retries: int = 3,
+    ):
+        self.client = client
+        self.global_interval = 1.0 / global_rate
+        self.per_chat_interval = per_chat_interval
+        self.max_retries = max_retries
+        self._chats: Dict[int, Deque[Tuple[str, dict, int]]] = {}  # chat_id -> (method, payload, attempts)
+        self._ready: List[Tuple[float, int, int]] = []  # (not_before, seq, chat_id)
+        self._scheduled: set = set()
+        self._busy: set = set()  # chats with a send in flight
+        self._seq = itertools.count()
+        self._next_global = 0.0
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._inflight: set = set()
+        self.sent = 0
+        self.failed = 0
+        self.throttled = 0
+
+    @property
+    def depth(self) -> int:
+        return sum(len(queue) for queue in self._chats.values())
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._dispatch())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
+
+    def enqueue(self, method: str, payload: dict):
+        chat_id = payload["chat_id"]
+        self._chats.setdefault(chat_id, deque()).append((method, payload, 0))
+        self._schedule(chat_id, time.monotonic())
+        self.start()
+
+    def send_message(self, chat_id: int, text: str, **kwargs):
+        self.enqueue("sendMessage", {"chat_id": chat_id, "text": text, **kwargs})
+
+    def broadcast(self, chat_ids: Iterable[int], text: str, **kwargs) -> int:
+        """Queue the same message for many chats; returns how many were queued"""
+        count = 0
+        for chat_id in dict.fromkeys(chat_ids):
+            self.send_message(chat_id, text, **kwargs)
+            count += 1
+        return count
+
+    def _schedule(self, chat_id: int, not_before: float):
+        if chat_id in self._scheduled or chat_id in self._busy:
+            return
+        self._scheduled.add(chat_id)
+        heapq.heappush(self._ready, (not_before, next(self._seq), chat_id))
+        self._wakeup.set()
+
+    async def _dispatch(self):
+        while True:
+            if not self._ready:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            now = time.monotonic()
+            wait = max(self._ready[0][0], self._next_global) - now
+            if wait > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            _, _, chat_id = heapq.heappop(self._ready)
+            self._scheduled.discard(chat_id)
+            queue = self._chats.get(chat_id)
+            if not queue:
+                self._chats.pop(chat_id, None)
+                continue
+
+            method, payload, attempts = queue.popleft()
+            self._busy.add(chat_id)
+            self._next_global = now + self.global_interval
+            task = asyncio.create_task(self._send(chat_id, method, payload, attempts))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _send(self, chat_id: int, method: str, payload: dict, attempts: int):
+        import httpx
+
+        delay = self.per_chat_interval
+        try:
+            await self.client.call(method, payload)
+            self.sent += 1
+        except TelegramAPIError as e:
+            if e.retry_after is not None and attempts < self.max_retries:
+                self.throttled += 1
+                delay = float(e.retry_after)
+                # Telegram's flood limit is global: hold every chat, not just this one
+                self._next_global = max(self._next_global, time.monotonic() + delay)
+                self._chats.setdefault(chat_id, deque()).appendleft((method, payload, attempts + 1))
+            else:
+                self.failed += 1
+                logger.warning("Error sending %s to chat %s: %s", method, chat_id, e)
+        except httpx.HTTPError as e:
+            self.failed += 1
+            logger.warning("Error sending %s to chat %s: %s", method, chat_id, e)
+        except Exception:
+            self.failed += 1
+            logger.exception("Unexpected error sending %s to chat %s", method, chat_id)
+        finally:
+            # Whatever happened, the chat must not stay busy or its queue would never drain
+            self._busy.discard(chat_id)
+            if self._chats.get(chat_id):
+                self._schedule(chat_id, time.monotonic() + delay)
+            else:
+                self._chats.pop(chat_id, None)
+
+    def stats(self) -> dict:
+        return {
+            "depth": self.depth,
+            "chats": len(self._chats),
+            "sent": self.sent,
+            "failed": self.failed,
+            "throttled": self.throttled,
+        }
+
+
+telegram_client = TelegramClient()
+send_queue = SendQueue(telegram_client)
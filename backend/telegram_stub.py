@@ -0,0 +1,86 @@
+"""Local stand-in for the Telegram Bot API.
+
+Records every call and enforces the same global and per-chat limits as
+Telegram, answering 429 with ``retry_after`` when they are exceeded. Point the
+app at it with ``TELEGRAM_API_URL=http://127.0.0.1:8081`` and run::
+
+    python -m backend.telegram_stub --port 8081
+"""
+import argparse
+import math
+import time
+from collections import deque
+from typing import Deque, Dict, List
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+
+class TelegramStub:
+    def __init__(self, global_rate: int = 30, per_chat_interval: float = 1.0):
+        self.global_rate = global_rate
+        self.per_chat_interval = per_chat_interval
+        self.calls: List[dict] = []
+        self.rejected = 0
+        self._recent: Deque[float] = deque()  # send times within the last second
+        self._last_by_chat: Dict[int, float] = {}
+
+    def retry_after(self, chat_id, now: float) -> float:
+        while self._recent and now - self._recent[0] >= 1.0:
+            self._recent.popleft()
+        wait = 0.0
+        if len(self._recent) >= self.global_rate:
+            wait = 1.0 - (now - self._recent[0])
+        last = self._last_by_chat.get(chat_id)
+        if last is not None and now - last < self.per_chat_interval:
+            wait = max(wait, self.per_chat_interval - (now - last))
+        return wait
+
+    def handle(self, method: str, payload: dict) -> dict:
+        now = time.monotonic()
+        chat_id = payload.get("chat_id")
+        wait = self.retry_after(chat_id, now)
+        if wait > 0:
+            self.rejected += 1
+            return {
+                "ok": False,
+                "error_code": 429,
+                "description": "Too Many Requests: retry later",
+                "parameters": {"retry_after": math.ceil(wait)}
+            }
+
+        self._recent.append(now)
+        if chat_id is not None:
+            self._last_by_chat[chat_id] = now
+        self.calls.append({"method": method, "payload": payload, "at": now})
+        return {
+            "ok": True,
+            "result": {"message_id": len(self.calls), "chat": {"id": chat_id}, "text": payload.get("text")}
+        }
+
+
+def create_stub_app(stub: TelegramStub = None) -> FastAPI:
+    stub = stub or TelegramStub()
+    app = FastAPI()
+    app.state.stub = stub
+
+    @app.post("/bot{token}/{method}")
+    async def bot_method(token: str, method: str, request: Request):
+        payload = await request.json()
+        body = stub.handle(method, payload)
+        return JSONResponse(body, status_code=200 if body["ok"] else body["error_code"])
+
+    @app.get("/calls")
+    async def calls():
+        return {"calls": stub.calls, "rejected": stub.rejected}
+
+    return app
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Local Telegram Bot API stub")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    args = parser.parse_args()
+    uvicorn.run(create_stub_app(), host=args.host, port=args.port)
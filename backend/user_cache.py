@@ -0,0 +1,92 @@
+import time
+from collections import OrderedDict
+from typing import Optional
+from sqlalchemy.orm import Session
+from backend.config import settings
+from backend.models import User
+
+# Balances are never cached: they must always be read from the database
+PROFILE_FIELDS = (
+    "id", "telegram_id", "username", "first_name", "last_name",
+    "photo_url", "language", "created_at",
+)
+
+
+class UserCache:
+    """Bounded LRU cache of user profile fields with a per-entry TTL"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()  # user_id -> (expires_at, profile)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, user_id: int) -> Optional[dict]:
+        entry = self._entries.get(user_id)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[user_id]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, user: User) -> dict:
+        profile = {field: getattr(user, field) for field in PROFILE_FIELDS}
+        self._entries[user.id] = (time.monotonic() + self.ttl, profile)
+        self._entries.move_to_end(user.id)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        return profile
+
+    def invalidate(self, user_id: int):
+        self._entries.pop(user_id, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+user_cache = UserCache(settings.USER_CACHE_SIZE, settings.USER_CACHE_TTL)
+
+
+def get_profile(db: Session, user_id: int) -> Optional[dict]:
+    """Read-through lookup of a user's profile fields (may be slightly stale)"""
+    profile = user_cache.get(user_id)
+    if profile is None:
+        user = db.query(User).filter(User.id == user_id).first()
+        if not user:
+            return None
+        profile = user_cache.put(user)
+    return profile
+
+
+def get_user_with_balance(db: Session, user_id: int) -> Optional[dict]:
+    """Cached profile fields merged with balances read fresh from the database"""
+    profile = user_cache.get(user_id)
+    if profile is None:
+        user = db.query(User).filter(User.id == user_id).first()
+        if not user:
+            return None
+        profile = user_cache.put(user)
+        return {**profile, "balance": user.balance, "bonus_balance": user.bonus_balance}
+
+    balances = db.query(User.balance, User.bonus_balance).filter(User.id == user_id).first()
+    if balances is None:
+        user_cache.invalidate(user_id)
+        return None
+    return {**profile, "balance": balances.balance, "bonus_balance": balances.bonus_balance}
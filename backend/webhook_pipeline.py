@@ -0,0 +1,123 @@
+"""Buffered processing of incoming Telegram webhook updates.
+
+The webhook only deduplicates and enqueues; a pool of workers runs the
+handlers. Updates are sharded by chat so each chat is handled in order.
+"""
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Awaitable, Callable, List, Optional
+from backend.config import settings
+
+logger = logging.getLogger(__name__)
+
+UpdateHandler = Callable[[dict], Awaitable[None]]
+
+
+def update_chat_id(update: dict) -> Optional[int]:
+    """Chat an update belongs to, used to keep per-chat ordering"""
+    for key in ("message", "edited_message", "channel_post", "edited_channel_post", "my_chat_member", "chat_member"):
+        chat = (update.get(key) or {}).get("chat")
+        if chat:
+            return chat.get("id")
+    callback = update.get("callback_query") or {}
+    chat = (callback.get("message") or {}).get("chat")
+    if chat:
+        return chat.get("id")
+    for value in update.values():
+        if isinstance(value, dict) and isinstance(value.get("from"), dict):
+            return value["from"].get("id")
+    return None
+
+
+class UpdatePipeline:
+    def __init__(
+        self,
+        handler: UpdateHandler,
+        workers: int = settings.WEBHOOK_WORKERS,
+        max_queue: int = settings.WEBHOOK_QUEUE_SIZE,
+        dedup_size: int = settings.WEBHOOK_DEDUP_SIZE,
+    ):
+        self.handler = handler
+        self.workers = workers
+        self.max_queue = max_queue
+        self.dedup_size = dedup_size
+        self._queues: List[asyncio.Queue] = []
+        self._tasks: List[asyncio.Task] = []
+        self._seen: "OrderedDict[int, None]" = OrderedDict()  # recent update_ids, oldest first
+        self.accepted = 0
+        self.duplicates = 0
+        self.dropped = 0
+        self.processed = 0
+        self.failed = 0
+
+    @property
+    def depth(self) -> int:
+        return sum(queue.qsize() for queue in self._queues)
+
+    def start(self):
+        if self._tasks:
+            return
+        shard_size = max(1, self.max_queue // self.workers)
+        self._queues = [asyncio.Queue(maxsize=shard_size) for _ in range(self.workers)]
+        self._tasks = [asyncio.create_task(self._worker(queue)) for queue in self._queues]
+
+    async def stop(self, drain: bool = True):
+        if drain:
+            await asyncio.gather(*(queue.join() for queue in self._queues))
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queues = []
+
+    def submit(self, update: dict) -> bool:
+        """Queue an update; False if it is a redelivery.
+
+        Raises ``asyncio.QueueFull`` when the chat's shard is full, so the
+        caller can ask Telegram to retry later.
+        """
+        update_id = update.get("update_id")
+        if update_id is not None and update_id in self._seen:
+            self.duplicates += 1
+            return False
+
+        self.start()
+        chat_id = update_chat_id(update)
+        shard = hash(chat_id if chat_id is not None else update_id) % self.workers
+        try:
+            self._queues[shard].put_nowait(update)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            raise
+
+        if update_id is not None:
+            self._seen[update_id] = None
+            if len(self._seen) > self.dedup_size:
+                self._seen.popitem(last=False)
+        self.accepted += 1
+        return True
+
+    async def _worker(self, queue: asyncio.Queue):
+        while True:
+            update = await queue.get()
+            try:
+                await self.handler(update)
+                self.processed += 1
+            except Exception:
+                self.failed += 1
+                logger.exception("Error handling update %s", update.get("update_id"))
+            finally:
+                queue.task_done()
+
+    def stats(self) -> dict:
+        return {
+            "depth": self.depth,
+            "capacity": sum(queue.maxsize for queue in self._queues) or self.max_queue,
+            "workers": self.workers,
+            "accepted": self.accepted,
+            "duplicates": self.duplicates,
+            "dropped": self.dropped,
+            "processed": self.processed,
+            "failed": self.failed,
+        }
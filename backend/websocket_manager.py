@@ -1,14 +1,21 @@
 from typing import Set, Dict, List
 import json
+import logging
 from fastapi import WebSocket
+from starlette.websockets import WebSocketState
+from backend.metrics import broadcast_duration, broadcast_recipients
+
+logger = logging.getLogger(__name__)
 
 class ConnectionManager:
     def __init__(self):
         self.active_connections: Dict[int, Set[WebSocket]] = {}  # room_id -> set of websockets
         self.user_connections: Dict[int, WebSocket] = {}  # user_id -> websocket
+        self.lobby_connections: Set[WebSocket] = set()
     
     async def connect(self, websocket: WebSocket, room_id: int, user_id: int):
-        await websocket.accept()
+        if websocket.client_state == WebSocketState.CONNECTING:
+            await websocket.accept()
         if room_id not in self.active_connections:
             self.active_connections[room_id] = set()
         self.active_connections[room_id].add(websocket)
@@ -22,14 +29,33 @@ class ConnectionManager:
         if user_id in self.user_connections:
             del self.user_connections[user_id]
     
+    async def connect_lobby(self, websocket: WebSocket):
+        await websocket.accept()
+        self.lobby_connections.add(websocket)
+    
+    def disconnect_lobby(self, websocket: WebSocket):
+        self.lobby_connections.discard(websocket)
+    
+    async def broadcast_to_lobby(self, message: dict):
+        """Send message to all clients watching the lobby"""
+        for connection in list(self.lobby_connections):
+            try:
+                await connection.send_json(message)
+            except Exception as e:
+                logger.warning("Error broadcasting to lobby: %s", e)
+                self.lobby_connections.discard(connection)
+    
     async def broadcast_to_room(self, room_id: int, message: dict):
         """Send message to all users in a room"""
         if room_id in self.active_connections:
-            for connection in self.active_connections[room_id]:
-                try:
-                    await connection.send_json(message)
-                except Exception as e:
-                    print(f"Error broadcasting to room {room_id}: {e}")
+            message_type = message.get("type", "unknown")
+            with broadcast_duration.time(message_type):
+                for connection in self.active_connections[room_id]:
+                    try:
+                        await connection.send_json(message)
+                        broadcast_recipients.inc(message_type)
+                    except Exception as e:
+                        logger.warning("Error broadcasting to room %s: %s", room_id, e)
     
     async def send_personal_message(self, user_id: int, message: dict):
         """Send message to a specific user"""
@@ -37,6 +63,6 @@ class ConnectionManager:
             try:
                 await self.user_connections[user_id].send_json(message)
             except Exception as e:
-                print(f"Error sending personal message to user {user_id}: {e}")
+                logger.warning("Error sending personal message to user %s: %s", user_id, e)
 
 manager = ConnectionManager()
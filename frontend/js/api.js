@@ -1,12 +1,21 @@
 const API_BASE_URL = 'https://bingoo-bot.onrender.com/api';
 
 // API helper function
-async function apiCall(endpoint, method = 'GET', data = null, isFormData = false) {
+async function apiCall(endpoint, method = 'GET', data = null, isFormData = false, idempotencyKey = null) {
     const options = {
         method,
         headers: {}
     };
     
+    if (window.authToken) {
+        options.headers['Authorization'] = `Bearer ${window.authToken}`;
+    }
+    
+    // Lets the server replay the first result if this request is retried
+    if (idempotencyKey) {
+        options.headers['Idempotency-Key'] = idempotencyKey;
+    }
+    
     if (!isFormData && data) {
         options.headers['Content-Type'] = 'application/json';
         options.body = JSON.stringify(data);
@@ -15,7 +24,14 @@ async function apiCall(endpoint, method = 'GET', data = null, isFormData = false
     }
     
     try {
-        const response = await fetch(`${API_BASE_URL}${endpoint}`, options);
+        let response;
+        try {
+            response = await fetch(`${API_BASE_URL}${endpoint}`, options);
+        } catch (networkError) {
+            // Only safe to resend when the server can deduplicate it
+            if (!idempotencyKey) throw networkError;
+            response = await fetch(`${API_BASE_URL}${endpoint}`, options);
+        }
         
         if (!response.ok) {
             const error = await response.json();
@@ -34,15 +50,13 @@ async function apiCall(endpoint, method = 'GET', data = null, isFormData = false
 async function loginUser() {
     try {
         const response = await apiCall('/auth/login', 'POST', {
-            telegram_id: window.currentUser.telegram_id,
-            first_name: window.currentUser.first_name,
-            last_name: window.currentUser.last_name,
-            username: window.currentUser.username
+            init_data: tg.initData
         });
         
-        window.currentUser.id = response.id;
-        window.currentUser.balance = response.balance;
-        window.currentUser.bonus_balance = response.bonus_balance;
+        window.authToken = response.access_token;
+        window.currentUser.id = response.user.id;
+        window.currentUser.balance = response.user.balance;
+        window.currentUser.bonus_balance = response.user.bonus_balance;
         
         updateBalanceDisplay();
         loadGameRooms();
@@ -87,7 +101,9 @@ async function joinGame(roomId, cardIds) {
         const response = await apiCall(
             `/games/join-game?user_id=${window.currentUser.id}&room_id=${roomId}`,
             'POST',
-            { card_ids: cardIds }
+            { card_ids: cardIds },
+            false,
+            crypto.randomUUID()
         );
         return response;
     } catch (error) {
@@ -148,7 +164,9 @@ async function depositFunds(method, amount, phoneOrAccount) {
                 method,
                 amount: parseFloat(amount),
                 phone_or_account: phoneOrAccount
-            }
+            },
+            false,
+            crypto.randomUUID()
         );
         return response;
     } catch (error) {
@@ -166,7 +184,9 @@ async function withdrawFunds(amount, method, accountInfo) {
                 amount: parseFloat(amount),
                 method,
                 account_info: accountInfo
-            }
+            },
+            false,
+            crypto.randomUUID()
         );
         return response;
     } catch (error) {
@@ -183,7 +203,9 @@ async function transferFunds(recipientId, amount) {
             {
                 recipient_id: parseInt(recipientId),
                 amount: parseFloat(amount)
-            }
+            },
+            false,
+            crypto.randomUUID()
         );
         return response;
     } catch (error) {
@@ -0,0 +1,65 @@
+"""Tests run against a throwaway SQLite database, migrated once per session"""
+import os
+import tempfile
+
+# Settings are read when backend is first imported, so the environment comes first
+_db_dir = tempfile.mkdtemp(prefix="bingo-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_db_dir, 'test.db')}"
+os.environ["TELEGRAM_BOT_TOKEN"] = ""
+os.environ["ARCHIVER_ENABLED"] = "false"
+os.environ["PAYMENTS_WORKER_ENABLED"] = "false"
+
+import pytest
+from fastapi.testclient import TestClient
+from backend.app import create_app
+from backend.database import Base, SessionLocal, engine
+from backend.migrations import upgrade
+from backend.models import User
+from backend.security import create_access_token
+from backend.user_cache import user_cache
+
+upgrade()
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+        with engine.begin() as conn:
+            for table in reversed(Base.metadata.sorted_tables):
+                conn.execute(table.delete())
+        # Row ids are reused once the tables are emptied
+        user_cache.clear()
+
+
+@pytest.fixture
+def make_user(db):
+    def make(balance: float = 0.0, **fields) -> User:
+        count = db.query(User).count()
+        user = User(
+            telegram_id=fields.pop("telegram_id", str(1000 + count)),
+            username=fields.pop("username", f"player{count}"),
+            first_name=fields.pop("first_name", "Player"),
+            balance=balance,
+            **fields
+        )
+        db.add(user)
+        db.commit()
+        return user
+    return make
+
+
+@pytest.fixture
+def client(db):
+    # Without the lifespan: no background workers, bot pipeline or game loops
+    return TestClient(create_app())
+
+
+@pytest.fixture
+def auth_headers():
+    def headers(user: User) -> dict:
+        return {"Authorization": f"Bearer {create_access_token(user.id, 'en')}"}
+    return headers
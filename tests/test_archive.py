@@ -0,0 +1,78 @@
+from datetime import datetime, timedelta
+import pytest
+from backend import archive
+from backend.models import BingoCard, CalledNumber, GameHistory, GameParticipant, GameRoom
+from backend.replays import ReplayCache
+from backend.routes import games
+
+NUMBERS = [
+    [1, 16, 31, 46, 61],
+    [2, 17, 32, 47, 62],
+    [3, 18, 0, 48, 63],
+    [4, 19, 34, 49, 64],
+    [5, 20, 35, 50, 65],
+]
+
+
+def test_packing_round_trips():
+    draw = [75, 1, 33, 60, 12]
+    assert archive.unpack_draw_order(archive.pack_draw_order(draw)) == draw
+    assert archive.unpack_draw_order(None) == []
+    assert archive.unpack_card(archive.pack_card(NUMBERS)) == NUMBERS
+
+    marks = archive.mask_to_marks(archive.marks_to_mask(NUMBERS, [1, 2, 3, 4, 5, 99]))
+    assert marks[2][2]  # FREE
+    assert [row[0] for row in marks] == [True] * 5
+    assert sum(map(sum, marks)) == 6
+
+
+@pytest.fixture
+def finished_game(db, make_user):
+    winner, loser = make_user(), make_user()
+    ended = datetime.utcnow() - timedelta(days=1)
+    room = GameRoom(name="archived", stake_amount=10, current_players=2, status="finished",
+                    start_time=ended - timedelta(minutes=5), end_time=ended)
+    cards = [BingoCard(user_id=winner.id, numbers=NUMBERS), BingoCard(user_id=loser.id, numbers=NUMBERS)]
+    db.add_all([room, *cards])
+    db.flush()
+    db.add_all([
+        GameParticipant(user_id=winner.id, room_id=room.id, card_numbers=[cards[0].id], status="won",
+                        cards_marked={str(cards[0].id): [1, 2, 3, 4, 5]}),
+        GameParticipant(user_id=loser.id, room_id=room.id, card_numbers=[cards[1].id], status="lost",
+                        cards_marked={str(cards[1].id): [1]}),
+        *[CalledNumber(room_id=room.id, number=n) for n in (5, 4, 3, 2, 1)],
+    ])
+    db.commit()
+    return room.id, winner
+
+
+def test_archiving_compacts_the_live_rows(db, finished_game):
+    room_id, winner = finished_game
+    assert archive.archive_finished_games(db) == 1
+    assert archive.archive_finished_games(db) == 0
+
+    assert db.query(CalledNumber).count() == 0
+    assert [p.cards_marked for p in db.query(GameParticipant)] == [None, None]
+    record = db.get(GameHistory, room_id)
+    assert archive.unpack_draw_order(record.draw_order) == [5, 4, 3, 2, 1]
+    assert record.winners == [winner.id]
+    assert record.pot == 20
+
+
+def test_history_and_replay_read_the_archive(db, client, auth_headers, monkeypatch, finished_game):
+    room_id, winner = finished_game
+    archive.archive_finished_games(db)
+    monkeypatch.setattr(games, "replays", ReplayCache(10))
+
+    replay = client.get(f"/api/games/history/{room_id}", headers=auth_headers(winner))
+    assert replay.status_code == 200
+    body = replay.json()
+    assert (body["status"], body["winnings"], body["draw_order"]) == ("won", 20.0, [5, 4, 3, 2, 1])
+    assert body["cards"][0]["numbers"] == NUMBERS
+    assert [row[0] for row in body["cards"][0]["marks"]] == [True] * 5
+
+    history = client.get("/api/games/history", params={"include_replay": True}, headers=auth_headers(winner))
+    assert history.status_code == 200
+    [game] = history.json()
+    assert game["room_id"] == room_id
+    assert game["replay"]["draw_order"] == [5, 4, 3, 2, 1]
@@ -0,0 +1,80 @@
+import asyncio
+import random
+import pytest
+from backend.config import settings
+from backend.routes import bot
+from backend.webhook_pipeline import UpdatePipeline
+
+SECRET = {"X-Telegram-Bot-Api-Secret-Token": "s3cret"}
+
+
+@pytest.fixture
+def submitted(monkeypatch):
+    updates = []
+    monkeypatch.setattr(settings, "TELEGRAM_WEBHOOK_SECRET", "s3cret")
+    monkeypatch.setattr(bot.pipeline, "submit", updates.append)
+    return updates
+
+
+def test_webhook_is_closed_without_a_secret(client, monkeypatch):
+    monkeypatch.setattr(settings, "TELEGRAM_WEBHOOK_SECRET", "")
+    response = client.post("/api/bot/webhook", json={"update_id": 1})
+    assert response.status_code == 404
+
+
+def test_webhook_checks_secret_and_body(client, submitted):
+    assert client.post("/api/bot/webhook", json={"update_id": 1}).status_code == 401
+    assert client.post("/api/bot/webhook", content=b"{not json", headers=SECRET).status_code == 400
+    assert client.post("/api/bot/webhook", json=[1], headers=SECRET).status_code == 400
+    assert client.post("/api/bot/webhook", json={"update_id": 1}, headers=SECRET).status_code == 200
+    assert submitted == [{"update_id": 1}]
+
+
+def test_webhook_stats_are_admin_only(client, monkeypatch):
+    monkeypatch.setattr(settings, "ADMIN_TOKEN", "admin")
+    assert client.get("/api/bot/webhook/stats").status_code == 401
+    response = client.get("/api/bot/webhook/stats", headers={"X-Admin-Token": "admin"})
+    assert response.status_code == 200
+    assert "accepted" in response.json()
+
+
+def message(update_id: int, chat_id: int) -> dict:
+    return {"update_id": update_id, "message": {"chat": {"id": chat_id}, "text": str(update_id)}}
+
+
+def test_redelivered_updates_are_handled_once():
+    handled = []
+
+    async def handle(update):
+        handled.append(update["update_id"])
+
+    async def run():
+        pipeline = UpdatePipeline(handle, workers=2, max_queue=100, dedup_size=100)
+        results = [pipeline.submit(message(n, chat_id=7)) for n in (1, 2, 1, 2, 3)]
+        await pipeline.stop()
+        return pipeline, results
+
+    pipeline, results = asyncio.run(run())
+    assert results == [True, True, False, False, True]
+    assert handled == [1, 2, 3]
+    assert pipeline.duplicates == 2
+
+
+def test_each_chat_is_handled_in_order_across_shards():
+    handled = {}
+
+    async def handle(update):
+        # Uneven handler times would reorder a chat's updates if they ran concurrently
+        await asyncio.sleep(random.uniform(0, 0.005))
+        handled.setdefault(update["message"]["chat"]["id"], []).append(update["update_id"])
+
+    async def run():
+        pipeline = UpdatePipeline(handle, workers=4, max_queue=400, dedup_size=1000)
+        for n in range(200):
+            pipeline.submit(message(n, chat_id=n % 10))
+        await pipeline.stop()
+        return pipeline
+
+    pipeline = asyncio.run(run())
+    assert pipeline.processed == 200
+    assert handled == {chat: list(range(chat, 200, 10)) for chat in range(10)}
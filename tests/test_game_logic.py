@@ -0,0 +1,70 @@
+import random
+import pytest
+from backend.game_logic import LINES, BingoCardGenerator, BingoGameLogic, CardProgress
+
+CARD = [
+    [1, 16, 31, 46, 61],
+    [2, 17, 32, 47, 62],
+    [3, 18, 0, 48, 63],
+    [4, 19, 34, 49, 64],
+    [5, 20, 35, 50, 65],
+]
+
+LINE_NAMES = [f"row {i + 1}" for i in range(5)] + [f"column {j + 1}" for j in range(5)] + ["diagonal \\", "diagonal /"]
+
+
+@pytest.mark.parametrize("line", LINES, ids=LINE_NAMES)
+def test_line_completes_on_its_last_number(line):
+    progress = CardProgress(1, 1, CARD)
+    numbers = [CARD[i][j] for i, j in line if CARD[i][j] != 0]
+    # Lines through the FREE centre need one number fewer
+    assert len(numbers) == (4 if (2, 2) in line else 5)
+
+    for number in numbers[:-1]:
+        progress.call(number)
+        assert progress.best > 0
+    assert progress.call(numbers[-1])
+    assert progress.best == 0
+
+
+def test_numbers_off_the_card_change_nothing():
+    progress = CardProgress(1, 1, CARD)
+    assert not progress.call(75)
+    assert progress.best == 4
+
+
+def marks_for(card, called):
+    return [[card[i][j] == 0 or card[i][j] in called for j in range(5)] for i in range(5)]
+
+
+def test_progress_agrees_with_full_check_on_random_cards():
+    rng = random.Random(2024)
+    random.seed(2024)
+    logic = BingoGameLogic()
+    for _ in range(200):
+        card = BingoCardGenerator.generate_card()
+        progress = CardProgress(1, 1, card)
+        called = set()
+        for number in rng.sample(range(1, 76), 75):
+            progress.call(number)
+            called.add(number)
+            marks = marks_for(card, called)
+            uncalled = min(sum(1 for i, j in line if not marks[i][j]) for line in LINES)
+            assert progress.best == uncalled
+            assert (progress.best == 0) == logic.check_win(card, marks)[0]
+            if progress.best == 0:
+                break
+
+
+def test_card_registered_mid_game_catches_up():
+    logic = BingoGameLogic()
+    logic.all_numbers = list(range(1, 76))  # column B comes first
+    for _ in range(4):
+        logic.call_next_number()
+    logic.register_card(7, 42, CARD)
+    assert logic.card_progress(42) == {7: 1}
+    assert logic.closeness_summary() == {"one_away": 1, "complete": 0}
+
+    logic.call_next_number()
+    assert logic.last_changed_users == {42}
+    assert logic.closeness_summary() == {"one_away": 0, "complete": 1}
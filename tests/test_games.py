@@ -0,0 +1,146 @@
+import asyncio
+import pytest
+from fastapi import HTTPException
+from backend.game_scheduler import scheduler
+from backend.models import BingoCard, GameParticipant, GameRoom
+from backend.routes.games import active_games, start_game
+from backend.websocket_manager import manager
+
+NUMBERS = [
+    [1, 16, 31, 46, 61],
+    [2, 17, 32, 47, 62],
+    [3, 18, 0, 48, 63],
+    [4, 19, 34, 49, 64],
+    [5, 20, 35, 50, 65],
+]
+
+
+def test_marks_are_persisted_and_replayed(db, client, make_user, auth_headers):
+    user = make_user()
+    card = BingoCard(user_id=user.id, numbers=NUMBERS)
+    room = GameRoom(name="room", stake_amount=10, current_players=1, status="playing")
+    db.add_all([card, room])
+    db.flush()
+    db.add(GameParticipant(user_id=user.id, room_id=room.id, card_numbers=[card.id], status="playing", cards_marked={}))
+    db.commit()
+
+    headers = auth_headers(user)
+    for number in (1, 17, 17):
+        response = client.post(
+            "/api/games/mark-number", params={"room_id": room.id, "number": number, "card_index": 0}, headers=headers
+        )
+        assert response.status_code == 200
+
+    db.expire_all()
+    assert db.query(GameParticipant.cards_marked).scalar() == {str(card.id): [1, 17]}
+
+    db.query(GameRoom).update({GameRoom.status: "finished"})
+    db.commit()
+    replay = client.get(f"/api/games/history/{room.id}", headers=headers).json()
+    marks = replay["cards"][0]["marks"]
+    assert [marks[0][0], marks[1][1], marks[2][2], marks[0][1]] == [True, True, True, False]
+
+
+def own_cards(db, user, count: int = 1) -> list:
+    cards = [BingoCard(user_id=user.id, numbers=NUMBERS) for _ in range(count)]
+    db.add_all(cards)
+    db.commit()
+    return [card.id for card in cards]
+
+
+def join(client, headers, room_id: int, card_ids: list):
+    return client.post("/api/games/join-game", params={"room_id": room_id, "card_ids": card_ids}, headers=headers)
+
+
+def test_join_records_database_time(db, client, make_user, auth_headers):
+    user = make_user(balance=10)
+    room = GameRoom(name="room", stake_amount=10, max_players=2, status="waiting")
+    db.add(room)
+    db.commit()
+
+    response = join(client, auth_headers(user), room.id, own_cards(db, user))
+    assert response.status_code == 200
+    db.expire_all()
+    joined_at = db.query(GameParticipant.joined_at).scalar()
+    assert joined_at is not None
+    assert response.json()["joined_at"] == joined_at.isoformat()
+
+
+def test_join_rejected_once_game_has_started(db, client, make_user, auth_headers):
+    user = make_user(balance=10)
+    room = GameRoom(name="room", stake_amount=10, max_players=2, status="starting")
+    db.add(room)
+    db.commit()
+
+    response = join(client, auth_headers(user), room.id, own_cards(db, user))
+    assert (response.status_code, response.json()["detail"]) == (400, "Game already started")
+    db.expire_all()
+    assert db.query(GameParticipant).count() == 0
+    assert user.balance == 10
+
+
+@pytest.mark.parametrize("cards,detail", [
+    ("too many", "Choose 1 to 2 different cards"),
+    ("repeated", "Choose 1 to 2 different cards"),
+    ("someone else's", "Card not found"),
+])
+def test_join_checks_cards_before_debiting(db, client, make_user, auth_headers, cards, detail):
+    user, other = make_user(balance=10), make_user()
+    mine, theirs = own_cards(db, user, 3), own_cards(db, other)
+    card_ids = {"too many": mine, "repeated": mine[:1] * 2, "someone else's": [mine[0], theirs[0]]}[cards]
+    room = GameRoom(name="room", stake_amount=10, max_players=2, status="waiting")
+    db.add(room)
+    db.commit()
+
+    response = join(client, auth_headers(user), room.id, card_ids)
+    assert (response.status_code, response.json()["detail"]) == (400, detail)
+    db.expire_all()
+    assert db.query(GameParticipant).count() == 0
+    assert user.balance == 10
+
+
+def test_join_broadcasts_player_joined(db, client, make_user, auth_headers, monkeypatch):
+    messages = []
+
+    async def broadcast(room_id, message):
+        messages.append(message)
+
+    monkeypatch.setattr(manager, "broadcast_to_room", broadcast)
+    user = make_user(balance=10, username="abebe")
+    room = GameRoom(name="room", stake_amount=10, max_players=2, status="waiting")
+    db.add(room)
+    db.commit()
+
+    assert join(client, auth_headers(user), room.id, own_cards(db, user, 2)).status_code == 200
+    [message] = messages
+    assert message["type"] == "player_joined"
+    assert message["player_count"] == 1
+    assert message["user"]["username"] == "abebe"
+    assert message["users"] == [message["user"]]
+
+
+def test_second_start_is_rejected_and_keeps_the_draw_loop(db, make_user):
+    user = make_user()
+    card = BingoCard(user_id=user.id, numbers=NUMBERS)
+    room = GameRoom(name="room", stake_amount=10, current_players=1, status="waiting")
+    db.add_all([card, room])
+    db.flush()
+    db.add(GameParticipant(user_id=user.id, room_id=room.id, card_numbers=[card.id], status="playing", cards_marked={}))
+    db.commit()
+
+    async def run():
+        try:
+            await start_game(room.id, db)
+            game, task = active_games[room.id], scheduler.tasks[room.id]
+            with pytest.raises(HTTPException) as second:
+                await start_game(room.id, db)
+            assert second.value.status_code == 409
+            assert active_games[room.id] is game
+            assert scheduler.tasks[room.id] is task and not task.done()
+        finally:
+            await scheduler.shutdown()
+            active_games.pop(room.id, None)
+
+    asyncio.run(run())
+    db.expire_all()
+    assert db.query(GameRoom.status).scalar() == "starting"
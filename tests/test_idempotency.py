@@ -0,0 +1,95 @@
+import asyncio
+import pytest
+from fastapi import HTTPException
+from backend.idempotency import IdempotencyStore
+
+
+class Operation:
+    """Counts calls; optionally blocks until released or fails with ``error``"""
+
+    def __init__(self, result=None, error: Exception = None, blocked: bool = False):
+        self.result = result
+        self.error = error
+        self.calls = 0
+        self.release = asyncio.Event()
+        if not blocked:
+            self.release.set()
+
+    async def __call__(self):
+        self.calls += 1
+        await self.release.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+def test_completed_result_is_replayed():
+    async def run():
+        store = IdempotencyStore(maxsize=10, ttl=60)
+        operation = Operation({"balance": 5})
+        first = await store.run(1, "deposit", "k", {"amount": 5}, operation)
+        again = await store.run(1, "deposit", "k", {"amount": 5}, operation)
+        return store, operation, first, again
+
+    store, operation, first, again = asyncio.run(run())
+    assert first == again == {"balance": 5}
+    assert operation.calls == 1
+    assert store.replays == 1
+
+
+def test_concurrent_duplicate_waits_for_first_call():
+    async def run():
+        store = IdempotencyStore(maxsize=10, ttl=60)
+        operation = Operation({"joined": True}, blocked=True)
+        first = asyncio.create_task(store.run(1, "join", "k", {"room": 1}, operation))
+        duplicate = asyncio.create_task(store.run(1, "join", "k", {"room": 1}, operation))
+        await asyncio.sleep(0)
+        operation.release.set()
+        return store, operation, await asyncio.gather(first, duplicate)
+
+    store, operation, results = asyncio.run(run())
+    assert results == [{"joined": True}] * 2
+    assert operation.calls == 1
+    assert store.waits == 1
+
+
+def test_key_reused_with_different_parameters_is_rejected():
+    async def run():
+        store = IdempotencyStore(maxsize=10, ttl=60)
+        await store.run(1, "withdraw", "k", {"amount": 5}, Operation({}))
+        with pytest.raises(HTTPException) as error:
+            await store.run(1, "withdraw", "k", {"amount": 50}, Operation({}))
+        return error.value.status_code
+
+    assert asyncio.run(run()) == 422
+
+
+@pytest.mark.parametrize("status,calls", [(503, 2), (400, 1)])
+def test_only_client_errors_are_remembered(status, calls):
+    async def run():
+        store = IdempotencyStore(maxsize=10, ttl=60)
+        operation = Operation(error=HTTPException(status_code=status, detail="no"))
+        for _ in range(2):
+            with pytest.raises(HTTPException):
+                await store.run(1, "transfer", "k", {"amount": 5}, operation)
+        return operation.calls
+
+    assert asyncio.run(run()) == calls
+
+
+def test_eviction_keeps_calls_in_flight():
+    async def run():
+        store = IdempotencyStore(maxsize=1, ttl=60)
+        slow = Operation({"paid": True}, blocked=True)
+        first = asyncio.create_task(store.run(1, "withdraw", "slow", {}, slow))
+        await asyncio.sleep(0)
+        for key in ("a", "b"):
+            await store.run(1, "withdraw", key, {}, Operation({}))
+        retry = asyncio.create_task(store.run(1, "withdraw", "slow", {}, slow))
+        await asyncio.sleep(0)
+        slow.release.set()
+        return slow, await asyncio.gather(first, retry)
+
+    slow, results = asyncio.run(run())
+    assert slow.calls == 1
+    assert results == [{"paid": True}] * 2
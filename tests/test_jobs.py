@@ -0,0 +1,147 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from backend import jobs
+from backend.jobs import JobKind, JobRunner
+
+
+def square(n: int) -> dict:
+    # Module-level so the spawned pool processes can import it
+    return {"n": n, "square": n * n}
+
+
+def plan_range(params: dict) -> list:
+    return [(n,) for n in range(params["chunks"])]
+
+
+class Gate:
+    """Chunk function for a thread pool that records starts and waits to be released"""
+
+    def __init__(self, fail_on: int = None):
+        self.fail_on = fail_on
+        self.started = []
+        self.release = threading.Event()
+
+    def __call__(self, n: int) -> dict:
+        self.started.append(n)
+        self.release.wait(10)
+        if n == self.fail_on:
+            raise ValueError(f"chunk {n} is broken")
+        return {"n": n}
+
+
+@pytest.fixture
+def kinds(monkeypatch):
+    def add(name: str, run):
+        monkeypatch.setitem(jobs.KINDS, name, JobKind(plan_range, run))
+    return add
+
+
+def threaded_runner(workers: int, history: int = 10) -> JobRunner:
+    runner = JobRunner(workers, history)
+    runner._executor = ThreadPoolExecutor(max_workers=workers)
+    return runner
+
+
+async def until(condition, timeout: float = 10.0):
+    for _ in range(int(timeout / 0.01)):
+        if condition():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("condition not reached")
+
+
+def test_stream_yields_every_chunk_then_the_summary(kinds):
+    kinds("square", square)
+
+    async def run():
+        runner = JobRunner(workers=2, history=10)
+        try:
+            job = runner.submit("square", {"chunks": 6})
+            items, progress = [], []
+            async for item in runner.stream(job):
+                items.append(item)
+                progress.append(job.done)
+            return job, items, progress
+        finally:
+            await runner.shutdown()
+
+    job, items, progress = asyncio.run(run())
+    *results, summary = items
+    assert sorted(result["square"] for result in results) == [n * n for n in range(6)]
+    assert progress == sorted(progress) and progress[-1] == 6
+    assert summary["status"] == "completed"
+    assert summary["chunks"] == {"done": 6, "total": 6}
+    assert summary["progress"] == 1.0
+
+
+def test_cancel_drops_the_chunks_not_started(kinds):
+    gate = Gate()
+    kinds("gated", gate)
+
+    async def run():
+        runner = threaded_runner(workers=1)
+        try:
+            job = runner.submit("gated", {"chunks": 5})
+            await until(lambda: gate.started)
+            assert runner.cancel(job.id) is job
+            await asyncio.gather(job.task, return_exceptions=True)
+            return job
+        finally:
+            gate.release.set()
+            await runner.shutdown()
+
+    job = asyncio.run(run())
+    assert job.status == "cancelled"
+    assert gate.started == [0]
+    assert job.summary()["chunks"] == {"done": 0, "total": 5}
+    assert job.finished_at is not None
+
+
+def test_failed_chunk_fails_the_job(kinds):
+    gate = Gate(fail_on=1)
+    gate.release.set()
+    kinds("broken", gate)
+
+    async def run():
+        runner = threaded_runner(workers=1)
+        try:
+            job = runner.submit("broken", {"chunks": 4})
+            await job.task
+            return job
+        finally:
+            await runner.shutdown()
+
+    job = asyncio.run(run())
+    assert job.status == "failed"
+    assert job.error == "ValueError: chunk 1 is broken"
+    assert gate.started == [0, 1]
+
+
+def test_history_drops_finished_jobs_but_never_running_ones(kinds):
+    blocked = Gate()
+    quick = Gate()
+    quick.release.set()
+    kinds("blocked", blocked)
+    kinds("quick", quick)
+
+    async def run():
+        runner = threaded_runner(workers=2, history=2)
+        try:
+            running = runner.submit("blocked", {"chunks": 1})
+            finished = []
+            for _ in range(3):
+                job = runner.submit("quick", {"chunks": 1})
+                await job.task
+                finished.append(job.id)
+            newest = runner.submit("quick", {"chunks": 1})
+            return running.id, finished, newest.id, list(runner.jobs)
+        finally:
+            blocked.release.set()
+            await runner.shutdown()
+
+    running, finished, newest, kept = asyncio.run(run())
+    # History counts the running job too, so every older finished job goes
+    assert kept == [running, newest]
+    assert not set(finished) & set(kept)
@@ -0,0 +1,43 @@
+import asyncio
+import pytest
+from backend.database import engine
+from backend.lobby import lobby
+from backend.models import GameRoom
+
+
+@pytest.fixture(autouse=True)
+def fresh_lobby():
+    lobby.rooms, lobby.loaded = {}, False
+    lobby._invalidate()
+    yield
+    lobby.rooms, lobby.loaded = {}, False
+    lobby._invalidate()
+
+
+def test_refresh_picks_up_rooms_created_elsewhere(db, client):
+    db.add(GameRoom(name="first", stake_amount=10, status="waiting"))
+    db.commit()
+    assert [room["name"] for room in client.get("/api/games/rooms").json()] == ["first"]
+    etag = client.get("/api/games/rooms").headers["ETag"]
+
+    # Inserted straight into the database, as seeding scripts and other workers do
+    db.add(GameRoom(name="second", stake_amount=10, status="waiting"))
+    db.commit()
+    assert asyncio.run(lobby.refresh()) is True
+    assert asyncio.run(lobby.refresh()) is False
+
+    response = client.get("/api/games/rooms", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert [room["name"] for room in response.json()] == ["first", "second"]
+
+
+def test_lobby_socket_does_not_hold_a_connection(db, client):
+    db.add(GameRoom(name="room", stake_amount=10, status="waiting"))
+    db.commit()
+    db.close()
+
+    with client.websocket_connect("/ws/lobby") as websocket:
+        assert [room["name"] for room in websocket.receive_json()["rooms"]] == ["room"]
+        assert engine.pool.checkedout() == 0
+        websocket.send_json({"type": "ping"})
+        assert websocket.receive_json() == {"type": "pong"}
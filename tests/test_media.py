@@ -0,0 +1,97 @@
+import asyncio
+import struct
+import zlib
+import pytest
+from backend import media
+from backend.app import create_app
+from backend.config import settings
+from backend.routes import profile
+
+
+@pytest.fixture(autouse=True)
+def uploads(tmp_path, monkeypatch):
+    monkeypatch.setattr(media, "UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(profile, "schedule_thumbnail", lambda user_id, filename: None)
+    monkeypatch.setattr(settings, "MAX_PHOTO_BYTES", 1000)
+    return tmp_path
+
+
+def multipart(content: bytes, boundary: str = "xyz") -> bytes:
+    return (
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"a.png\"\r\n"
+        f"Content-Type: image/png\r\n\r\n"
+    ).encode() + content + f"\r\n--{boundary}--\r\n".encode()
+
+
+def post_stream(headers: dict, chunks) -> tuple:
+    """Send chunks to the app one receive() at a time; returns the status and how many were read"""
+    app = create_app()
+    chunks = list(chunks)
+    read = 0
+    sent = []
+
+    async def receive():
+        nonlocal read
+        if read < len(chunks):
+            read += 1
+            return {"type": "http.request", "body": chunks[read - 1], "more_body": read < len(chunks)}
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {
+        "type": "http", "http_version": "1.1", "method": "POST", "scheme": "http",
+        "path": "/api/profile/upload-photo", "raw_path": b"/api/profile/upload-photo", "root_path": "",
+        "query_string": b"", "server": ("test", 80), "client": ("test", 1),
+        "headers": [(key.lower().encode(), value.encode()) for key, value in headers.items()],
+    }
+    asyncio.run(app(scope, receive, send))
+    return sent[0]["status"], read
+
+
+def test_upload_is_stored_by_content(client, make_user, auth_headers, uploads):
+    user = make_user()
+    files = {"file": ("a.png", b"\x89PNG" + b"0" * 100, "image/png")}
+    response = client.post("/api/profile/upload-photo", files=files, headers=auth_headers(user))
+    assert response.status_code == 200
+    assert [path.name for path in uploads.iterdir()] == [response.json()["photo_url"].rsplit("/", 1)[1]]
+
+
+def test_declared_length_over_cap_is_rejected_unread(make_user, auth_headers):
+    headers = {
+        **auth_headers(make_user()),
+        "Content-Type": "multipart/form-data; boundary=xyz",
+        "Content-Length": str(settings.MAX_PHOTO_BYTES + media.MULTIPART_OVERHEAD + 1),
+    }
+    assert post_stream(headers, [b"x" * 1024] * 100) == (413, 0)
+
+
+def test_streamed_body_is_abandoned_at_cap(make_user, auth_headers, uploads):
+    headers = {**auth_headers(make_user()), "Content-Type": "multipart/form-data; boundary=xyz"}
+    body = multipart(b"0" * 1024 * 1024)
+    chunks = [body[start:start + 1024] for start in range(0, len(body), 1024)]
+    status, read = post_stream(headers, chunks)
+    assert status == 413
+    assert read <= (settings.MAX_PHOTO_BYTES + media.MULTIPART_OVERHEAD) // 1024 + 1
+    assert list(uploads.iterdir()) == []
+
+
+def png_header(width: int, height: int) -> bytes:
+    """A PNG that only declares its size; Pillow checks it before decoding any pixels"""
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+    ihdr = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", ihdr) + chunk(b"IDAT", zlib.compress(b"")) + chunk(b"IEND", b"")
+
+
+def test_decompression_bomb_is_rejected(client, make_user, auth_headers, uploads):
+    files = {"file": ("bomb.png", png_header(100_000, 100_000), "image/png")}
+    response = client.post("/api/profile/upload-photo", files=files, headers=auth_headers(make_user()))
+    assert response.status_code == 400
+    assert list(uploads.iterdir()) == []
+
+
+def test_thumbnail_skips_decompression_bomb(uploads):
+    (uploads / "bomb.png").write_bytes(png_header(100_000, 100_000))
+    assert media.render_thumbnail("bomb.png") is None
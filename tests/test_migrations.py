@@ -0,0 +1,44 @@
+from sqlalchemy import inspect, text
+from backend.database import Base, engine
+from backend.migrations import _canonical_timestamps, check_query_plans
+from backend.models import Transaction, TransactionType
+
+
+def test_migrated_schema_matches_models():
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        columns = {column["name"] for column in inspector.get_columns(table.name)}
+        assert columns == set(table.columns.keys()), table.name
+        indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+        assert {index.name for index in table.indexes} <= indexes, table.name
+
+
+def test_history_queries_use_their_index_without_sorting():
+    results = check_query_plans()
+    assert [r["query"] for r in results if not r["uses_index"]] == [], results
+
+
+def test_legacy_timestamps_sort_with_new_ones(db, client, make_user, auth_headers):
+    user = make_user()
+    with engine.begin() as conn:
+        # Rows from before the canonical default: whole seconds, no fraction
+        for n in range(3):
+            conn.execute(text(
+                "INSERT INTO transactions (user_id, type, amount, method, status, transaction_id, created_at) "
+                "VALUES (:user_id, 'DEPOSIT', :n, 'cbe', 'completed', :ref, '2024-01-01 12:00:00')"
+            ), {"user_id": user.id, "n": n, "ref": f"legacy-{n}"})
+        _canonical_timestamps(conn)
+    db.add(Transaction(user_id=user.id, type=TransactionType.DEPOSIT, amount=9, method="cbe", transaction_id="new"))
+    db.commit()
+
+    stored = db.execute(text("SELECT DISTINCT length(created_at) FROM transactions")).scalars().all()
+    assert stored == [26]
+    seen, cursor = [], None
+    headers = auth_headers(user)
+    while True:
+        response = client.get("/api/wallet/transactions", params={"limit": 1, **({"cursor": cursor} if cursor else {})}, headers=headers)
+        seen.extend(t["amount"] for t in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+    assert seen == [9, 2, 1, 0]
@@ -0,0 +1,47 @@
+from datetime import datetime
+from sqlalchemy import func
+from backend.models import GameParticipant, GameRoom, Transaction, TransactionType
+
+
+def pages(client, url: str, headers: dict, key: str) -> list:
+    seen, cursor = [], None
+    for _ in range(10):
+        response = client.get(url, params={"limit": 2, **({"cursor": cursor} if cursor else {})}, headers=headers)
+        assert response.status_code == 200
+        seen.extend(item[key] for item in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            return seen
+    raise AssertionError(f"pagination did not end: {seen}")
+
+
+def test_transaction_pages_within_one_second(db, client, make_user, auth_headers):
+    user = make_user()
+    # Five rows stamped by the database, two written from Python sharing the newest stamp
+    db.add_all([
+        Transaction(user_id=user.id, type=TransactionType.DEPOSIT, amount=n, method="cbe", transaction_id=f"t{n}")
+        for n in range(5)
+    ])
+    db.commit()
+    stamp = db.query(func.max(Transaction.created_at)).scalar()
+    db.add_all([
+        Transaction(user_id=user.id, type=TransactionType.DEPOSIT, amount=n, method="cbe",
+                    transaction_id=f"t{n}", created_at=stamp)
+        for n in range(5, 7)
+    ])
+    db.commit()
+
+    ids = pages(client, "/api/wallet/transactions", auth_headers(user), "id")
+    assert ids == [7, 6, 5, 4, 3, 2, 1]
+
+
+def test_game_history_pages_within_one_second(db, client, make_user, auth_headers):
+    user = make_user()
+    rooms = [GameRoom(name=f"room {n}", stake_amount=10, status="finished") for n in range(5)]
+    db.add_all(rooms)
+    db.flush()
+    db.add_all([GameParticipant(user_id=user.id, room_id=room.id, status="lost") for room in rooms])
+    db.commit()
+
+    ids = pages(client, "/api/games/history", auth_headers(user), "participant_id")
+    assert ids == [5, 4, 3, 2, 1]
@@ -0,0 +1,155 @@
+import asyncio
+from datetime import datetime, timedelta
+import pytest
+from fastapi import HTTPException
+from backend import payments
+from backend.config import settings
+from backend.database import engine
+from backend.migrations import _dedupe_wallets
+from backend.models import Transaction, TransactionType, User, Wallet
+from backend.routes.wallet import _deposit, _withdraw
+from backend.schemas import DepositRequest, WithdrawRequest
+
+
+@pytest.fixture(autouse=True)
+def no_providers(monkeypatch):
+    monkeypatch.setattr(payments, "providers", {})
+
+
+def balance(db, user_id: int) -> float:
+    db.expire_all()
+    return db.query(User.balance).filter(User.id == user_id).scalar()
+
+
+def statuses(db) -> dict:
+    db.expire_all()
+    return {t.amount: t.status for t in db.query(Transaction)}
+
+
+def withdraw(db, user_id: int, amount: float, method: str = "cbe", account: str = "1000"):
+    return _withdraw(WithdrawRequest(method=method, amount=amount, account_info={"account": account}), user_id, db)
+
+
+def test_withdraw_holds_amount_and_reuses_wallet(db, make_user):
+    user = make_user(balance=100)
+    withdraw(db, user.id, 30)
+    withdraw(db, user.id, 20, account=" 1000")
+
+    assert balance(db, user.id) == 50
+    assert db.query(Wallet).count() == 1
+    wallet_id = db.query(Wallet.id).scalar()
+    assert {t.wallet_id for t in db.query(Transaction)} == {wallet_id}
+
+    with pytest.raises(HTTPException) as error:
+        withdraw(db, user.id, 60)
+    assert error.value.status_code == 400
+    assert balance(db, user.id) == 50
+    assert db.query(Transaction).count() == 2
+
+
+def test_settlement_credits_deposits_and_refunds_failed_withdrawals(db, make_user):
+    user = make_user(balance=100)
+    _deposit(DepositRequest(method="telbirr", amount=25, phone_or_account="0911"), user.id, db)
+    withdraw(db, user.id, 30)
+    withdraw(db, user.id, 40)
+    db.rollback()
+    assert balance(db, user.id) == 30
+
+    payments.register_provider("telbirr", payments.FakeProvider())
+    rejecting = payments.FakeProvider(fail_when=lambda t: t["amount"] == 40)
+    payments.register_provider("cbe", rejecting)
+    db.rollback()
+
+    assert asyncio.run(payments.process_batch(10)) == 3
+    # Deposit credited, paid-out withdrawal stays debited, rejected one comes back
+    assert balance(db, user.id) == 30 + 25 + 40
+    assert statuses(db) == {25: "completed", 30: "completed", 40: "failed"}
+    assert {t["amount"] for t in rejecting.processed} == {30, 40}
+
+    assert asyncio.run(payments.process_batch(10)) == 0
+    assert balance(db, user.id) == 95
+
+
+def test_provider_error_returns_batch_to_queue(db, make_user):
+    user = make_user(balance=100)
+    withdraw(db, user.id, 30)
+    db.rollback()
+
+    class Broken(payments.PaymentProvider):
+        async def process(self, transactions):
+            raise RuntimeError("provider down")
+
+    payments.register_provider("cbe", Broken())
+    assert asyncio.run(payments.process_batch(10)) == 1
+    assert statuses(db) == {30: "pending"}
+    assert balance(db, user.id) == 70
+
+
+def test_stale_claims_are_picked_up_again(db, make_user):
+    user = make_user(balance=0)
+    now = datetime.utcnow()
+    stale = now - timedelta(seconds=settings.PAYMENT_PROCESSING_TIMEOUT + 60)
+    for amount, updated_at in ((10, stale), (20, now)):
+        db.add(Transaction(
+            user_id=user.id, type=TransactionType.DEPOSIT, amount=amount, method="telbirr",
+            status="processing", transaction_id=f"tx-{amount}", updated_at=updated_at
+        ))
+    db.commit()
+
+    payments.register_provider("telbirr", payments.FakeProvider())
+    assert asyncio.run(payments.process_batch(10)) == 1
+    # The recent claim may still be with a live worker
+    assert statuses(db) == {10: "completed", 20: "processing"}
+    assert balance(db, user.id) == 10
+
+
+def test_worker_uses_fake_provider_when_enabled(db, make_user, monkeypatch):
+    user = make_user(balance=0)
+    _deposit(DepositRequest(method="bank", amount=15, phone_or_account="ACC-1"), user.id, db)
+    db.rollback()
+    monkeypatch.setattr(settings, "PAYMENT_FAKE_PROVIDER", True)
+
+    async def run():
+        worker = asyncio.create_task(payments.run_payment_worker(interval=0.01))
+        try:
+            for _ in range(100):
+                await asyncio.sleep(0.01)
+                if statuses(db) == {15: "completed"}:
+                    break
+        finally:
+            worker.cancel()
+
+    asyncio.run(run())
+    assert statuses(db) == {15: "completed"}
+    assert set(payments.providers) == set(settings.PAYMENT_METHODS)
+    assert balance(db, user.id) == 15
+
+
+def test_migration_holds_withdrawals_requested_before_holds(db, make_user):
+    rich, poor = make_user(balance=100), make_user(balance=10)
+    db.add_all([
+        Wallet(user_id=rich.id, method="cbe", account_info={"account": "1"}),
+        Wallet(user_id=rich.id, method="cbe", account_info={"account": "1"}),
+        Wallet(user_id=poor.id, method="cbe", account_info={"account": "2"}),
+    ])
+    db.flush()
+    db.query(Wallet).update({Wallet.account_key: None})
+    for user, amount, method in ((rich, 30, "cbe"), (rich, 40, "telbirr"), (poor, 50, "cbe")):
+        db.add(Transaction(
+            user_id=user.id, type=TransactionType.WITHDRAW, amount=amount, method=method,
+            status="pending", transaction_id=f"legacy-{amount}"
+        ))
+    db.commit()
+
+    with engine.begin() as conn:
+        _dedupe_wallets(conn)
+
+    db.expire_all()
+    transactions = {t.amount: t for t in db.query(Transaction)}
+    kept = db.query(Wallet).filter(Wallet.user_id == rich.id).one()
+    assert (transactions[30].status, transactions[30].wallet_id) == ("pending", kept.id)
+    assert balance(db, rich.id) == 70
+    # No wallet was saved for telbirr, and the poor user's balance no longer covers the request
+    assert transactions[40].status == "failed"
+    assert transactions[50].status == "failed"
+    assert balance(db, poor.id) == 10
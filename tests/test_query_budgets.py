@@ -0,0 +1,74 @@
+import asyncio
+import pytest
+from backend.database import engine
+from backend.game_scheduler import scheduler
+from backend.models import GameParticipant, GameRoom, Transaction, TransactionType
+from backend.query_stats import QueryStats, _current, assert_max_queries
+
+
+@pytest.fixture
+def player(db, make_user):
+    user = make_user(balance=100)
+    rooms = [GameRoom(name=f"room {n}", stake_amount=10, current_players=1, status="finished") for n in range(3)]
+    db.add_all(rooms)
+    db.flush()
+    db.add_all([GameParticipant(user_id=user.id, room_id=room.id, status="lost", card_numbers=[], cards_marked={}) for room in rooms])
+    db.add_all([
+        Transaction(user_id=user.id, type=TransactionType.DEPOSIT, amount=n, method="cbe", transaction_id=f"t{n}")
+        for n in range(5)
+    ])
+    db.commit()
+    return user
+
+
+# (method, path, params, budget)
+ENDPOINTS = [
+    ("get", "/api/wallet/balance", {}, 1),
+    ("get", "/api/wallet/transactions", {"limit": 2}, 1),
+    ("get", "/api/games/history", {}, 1),
+    ("get", "/api/games/history", {"include_replay": True}, 5),
+    ("get", "/api/games/my-cards", {}, 1),
+    ("get", "/api/stats/leaderboard/all_time", {}, 1),
+]
+
+
+@pytest.mark.parametrize("method,path,params,budget", ENDPOINTS)
+def test_endpoint_query_budget(client, player, auth_headers, method, path, params, budget):
+    headers = auth_headers(player)
+    with assert_max_queries(budget, allow_repeats=False):
+        response = getattr(client, method)(path, params=params, headers=headers)
+    assert response.status_code == 200
+
+
+def test_generate_cards_inserts_in_one_batch(client, player, auth_headers):
+    # SQLite cannot match RETURNING rows back to objects, so there the ORM inserts one row at a time
+    inserts = 1 if engine.dialect.name == "postgresql" else 10
+    headers = auth_headers(player)
+    with assert_max_queries(1 + inserts):
+        response = client.post("/api/games/generate-cards", params={"count": 10}, headers=headers)
+    assert len(response.json()["cards"]) == 10
+
+
+def test_cached_reads_skip_the_database(db, client, player, auth_headers):
+    headers = auth_headers(player)
+    replay = f"/api/games/history/{db.query(GameRoom.id).first()[0]}"
+    client.get("/api/games/rooms")
+    client.get(replay, headers=headers)
+    with assert_max_queries(0):
+        assert client.get("/api/games/rooms").status_code == 200
+        assert client.get(replay, headers=headers).status_code == 200
+
+
+def test_game_loop_is_not_billed_to_the_starting_request():
+    seen = []
+
+    async def game_loop():
+        seen.append(_current.get())
+
+    async def request():
+        _current.set(QueryStats())
+        scheduler.start(1, game_loop())
+        await asyncio.gather(*scheduler.tasks.values())
+
+    asyncio.run(request())
+    assert seen == [None]
@@ -0,0 +1,89 @@
+from datetime import datetime, timedelta
+from backend.models import PlayerStats
+from backend.stats import GameResult, Leaderboard, StatsStore, write_stats
+
+
+def won(user_id: int, winnings: float) -> GameResult:
+    return GameResult(user_id, f"player {user_id}", True, winnings)
+
+
+def lost(user_id: int) -> GameResult:
+    return GameResult(user_id, f"player {user_id}", False, 0.0)
+
+
+def test_leaderboard_ranks_by_score_then_user_id():
+    board = Leaderboard(top_size=3)
+    for user_id, score in [(1, 10.0), (2, 30.0), (3, 20.0), (4, 20.0)]:
+        board.update(user_id, score)
+    assert board.top(10) == [(2, 30.0), (3, 20.0), (4, 20.0)]
+    assert [board.rank(user_id) for user_id in (1, 2, 3, 4)] == [4, 1, 2, 3]
+
+    board.update(1, 50.0)
+    assert board.top(2) == [(1, 50.0), (2, 30.0)]
+    assert board.rank(4) == 4
+    assert board.rank(99) is None
+    assert len(board) == 4
+
+
+def test_record_game_keeps_totals_streaks_and_ranks():
+    store = StatsStore(top_size=10)
+    store.record_game([won(1, 40.0), lost(2)])
+    store.record_game([won(1, 20.0), lost(2)])
+    store.record_game([lost(1), won(2, 100.0)])
+
+    first = store.get(1)
+    assert (first["games_played"], first["wins"], first["total_winnings"]) == (3, 2, 60.0)
+    assert (first["current_streak"], first["best_streak"]) == (0, 2)
+    assert first["ranks"] == {"daily": 2, "weekly": 2, "all_time": 2}
+    assert [row["user_id"] for row in store.leaderboard("all_time", 10)] == [2, 1]
+
+
+def test_new_day_starts_an_empty_daily_board():
+    store = StatsStore(top_size=10)
+    today = datetime.utcnow()
+    store.record_game([won(1, 40.0)], now=today - timedelta(days=1))
+    store.record_game([won(2, 10.0)], now=today)
+
+    assert store.leaderboard("daily", 10) == [{"rank": 1, "user_id": 2, "name": "player 2", "winnings": 10.0}]
+    assert store.get(1)["daily_winnings"] == 0.0
+    assert store.get(1)["ranks"]["daily"] is None
+    assert store.leaderboard("all_time", 1)[0]["user_id"] == 1
+
+
+def stored(db, user_id: int) -> PlayerStats:
+    db.expire_all()
+    return db.get(PlayerStats, user_id)
+
+
+def test_workers_add_to_each_others_writes(db, make_user):
+    user = make_user()
+    # Two workers that loaded the same empty row each settle games for the player
+    first, second = StatsStore(top_size=10), StatsStore(top_size=10)
+    first.record_game([won(user.id, 40.0)])
+    first.record_game([won(user.id, 10.0)])
+    second.record_game([won(user.id, 5.0)])
+    write_stats(first.take_dirty())
+    write_stats(second.take_dirty())
+
+    row = stored(db, user.id)
+    assert (row.games_played, row.wins, row.total_winnings, row.daily_winnings) == (3, 3, 55.0, 55.0)
+    assert (row.current_streak, row.best_streak) == (3, 3)
+
+    second.record_game([lost(user.id)])
+    write_stats(second.take_dirty())
+    row = stored(db, user.id)
+    assert (row.games_played, row.current_streak, row.best_streak) == (4, 0, 3)
+
+
+def test_failed_flush_is_merged_with_newer_changes(db, make_user):
+    user = make_user()
+    store = StatsStore(top_size=10)
+    store.record_game([won(user.id, 40.0)])
+    failed = store.take_dirty()
+    store.record_game([won(user.id, 10.0)])
+    store.restore(failed)
+    write_stats(store.take_dirty())
+
+    row = stored(db, user.id)
+    assert (row.games_played, row.total_winnings, row.current_streak) == (2, 50.0, 2)
+    assert store.take_dirty() == []
@@ -0,0 +1,95 @@
+import asyncio
+import time
+import httpx
+from backend.telegram_client import SendQueue, TelegramClient
+from backend.telegram_stub import TelegramStub, create_stub_app
+
+
+def client_for(stub: TelegramStub) -> TelegramClient:
+    return TelegramClient(token="test", base_url="http://stub", transport=httpx.ASGITransport(app=create_stub_app(stub)))
+
+
+async def drain(queue: SendQueue, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    while queue.depth or queue._inflight:
+        assert time.monotonic() < deadline, queue.stats()
+        await asyncio.sleep(0.01)
+    await queue.stop()
+    await queue.client.close()
+
+
+def texts_by_chat(stub: TelegramStub) -> dict:
+    texts = {}
+    for call in stub.calls:
+        texts.setdefault(call["payload"]["chat_id"], []).append(call["payload"]["text"])
+    return texts
+
+
+def test_retries_after_429():
+    stub = TelegramStub(per_chat_interval=1.0)
+    # Paced faster than the stub allows, so the second message is refused once
+    queue = SendQueue(client_for(stub), per_chat_interval=0.0)
+
+    async def run():
+        queue.send_message(1, "first")
+        queue.send_message(1, "second")
+        await drain(queue)
+
+    asyncio.run(run())
+    assert stub.rejected == 1
+    assert queue.stats()["throttled"] == 1
+    assert queue.stats()["sent"] == 2
+    assert texts_by_chat(stub) == {1: ["first", "second"]}
+    assert stub.calls[1]["at"] - stub.calls[0]["at"] >= 1.0
+
+
+def test_keeps_order_within_each_chat():
+    stub = TelegramStub(per_chat_interval=0.05)
+    queue = SendQueue(client_for(stub), global_rate=1000, per_chat_interval=0.06)
+
+    async def run():
+        for n in range(5):
+            for chat_id in (1, 2, 3):
+                queue.send_message(chat_id, str(n))
+        await drain(queue)
+
+    asyncio.run(run())
+    assert stub.rejected == 0
+    assert texts_by_chat(stub) == {chat_id: ["0", "1", "2", "3", "4"] for chat_id in (1, 2, 3)}
+
+
+def test_stays_under_global_rate():
+    stub = TelegramStub(global_rate=10, per_chat_interval=0.0)
+    queue = SendQueue(client_for(stub), global_rate=8, per_chat_interval=0.0)
+
+    async def run():
+        queue.broadcast(range(12), "hello")
+        await drain(queue)
+
+    asyncio.run(run())
+    assert stub.rejected == 0
+    assert len(stub.calls) == 12
+    assert stub.calls[-1]["at"] - stub.calls[0]["at"] >= 11 / 8 - 0.05
+
+
+def test_unexpected_error_does_not_block_the_chat():
+    stub = TelegramStub(per_chat_interval=0.0)
+    client = client_for(stub)
+    queue = SendQueue(client, global_rate=1000, per_chat_interval=0.0)
+    call = client.call
+
+    async def flaky_call(method, payload):
+        if payload["text"] == "broken":
+            raise RuntimeError("boom")
+        return await call(method, payload)
+
+    client.call = flaky_call
+
+    async def run():
+        queue.send_message(1, "broken")
+        queue.send_message(1, "after")
+        await drain(queue)
+
+    asyncio.run(run())
+    assert queue.stats()["failed"] == 1
+    assert texts_by_chat(stub) == {1: ["after"]}
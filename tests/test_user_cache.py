@@ -0,0 +1,76 @@
+import pytest
+from backend import media, user_cache as user_cache_module
+from backend.routes import profile
+from backend.user_cache import UserCache
+
+
+@pytest.fixture
+def cached_profile(client, auth_headers):
+    """Read a user's profile once so it is served from the cache afterwards"""
+    def read(user) -> dict:
+        response = client.get("/api/profile/", headers=auth_headers(user))
+        assert response.status_code == 200
+        return response.json()
+    return read
+
+
+def test_profile_is_served_from_cache(db, make_user, cached_profile):
+    user = make_user(first_name="Abebe")
+    cached_profile(user)
+    user.first_name = "Changed behind the cache"
+    db.commit()
+    assert cached_profile(user)["first_name"] == "Abebe"
+
+
+def test_update_profile_invalidates(make_user, client, auth_headers, cached_profile):
+    user = make_user(first_name="Abebe")
+    cached_profile(user)
+    response = client.put("/api/auth/me", json={"first_name": "Kebede"}, headers=auth_headers(user))
+    assert response.status_code == 200
+    assert cached_profile(user)["first_name"] == "Kebede"
+
+
+def test_update_language_invalidates(make_user, client, auth_headers, cached_profile):
+    user = make_user(language="en")
+    cached_profile(user)
+    response = client.put("/api/profile/language", params={"language": "am"}, headers=auth_headers(user))
+    assert response.status_code == 200
+    assert cached_profile(user)["language"] == "am"
+
+
+def test_upload_photo_invalidates(make_user, client, auth_headers, cached_profile, tmp_path, monkeypatch):
+    monkeypatch.setattr(media, "UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(profile, "schedule_thumbnail", lambda user_id, filename: None)
+    user = make_user()
+    cached_profile(user)
+    files = {"file": ("a.png", b"\x89PNG" + b"0" * 100, "image/png")}
+    response = client.post("/api/profile/upload-photo", files=files, headers=auth_headers(user))
+    assert response.status_code == 200
+    assert cached_profile(user)["photo_url"] == response.json()["photo_url"]
+
+
+def test_entries_expire_after_ttl(make_user, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(user_cache_module.time, "monotonic", lambda: clock[0])
+    cache = UserCache(maxsize=10, ttl=60)
+    user = make_user(first_name="Abebe")
+    cache.put(user)
+
+    clock[0] += 59
+    assert cache.get(user.id)["first_name"] == "Abebe"
+    clock[0] += 2
+    assert cache.get(user.id) is None
+    assert cache.stats()["size"] == 0
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_least_recently_used_is_evicted(make_user):
+    cache = UserCache(maxsize=2, ttl=60)
+    first, second, third = make_user(), make_user(), make_user()
+    cache.put(first)
+    cache.put(second)
+    cache.get(first.id)
+    cache.put(third)
+    assert cache.get(second.id) is None
+    assert cache.get(first.id) is not None
+    assert cache.evictions == 1
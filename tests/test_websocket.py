@@ -0,0 +1,45 @@
+import pytest
+from starlette.websockets import WebSocketDisconnect
+from backend.security import create_access_token
+
+
+def token(user_id: int) -> str:
+    return create_access_token(user_id, "en")
+
+
+def status_check(socket) -> dict:
+    socket.send_json({"type": "status_check"})
+    return socket.receive_json()
+
+
+def test_game_socket_takes_user_from_query_token(client):
+    with client.websocket_connect(f"/ws/game/1?token={token(7)}") as socket:
+        assert status_check(socket)["user_id"] == 7
+
+
+def test_game_socket_takes_user_from_first_message(client):
+    with client.websocket_connect("/ws/game/1") as socket:
+        socket.send_json({"type": "auth", "token": token(8)})
+        assert status_check(socket)["user_id"] == 8
+
+
+def test_legacy_path_must_match_token(client):
+    with client.websocket_connect(f"/ws/game/1/9?token={token(9)}") as socket:
+        assert status_check(socket)["user_id"] == 9
+
+    with pytest.raises(WebSocketDisconnect) as closed:
+        with client.websocket_connect(f"/ws/game/1/10?token={token(9)}") as socket:
+            socket.receive_json()
+    assert closed.value.code == 1008
+
+
+@pytest.mark.parametrize("first_message", [
+    {"type": "status_check"},
+    {"type": "auth", "token": "not-a-token"},
+])
+def test_game_socket_without_valid_token_is_closed(client, first_message):
+    with pytest.raises(WebSocketDisconnect) as closed:
+        with client.websocket_connect("/ws/game/1") as socket:
+            socket.send_json(first_message)
+            socket.receive_json()
+    assert closed.value.code == 1008